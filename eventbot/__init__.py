@@ -5,3 +5,9 @@
 # See http://www.gevent.org/gevent.monkey.html for more info.
 import gevent.monkey
 gevent.monkey.patch_all()  # noqa:E402
+
+import time  # noqa:E402
+
+from eventbot.utils import startup  # noqa:E402
+
+startup.import_started(time.monotonic())
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+from pynamodb.attributes import (
+    BooleanAttribute,
+    NumberAttribute,
+    UnicodeAttribute,
+    UTCDateTimeAttribute,
+)
+from pynamodb.models import Model
+
+from eventbot import settings
+from eventbot.models import connection
+from eventbot.models.cache import CachedModelMixin
+from eventbot.models.event import Event, PaymentSummaryMap
+from eventbot.utils.cache import TTLCache
+
+# The Event attributes kept in the archive.
+_FIELDS = (
+    'event_id',
+    'name',
+    'description',
+    'created_date',
+    'modified_date',
+    'start_date',
+    'start_date_given',
+    'end_date',
+    'status',
+    'creator',
+    'channel_id',
+    'attendee_count',
+    'payment_summary',
+    'extra_attendees',
+    'cost',
+    'version',
+)
+
+
+class ArchivedEvent(CachedModelMixin, Model):
+    """
+    A closed event, moved out of the event table by the lifecycle command so
+    that the event table only holds events that are still in use. Archived
+    events aren't changed; their attendees stay in the attendee table.
+    """
+
+    class Meta:
+        table_name = settings.DYNAMODB_TABLE_EVENT_ARCHIVE
+        if settings.DYNAMODB_URL:
+            host = settings.DYNAMODB_URL
+        session_cls = connection.shared_session
+        request_timeout_seconds = connection.request_timeout()
+
+    event_id = UnicodeAttribute(hash_key=True)
+    name = UnicodeAttribute()
+    description = UnicodeAttribute()
+    created_date = UTCDateTimeAttribute()
+    modified_date = UTCDateTimeAttribute()
+    start_date = UTCDateTimeAttribute(null=True)
+    start_date_given = BooleanAttribute(null=True)
+    end_date = UTCDateTimeAttribute(null=True)
+    status = UnicodeAttribute()
+    creator = UnicodeAttribute()
+    channel_id = UnicodeAttribute(null=True)
+    attendee_count = NumberAttribute(default=0)
+    payment_summary = PaymentSummaryMap(null=True)
+    extra_attendees = NumberAttribute(default=0)
+    cost = NumberAttribute(default=0)
+    version = NumberAttribute(null=True)
+    archived_date = UTCDateTimeAttribute()
+
+    _hash_key_name = 'event_id'
+    _cache = TTLCache(settings.EVENT_CACHE_MAX_SIZE, settings.ARCHIVED_EVENT_CACHE_TTL)
+
+    @classmethod
+    def from_event(cls, event: Event) -> 'ArchivedEvent':
+        """
+        Copy an event, whose attendees have been migrated, for the archive.
+        """
+        return cls(archived_date=datetime.utcnow(), **{name: getattr(event, name) for name in _FIELDS})
+
+    def to_event(self) -> Event:
+        """
+        Return the archived event as an Event, for rendering; it mustn't be
+        saved.
+        """
+        return Event(**{name: getattr(self, name) for name in _FIELDS})
@@ -0,0 +1,100 @@
+from typing import Iterator, List, Optional
+
+from pynamodb.attributes import (
+    UnicodeAttribute,
+    UTCDateTimeAttribute,
+)
+from pynamodb.models import Model
+from pynamodb.indexes import GlobalSecondaryIndex, LocalSecondaryIndex, KeysOnlyProjection
+
+from eventbot import settings
+from eventbot.models import connection
+
+
+class AttendeeRegistrationIndex(LocalSecondaryIndex):
+    """
+    The attendees of an event, in order of registration.
+    """
+
+    class Meta:
+        index_name = settings.DYNAMODB_LSI_ATTENDEE_REGISTRATION
+        if settings.DYNAMODB_URL:
+            host = settings.DYNAMODB_URL
+
+        projection = KeysOnlyProjection()
+
+    event_id = UnicodeAttribute(hash_key=True)
+    registered_date = UTCDateTimeAttribute(range_key=True)
+
+
+class AttendeeUserIndex(GlobalSecondaryIndex):
+    """
+    The events a user is registered for, to update the payment summaries of
+    those events when the user's venmo handle changes.
+    """
+
+    class Meta:
+        index_name = settings.DYNAMODB_GSI_ATTENDEE_USER
+        read_capacity_units = 10
+        write_capacity_units = 10
+        if settings.DYNAMODB_URL:
+            host = settings.DYNAMODB_URL
+
+        projection = KeysOnlyProjection()
+
+    user_id = UnicodeAttribute(hash_key=True)
+    event_id = UnicodeAttribute(range_key=True)
+
+
+class Attendee(Model):
+    """
+    A registration of a user for an event, keyed on (event_id, user_id), so
+    that registering, unregistering and checking a registration each touch a
+    single small item, however large the event is. The event keeps a count of
+    its attendees.
+    """
+
+    class Meta:
+        table_name = settings.DYNAMODB_TABLE_ATTENDEE
+        if settings.DYNAMODB_URL:
+            host = settings.DYNAMODB_URL
+        session_cls = connection.shared_session
+        request_timeout_seconds = connection.request_timeout()
+
+    event_id = UnicodeAttribute(hash_key=True)
+    user_id = UnicodeAttribute(range_key=True)
+    registered_date = UTCDateTimeAttribute()
+
+    registration_index = AttendeeRegistrationIndex()
+    user_index = AttendeeUserIndex()
+
+    @classmethod
+    def query_by_event(
+            cls,
+            event_id: str,
+            limit: Optional[int] = None,
+            last_evaluated_key: Optional[dict] = None,
+    ) -> Iterator['Attendee']:
+        """
+        Query the attendees of an event, in order of registration.
+        """
+        return cls.registration_index.query(
+            event_id,
+            limit=limit,
+            last_evaluated_key=last_evaluated_key,
+        )
+
+    @classmethod
+    def exists_for(cls, event_id: str, user_id: str) -> bool:
+        try:
+            cls.get(event_id, user_id)
+        except cls.DoesNotExist:
+            return False
+        return True
+
+    @classmethod
+    def event_ids_for(cls, user_id: str) -> List[str]:
+        """
+        Return the event_ids of the events a user is registered for.
+        """
+        return [x.event_id for x in cls.user_index.query(user_id)]
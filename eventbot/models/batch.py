@@ -0,0 +1,77 @@
+import logging
+from typing import Any, Iterable, List
+
+import gevent
+from gevent.pool import Pool
+from pynamodb.constants import BATCH_GET_PAGE_LIMIT
+
+from eventbot import settings
+from eventbot.utils import stats, tracing
+
+logger = logging.getLogger(__name__)
+
+
+class UnprocessedKeysError(Exception):
+    """
+    Raised when DynamoDB still hasn't processed some keys of a batch get
+    after every retry.
+    """
+
+    def __init__(self, model: Any, keys: List) -> None:
+        super(UnprocessedKeysError, self).__init__(
+            f'{len(keys)} {model.__name__} keys unprocessed after {settings.BATCH_GET_RETRIES} retries'
+        )
+        self.keys = keys
+
+
+def batch_get(model: Any, hash_keys: Iterable[Any]) -> List:
+    """
+    Get the items of a hash-key-only model, with BatchGetItem.
+
+    The keys are split into chunks of as many keys as a request can take, and
+    the chunks are fetched concurrently, by at most BATCH_GET_CONCURRENCY
+    greenlets. Keys that DynamoDB leaves unprocessed, when throttled, are
+    retried with exponential backoff. Items are returned in the order of
+    hash_keys, with duplicates omitted; keys without an item are omitted too,
+    and counted in the model's ``batch_get.missing`` metric.
+    """
+    keys = list(dict.fromkeys(hash_keys))
+    chunks = [
+        keys[i:i + BATCH_GET_PAGE_LIMIT]
+        for i in range(0, len(keys), BATCH_GET_PAGE_LIMIT)
+    ]
+    if len(chunks) <= 1:
+        pages = [_get_chunk(model, chunk) for chunk in chunks]
+    else:
+        pool = Pool(min(settings.BATCH_GET_CONCURRENCY, len(chunks)))
+        pages = pool.map(tracing.bind(lambda chunk: _get_chunk(model, chunk)), chunks)
+    found = {}
+    for page in pages:
+        for obj in page:
+            found[getattr(obj, model._hash_key_name)] = obj
+    missing = len(keys) - len(found)
+    if missing:
+        stats.incr(f'{model._stat_name()}.batch_get.missing', missing)
+    return [found[key] for key in keys if key in found]
+
+
+@stats.pipelined()
+def _get_chunk(model: Any, keys: List) -> List:
+    keys_to_get = [
+        {model._hash_key_name: model._serialize_keys(key)[0]}
+        for key in keys
+    ]
+    items = []
+    for attempt in range(settings.BATCH_GET_RETRIES + 1):
+        page, keys_to_get = model._batch_get_page(
+            keys_to_get,
+            consistent_read=None,
+            attributes_to_get=None,
+        )
+        items.extend(model.from_raw_data(data) for data in page)
+        if not keys_to_get:
+            return items
+        stats.incr(f'{model._stat_name()}.batch_get.unprocessed', len(keys_to_get))
+        if attempt < settings.BATCH_GET_RETRIES:
+            gevent.sleep(settings.BATCH_GET_RETRY_BACKOFF * 2 ** attempt)
+    raise UnprocessedKeysError(model, keys_to_get)
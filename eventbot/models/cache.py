@@ -0,0 +1,121 @@
+import copy
+from typing import Any, Dict, Iterable, List
+
+from eventbot.models import batch
+from eventbot.utils import stats
+from eventbot.utils.cache import MISSING, TTLCache
+
+
+class CachedModelMixin(object):
+    """
+    A read-through, write-invalidated cache in front of a pynamodb model.
+
+    Models using this mixin need to set ``_cache`` to a TTLCache and
+    ``_hash_key_name`` to the name of their hash key attribute. Items that
+    don't exist are cached too, so that repeated lookups of unknown keys don't
+    hit DynamoDB. Cached items are copied on the way in and out, so callers
+    are free to mutate the objects they get back.
+
+    Reads that are followed by a full-item write should keep using ``get``,
+    since a cached item may be stale with respect to other workers.
+    """
+
+    _cache: TTLCache = None
+    _hash_key_name: str = None
+
+    @classmethod
+    def get_cached(cls, hash_key: Any):
+        obj = cls._cache.get(hash_key)
+        cls._incr_cache_stat(obj)
+        if obj is MISSING:
+            try:
+                obj = cls.get(hash_key)
+            except cls.DoesNotExist:
+                cls._cache.set(hash_key, None)
+                raise
+            cls._cache.set(hash_key, copy.deepcopy(obj))
+            return obj
+        if obj is None:
+            raise cls.DoesNotExist()
+        return copy.deepcopy(obj)
+
+    @classmethod
+    def batch_get_cached(cls, hash_keys: Iterable[Any]) -> List:
+        """
+        Get the items for hash_keys, fetching only the keys that aren't
+        cached, with concurrent batch gets. Items are returned in the order of
+        hash_keys, with duplicates and missing items omitted.
+        """
+        keys = []
+        found = {}
+        to_fetch = []
+        for hash_key in hash_keys:
+            if hash_key in found:
+                continue
+            keys.append(hash_key)
+            obj = cls._cache.get(hash_key)
+            cls._incr_cache_stat(obj)
+            if obj is MISSING:
+                to_fetch.append(hash_key)
+                obj = None
+            found[hash_key] = obj
+        if to_fetch:
+            stats.timing(f'{cls._stat_name()}.batch_get_size', len(to_fetch))
+            for obj in batch.batch_get(cls, to_fetch):
+                hash_key = getattr(obj, cls._hash_key_name)
+                found[hash_key] = obj
+            for hash_key in to_fetch:
+                cls._cache.set(hash_key, found[hash_key])
+        return [
+            copy.deepcopy(found[hash_key])
+            for hash_key in keys
+            if found[hash_key] is not None
+        ]
+
+    @classmethod
+    def _stat_name(cls) -> str:
+        return f'model.{cls.__name__.lower()}'
+
+    @classmethod
+    def _incr_cache_stat(cls, obj: Any) -> None:
+        if obj is MISSING:
+            stats.incr(f'{cls._stat_name()}.cache.miss')
+        else:
+            stats.incr(f'{cls._stat_name()}.cache.hit')
+
+    @classmethod
+    def invalidate_cache(cls, hash_key: Any) -> None:
+        cls._cache.invalidate(hash_key)
+
+    @classmethod
+    def cache_version(cls) -> int:
+        """
+        A counter that changes whenever an item of this model is written
+        through this worker.
+        """
+        return cls._cache.version
+
+    @classmethod
+    def cache_stats(cls) -> Dict[str, int]:
+        return cls._cache.stats()
+
+    def _invalidate_self(self) -> None:
+        self.invalidate_cache(getattr(self, self._hash_key_name))
+
+    def save(self, *args, **kwargs) -> Dict[str, Any]:
+        try:
+            return super(CachedModelMixin, self).save(*args, **kwargs)
+        finally:
+            self._invalidate_self()
+
+    def update(self, *args, **kwargs) -> Dict[str, Any]:
+        try:
+            return super(CachedModelMixin, self).update(*args, **kwargs)
+        finally:
+            self._invalidate_self()
+
+    def delete(self, *args, **kwargs) -> Dict[str, Any]:
+        try:
+            return super(CachedModelMixin, self).delete(*args, **kwargs)
+        finally:
+            self._invalidate_self()
@@ -0,0 +1,97 @@
+import logging
+from typing import Dict, List
+
+import gevent
+from gevent.event import AsyncResult
+
+from eventbot import settings, storage
+from eventbot.models.event import Event
+from eventbot.utils import stats
+
+logger = logging.getLogger(__name__)
+
+
+class _Change(object):
+
+    def __init__(self, event_obj: Event, user_id: str, register: bool) -> None:
+        self.event_obj = event_obj
+        self.user_id = user_id
+        self.register = register
+        self.result = AsyncResult()
+
+
+class AttendeeWriteCoalescer(object):
+    """
+    Coalesces attendee changes for the same event into a single write, per
+    worker.
+
+    The first change for an event starts a flusher greenlet, which waits for
+    `window` seconds, then writes every change that has arrived for the event
+    so far. Changes that arrive while a write is in flight are collected and
+    written together by the same flusher, once the write finishes. A lone
+    change goes through the atomic per-attendee update; a batch is applied to
+    a fresh read of the event with a single conditional write.
+
+    Every caller blocks until its change is written, gets back whether its own
+    change took effect, and has its event object updated to the new state.
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._pending: Dict[str, List[_Change]] = {}
+
+    def register(self, event_obj: Event, user_id: str) -> bool:
+        return self._submit(_Change(event_obj, user_id, True))
+
+    def unregister(self, event_obj: Event, user_id: str) -> bool:
+        return self._submit(_Change(event_obj, user_id, False))
+
+    def _submit(self, change: _Change) -> bool:
+        event_id = change.event_obj.event_id
+        pending = self._pending.get(event_id)
+        if pending is None:
+            pending = self._pending[event_id] = []
+            gevent.spawn(self._flush, event_id)
+        pending.append(change)
+        return change.result.get()
+
+    @stats.pipelined()
+    def _flush(self, event_id: str) -> None:
+        gevent.sleep(self.window)
+        while self._pending[event_id]:
+            batch = self._pending[event_id]
+            self._pending[event_id] = []
+            try:
+                self._write(event_id, batch)
+            except Exception as e:
+                for change in batch:
+                    if not change.result.ready():
+                        change.result.set_exception(e)
+        del self._pending[event_id]
+
+    def _write(self, event_id: str, batch: List[_Change]) -> None:
+        backend = storage.get_backend()
+        if len(batch) == 1:
+            change = batch[0]
+            if change.register:
+                change.result.set(backend.register_attendee(change.event_obj, change.user_id))
+            else:
+                change.result.set(backend.unregister_attendee(change.event_obj, change.user_id))
+            return
+        logger.debug(f'Coalescing {len(batch)} attendee changes for event {event_id}')
+        stats.timing('registration.coalesced_batch_size', len(batch))
+        event_obj = backend.get(Event, event_id)
+        results = backend.apply_attendee_changes(
+            event_obj,
+            [(change.user_id, change.register) for change in batch],
+        )
+        for change, result in zip(batch, results):
+            change.event_obj.attendees = event_obj.attendees
+            change.event_obj.attendee_count = event_obj.attendee_count
+            change.event_obj.modified_date = event_obj.modified_date
+            change.event_obj.payment_summary = event_obj.payment_summary
+            change.event_obj.version = event_obj.version
+            change.result.set(result)
+
+
+coalescer = AttendeeWriteCoalescer(settings.REGISTRATION_COALESCE_WINDOW)
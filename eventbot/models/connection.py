@@ -0,0 +1,108 @@
+import logging
+import os
+import time
+from typing import Any, Iterable, Optional
+
+import gevent
+from botocore.vendored import requests
+
+from eventbot import settings
+from eventbot.models import throttle
+from eventbot.utils import stats
+
+logger = logging.getLogger(__name__)
+
+_SESSION = None
+_SESSION_PID = None
+
+
+class PooledSession(requests.Session):
+    """
+    A requests session whose connection pool holds DYNAMODB_POOL_SIZE
+    connections, so that as many concurrent greenlets can reuse a connection,
+    rather than opening and discarding their own. Every request, including
+    pynamodb's retries, goes through the worker's throttle.
+    """
+
+    def __init__(self) -> None:
+        super(PooledSession, self).__init__()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.DYNAMODB_POOL_SIZE,
+        )
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def send(self, request: Any, **kwargs) -> Any:
+        limiter = throttle.before_send(request)
+        response = super(PooledSession, self).send(request, **kwargs)
+        throttle.after_send(limiter, response)
+        return response
+
+
+def shared_session() -> PooledSession:
+    """
+    Return this process's session, shared by the connections of every model.
+    Used as the models' session_cls; sessions aren't shared across a fork.
+    """
+    global _SESSION, _SESSION_PID
+    if _SESSION is None or _SESSION_PID != os.getpid():
+        _SESSION = PooledSession()
+        _SESSION_PID = os.getpid()
+    return _SESSION
+
+
+def request_timeout() -> Any:
+    """
+    The (connect, read) timeouts, in seconds, for the models' requests.
+    """
+    return (settings.DYNAMODB_CONNECT_TIMEOUT, settings.DYNAMODB_READ_TIMEOUT)
+
+
+def reset(models: Optional[Iterable[Any]] = None) -> None:
+    """
+    Drop the session and the models' connections, so that they're recreated
+    by this process rather than inherited from its parent.
+    """
+    global _SESSION, _SESSION_PID
+    _SESSION = None
+    _SESSION_PID = None
+    throttle.reset()
+    for model in models or _models():
+        model._connection = None
+
+
+def warm_up(models: Optional[Iterable[Any]] = None) -> None:
+    """
+    Create the models' DynamoDB clients, resolving credentials, and fetch
+    each table's description, concurrently, so that the pooled connections,
+    TLS sessions and table metadata pynamodb needs before its first call to a
+    table are ready before the first request.
+
+    Failures are logged rather than raised: the worker can still serve
+    requests, paying for the setup on first use as it would have anyway.
+    """
+    if settings.STORAGE_BACKEND != 'dynamodb' or not settings.DYNAMODB_WARM_UP:
+        return
+    models = list(models or _models())
+    reset(models)
+    start = time.monotonic()
+    jobs = [gevent.spawn(_warm_up_model, model) for model in models]
+    gevent.joinall(jobs)
+    stats.timing('dynamodb.warm_up', (time.monotonic() - start) * 1000)
+
+
+def _warm_up_model(model: Any) -> None:
+    try:
+        connection = model._get_connection().connection
+        connection.get_meta_table(model.Meta.table_name)
+    except Exception:
+        stats.incr('dynamodb.warm_up.error')
+        logger.warning(f'Failed to warm up the connection to {model.Meta.table_name}', exc_info=True)
+
+
+def _models():
+    from eventbot.models.attendee import Attendee
+    from eventbot.models.event import Event
+    from eventbot.models.user import User
+    return [Event, User, Attendee]
@@ -1,30 +1,165 @@
-from datetime import datetime
+import copy
+import time
+from datetime import datetime, timedelta
 from typing import (
     Any,
+    Callable,
     Dict,
     Iterator,
+    List,
     Optional,
     Text,
+    Tuple,
 )
 
+import gevent
 from pynamodb.attributes import (
+    BooleanAttribute,
     ListAttribute,
     NumberAttribute,
+    NumberSetAttribute,
     MapAttribute,
     UnicodeAttribute,
     UTCDateTimeAttribute,
 )
+from pynamodb.exceptions import DeleteError, PutError, UpdateError
 from pynamodb.models import Model
-from pynamodb.indexes import GlobalSecondaryIndex, AllProjection
+from pynamodb.indexes import GlobalSecondaryIndex, IncludeProjection
 
 from eventbot import settings
+from eventbot.models import connection
+from eventbot.models.attendee import Attendee
+from eventbot.models.cache import CachedModelMixin
+from eventbot.models.versioned import VersionedModelMixin, _is_conditional_check_failure
+from eventbot.utils.cache import TTLCache
+
+
+# Looks up the venmo handles of users, by user_id; see PaymentSummaryMap.
+HandleLookup = Callable[[List[Text]], Dict[Text, Optional[Text]]]
+
+
+class AttendeeMigrationInProgress(Exception):
+    """
+    Raised when an event's attendees are being migrated by another worker,
+    and the migration didn't finish in time.
+    """
+
+
+class EventClosed(Exception):
+    """
+    Raised when changing an event that has been closed.
+    """
 
 
 class AttendeeMap(MapAttribute):
     attendee = UnicodeAttribute()
 
 
+class PaymentEntryMap(MapAttribute):
+    user_id = UnicodeAttribute()
+    venmo_handle = UnicodeAttribute(null=True)
+
+
+class PaymentSummaryMap(MapAttribute):
+    """
+    What an event's message shows about its attendees' payment details, kept
+    on the event so that rendering it doesn't read every attendee's user.
+    The counts cover every attendee; attendees lists the first of them, up
+    to RENDER_ATTENDEE_LIMIT, in order of registration, with their venmo
+    handles.
+
+    Summaries are maintained by every write that changes an attendee, and
+    by venmo handle changes. Events without one, such as those created
+    before summaries, or whose attendees were replaced in bulk, are rendered
+    from their attendees' users; the repair-summaries command builds them.
+    """
+    with_handle = NumberAttribute(default=0)
+    without_handle = NumberAttribute(default=0)
+    attendees = ListAttribute(of=PaymentEntryMap, default=list)
+
+    def _count(self, venmo_handle: Optional[Text], delta: int) -> None:
+        if venmo_handle:
+            self.with_handle += delta
+        else:
+            self.without_handle += delta
+
+    def _entry(self, user_id: Text) -> Optional[PaymentEntryMap]:
+        for entry in self.attendees:
+            if entry.user_id == user_id:
+                return entry
+        return None
+
+    def add_attendee(self, user_id: Text, venmo_handle: Optional[Text]) -> None:
+        self._count(venmo_handle, 1)
+        if len(self.attendees) < settings.RENDER_ATTENDEE_LIMIT:
+            self.attendees.append(PaymentEntryMap(user_id=user_id, venmo_handle=venmo_handle or None))
+
+    def remove_attendee(self, user_id: Text, venmo_handle: Optional[Text]) -> None:
+        entry = self._entry(user_id)
+        if entry is not None:
+            # The listed handle is the one that was counted.
+            venmo_handle = entry.venmo_handle
+            self.attendees = [x for x in self.attendees if x.user_id != user_id]
+        self._count(venmo_handle, -1)
+
+    def set_attendee_handle(self, user_id: Text, old_handle: Optional[Text], new_handle: Optional[Text]) -> None:
+        entry = self._entry(user_id)
+        if entry is not None:
+            old_handle = entry.venmo_handle
+            entry.venmo_handle = new_handle or None
+        if bool(old_handle) != bool(new_handle):
+            self._count(old_handle, -1)
+            self._count(new_handle, 1)
+
+    def apply_attendee_changes(
+            self,
+            changes: List[Tuple[Text, bool]],
+            results: List[bool],
+            get_handles: HandleLookup,
+    ) -> None:
+        """
+        Apply the (user_id, register) changes that took effect, looking up
+        the attendees' venmo handles with get_handles.
+        """
+        applied = [change for change, result in zip(changes, results) if result]
+        handles = get_handles([user_id for user_id, _ in applied]) if applied else {}
+        for user_id, register in applied:
+            if register:
+                self.add_attendee(user_id, handles.get(user_id))
+            else:
+                self.remove_attendee(user_id, handles.get(user_id))
+
+    def needs_refill(self, registered_count: int) -> bool:
+        """
+        Whether listed attendees have left an event with attendees who
+        aren't listed; see refill.
+        """
+        return len(self.attendees) < min(registered_count, settings.RENDER_ATTENDEE_LIMIT)
+
+    def refill(
+            self,
+            user_ids: List[Text],
+            get_handles: HandleLookup,
+    ) -> None:
+        """
+        List the given first attendees of the event, looking up the handles
+        of those who weren't listed with get_handles. They're already counted.
+        """
+        user_ids = user_ids[:settings.RENDER_ATTENDEE_LIMIT]
+        listed = {x.user_id: x for x in self.attendees}
+        handles = get_handles([x for x in user_ids if x not in listed])
+        self.attendees = [
+            listed.get(user_id) or PaymentEntryMap(user_id=user_id, venmo_handle=handles.get(user_id) or None)
+            for user_id in user_ids
+        ]
+
+
 class EventStatusIndex(GlobalSecondaryIndex):
+    """
+    Events by status, ordered by start date, with just the fields needed to
+    list them. Events without a given start date are indexed at their
+    creation date; see Event.touch.
+    """
 
     class Meta:
         index_name = settings.DYNAMODB_GSI_EVENT_STATUS
@@ -33,20 +168,30 @@ class EventStatusIndex(GlobalSecondaryIndex):
         if settings.DYNAMODB_URL:
             host = settings.DYNAMODB_URL
 
-        projection = AllProjection()
+        projection = IncludeProjection(['name', 'creator', 'end_date', 'start_date_given'])
 
-    event_id = UnicodeAttribute(hash_key=True)
-    status = UTCDateTimeAttribute(range_key=True)
+    status = UnicodeAttribute(hash_key=True)
+    start_date = UTCDateTimeAttribute(range_key=True)
 
 
-class Event(Model):
+class Event(CachedModelMixin, VersionedModelMixin, Model):
 
     STATUS_OPEN = 'open'
+    STATUS_CLOSED = 'closed'
+
+    # Seconds after which an unfinished attendee migration can be taken over
+    # by another worker, how long to wait for one to finish, and how often to
+    # check whether it has.
+    ATTENDEE_MIGRATION_TIMEOUT = 60
+    ATTENDEE_MIGRATION_WAIT = 10.0
+    ATTENDEE_MIGRATION_POLL_INTERVAL = 0.2
 
     class Meta:
         table_name = settings.DYNAMODB_TABLE_EVENT
         if settings.DYNAMODB_URL:
             host = settings.DYNAMODB_URL
+        session_cls = connection.shared_session
+        request_timeout_seconds = connection.request_timeout()
 
     event_id = UnicodeAttribute(hash_key=True)
     name = UnicodeAttribute()
@@ -54,15 +199,31 @@ class Event(Model):
     created_date = UTCDateTimeAttribute()
     modified_date = UTCDateTimeAttribute()
     start_date = UTCDateTimeAttribute(null=True)
+    # Whether the start date was given, rather than defaulted; see touch.
+    start_date_given = BooleanAttribute(null=True)
     end_date = UTCDateTimeAttribute(null=True)
     status = UnicodeAttribute(default=STATUS_OPEN)
     creator = UnicodeAttribute()
+    # The channel of the event's message; set when the event is edited.
+    channel_id = UnicodeAttribute(null=True)
+    # Legacy list of attendees; see migrate_attendees.
     attendees = ListAttribute(of=AttendeeMap, null=True)
+    attendee_count = NumberAttribute(default=0)
+    attendee_migration_date = UTCDateTimeAttribute(null=True)
     extra_attendees = NumberAttribute(default=0)
     cost = NumberAttribute(default=0)
+    # See PaymentSummaryMap.
+    payment_summary = PaymentSummaryMap(null=True)
+    # The offsets, in minutes before the start, of the reminders sent.
+    reminders_sent = NumberSetAttribute(null=True)
+    # Incremented by every write; see VersionedModelMixin.
+    version = NumberAttribute(null=True)
 
     event_status_index = EventStatusIndex()
 
+    _hash_key_name = 'event_id'
+    _cache = TTLCache(settings.EVENT_CACHE_MAX_SIZE, settings.EVENT_CACHE_TTL)
+
     @classmethod
     def get_all_paged(
             cls,
@@ -72,6 +233,29 @@ class Event(Model):
         last_evaluated_key = cls.format_last_evaluated_key(next_page)
         return cls.scan(limit=limit, last_evaluated_key=last_evaluated_key)
 
+    @classmethod
+    def query_by_status(
+            cls,
+            status: str,
+            since: Optional[datetime] = None,
+            limit: Optional[int] = None,
+            last_evaluated_key: Optional[dict] = None,
+    ) -> Iterator['Event']:
+        """
+        Query the status index for events with status, in order of start date,
+        optionally only those starting at or after since. The events only have
+        the attributes projected into the index.
+        """
+        range_key_condition = None
+        if since is not None:
+            range_key_condition = Event.start_date >= since
+        return cls.event_status_index.query(
+            status,
+            range_key_condition=range_key_condition,
+            limit=limit,
+            last_evaluated_key=last_evaluated_key,
+        )
+
     @classmethod
     def format_last_evaluated_key(
             cls,
@@ -85,45 +269,266 @@ class Event(Model):
         }
 
     @property
-    def total_attendees(self) -> int:
+    def attendees_migrated(self) -> bool:
+        """
+        Whether this event's attendees are kept in the attendee table, rather
+        than in the legacy attendees list of the event item.
+        """
+        return self.attendees is None
+
+    @property
+    def registered_count(self) -> int:
+        """
+        The number of attendees registered for this event, without extra
+        attendees.
+        """
         if self.attendees is None:
-            attendees = 0
-        else:
-            attendees = len(self.attendees)
-        return attendees + self.extra_attendees
+            return self.attendee_count or 0
+        return len(self.attendees)
+
+    @property
+    def total_attendees(self) -> int:
+        return self.registered_count + self.extra_attendees
 
     @property
     def cost_per_attendee(self) -> int:
         return (self.cost / max(self.total_attendees, 1))
 
-    def user_is_attendee(self, user_id: Text) -> bool:
-        if self.attendees is None:
+    def migrate_attendees(self) -> None:
+        """
+        Move the legacy attendees list of this event into the attendee table,
+        with batched writes, and replace it with a count.
+
+        A migration is claimed with a conditional write, so only one worker
+        migrates an event at a time; other workers wait for it to finish. A
+        claim that isn't finished within ATTENDEE_MIGRATION_TIMEOUT seconds,
+        for instance because its worker died, is taken over.
+        """
+        deadline = time.monotonic() + self.ATTENDEE_MIGRATION_WAIT
+        while not self.attendees_migrated:
+            if self._claim_attendee_migration():
+                self._finish_attendee_migration()
+                return
+            if time.monotonic() > deadline:
+                raise AttendeeMigrationInProgress(
+                    f'Attendees of event {self.event_id} are being migrated by another worker'
+                )
+            gevent.sleep(self.ATTENDEE_MIGRATION_POLL_INTERVAL)
+            self.refresh(consistent_read=True)
+
+    def _claim_attendee_migration(self) -> bool:
+        now = datetime.utcnow()
+        expired = now - timedelta(seconds=self.ATTENDEE_MIGRATION_TIMEOUT)
+        try:
+            self.update(
+                actions=[Event.attendee_migration_date.set(now)],
+                condition=(
+                    Event.attendees.exists() &
+                    (Event.attendee_migration_date.does_not_exist() |
+                     (Event.attendee_migration_date < expired))
+                ),
+            )
+        except UpdateError as e:
+            if not _is_conditional_check_failure(e):
+                raise
             return False
-        for attendee in self.attendees:
-            if attendee.attendee == user_id:
-                return True
-        return False
-
-    def add_attendee(self, user_id: Text) -> None:
-        attendee = AttendeeMap()
-        attendee.attendee = user_id
-        if self.attendees:
-            self.attendees.append(attendee)
-        else:
-            self.attendees = [attendee]
+        return True
 
-    def remove_attendee(self, user_id: Text) -> None:
-        if self.attendees is None:
-            return
-        # TODO: there must be a more efficient way to do this, right?
-        attendees = []
-        for attendee in self.attendees:
-            if attendee.attendee != user_id:
-                attendees.append(attendee)
-        self.attendees = attendees
+    def _finish_attendee_migration(self) -> None:
+        # The attendees list can't change while the migration is claimed, and
+        # the update that claimed it returned the current list.
+        user_ids = list(dict.fromkeys(x.attendee for x in self.attendees or []))
+        registered_date = self.created_date or datetime.utcnow()
+        with Attendee.batch_write() as batch:
+            for i, user_id in enumerate(user_ids):
+                # Spread the registration dates, to keep the order of the list.
+                batch.save(Attendee(
+                    event_id=self.event_id,
+                    user_id=user_id,
+                    registered_date=registered_date + timedelta(microseconds=i),
+                ))
+        self.update(
+            actions=[
+                Event.attendees.remove(),
+                Event.attendee_migration_date.remove(),
+                Event.attendee_count.set(len(user_ids)),
+                Event.modified_date.set(datetime.utcnow()),
+            ],
+            condition=Event.attendee_migration_date == self.attendee_migration_date,
+        )
+        # update only sets the attributes that are returned, not removed ones.
+        self.attendees = None
+        self.attendee_migration_date = None
 
-    def save(self, *args, **kwargs) -> Dict[str, Any]:
+    def is_attendee(self, user_id: Text) -> bool:
+        if not self.attendees_migrated:
+            return any(x.attendee == user_id for x in self.attendees)
+        return Attendee.exists_for(self.event_id, user_id)
+
+    def list_attendees(
+            self,
+            limit: Optional[int] = None,
+            last_evaluated_key: Optional[dict] = None,
+    ) -> Tuple[List[Text], Optional[dict]]:
+        """
+        Return a page of up to limit attendee user_ids, in order of
+        registration, and the key to pass to get the next page, if any.
+        """
+        if not self.attendees_migrated:
+            start = (last_evaluated_key or {}).get('offset', 0)
+            end = len(self.attendees) if limit is None else start + limit
+            user_ids = [x.attendee for x in self.attendees[start:end]]
+            if end < len(self.attendees):
+                return user_ids, {'offset': end}
+            return user_ids, None
+        if last_evaluated_key is not None and 'offset' in last_evaluated_key:
+            # The event was migrated while its attendees were being listed.
+            last_evaluated_key = None
+        results = Attendee.query_by_event(
+            self.event_id,
+            limit=limit,
+            last_evaluated_key=last_evaluated_key,
+        )
+        user_ids = [x.user_id for x in results]
+        if limit is not None and len(user_ids) == limit:
+            return user_ids, results.last_evaluated_key
+        return user_ids, None
+
+    def register_attendee(
+            self,
+            user_id: Text,
+            get_handles: Optional[HandleLookup] = None,
+    ) -> bool:
+        """
+        Add user_id to the attendees of this event, with a conditional put of
+        its attendee item, and increment the attendee count. The local object
+        is updated with the new state of the item.
+
+        Returns False if the user was already registered.
+        """
+        return self.apply_attendee_changes([(user_id, True)], get_handles)[0]
+
+    def unregister_attendee(
+            self,
+            user_id: Text,
+            get_handles: Optional[HandleLookup] = None,
+    ) -> bool:
+        """
+        Remove user_id from the attendees of this event, with a conditional
+        delete of its attendee item, and decrement the attendee count.
+
+        Returns False if the user was not registered.
+        """
+        return self.apply_attendee_changes([(user_id, False)], get_handles)[0]
+
+    def apply_attendee_changes(
+            self,
+            changes: List[Tuple[Text, bool]],
+            get_handles: Optional[HandleLookup] = None,
+    ) -> List[bool]:
+        """
+        Apply a batch of (user_id, register) changes to the attendees of this
+        event, in order, then update the attendee count, and the payment
+        summary, with a single write. Events that still have a legacy
+        attendees list are migrated first. get_handles looks up the venmo
+        handles of users, for the summary; without it, the summary is
+        removed.
+
+        Returns, for each change, whether it took effect (False meaning
+        already registered, or not registered, respectively).
+        """
+        self.migrate_attendees()
+        results = []
+        for user_id, register in changes:
+            attendee = Attendee(event_id=self.event_id, user_id=user_id)
+            try:
+                if register:
+                    attendee.registered_date = datetime.utcnow()
+                    attendee.save(condition=Attendee.user_id.does_not_exist())
+                else:
+                    attendee.delete(condition=Attendee.user_id.exists())
+            except (PutError, DeleteError) as e:
+                if not _is_conditional_check_failure(e):
+                    raise
+                results.append(False)
+                continue
+            results.append(True)
+        if any(results):
+            self._update_attendee_count(changes, results, get_handles)
+        return results
+
+    def _update_attendee_count(
+            self,
+            changes: List[Tuple[Text, bool]],
+            results: List[bool],
+            get_handles: Optional[HandleLookup],
+    ) -> None:
+        delta = sum(1 if register else -1 for (_, register), result in zip(changes, results) if result)
+        actions = [
+            Event.attendee_count.add(delta),
+            Event.modified_date.set(datetime.utcnow()),
+        ]
+        if get_handles is not None:
+            # The summary is rewritten whole, so the update is conditional on
+            # the version the summary was changed from; this event may have
+            # come from a cache.
+            for _ in range(settings.EDIT_CONFLICT_RETRIES + 1):
+                summary_actions = []
+                if self.payment_summary is not None:
+                    summary = copy.deepcopy(self.payment_summary)
+                    summary.apply_attendee_changes(changes, results, get_handles)
+                    if summary.needs_refill(self.registered_count + delta):
+                        user_ids, _ = self.list_attendees(limit=settings.RENDER_ATTENDEE_LIMIT)
+                        summary.refill(user_ids, get_handles)
+                    summary_actions.append(Event.payment_summary.set(summary))
+                if self.version is None:
+                    condition = Event.version.does_not_exist()
+                else:
+                    condition = Event.version == self.version
+                try:
+                    self.update(actions=actions + summary_actions, condition=Event.event_id.exists() & condition)
+                except UpdateError as e:
+                    if not _is_conditional_check_failure(e):
+                        raise
+                    self.refresh(consistent_read=True)
+                    continue
+                return
+        # Without handles, or after too many conflicts, the summary can't be
+        # kept up to date, so it's dropped until it's repaired.
+        self.update(
+            actions=actions + [Event.payment_summary.remove()],
+            condition=Event.event_id.exists(),
+        )
+
+    def claim_reminder(self, offset: int) -> bool:
+        """
+        Record that the reminder offset minutes before this event's start
+        is being sent, with a conditional update, so that only one worker
+        sends it. Returns False if it already was.
+        """
+        try:
+            self.update(
+                actions=[Event.reminders_sent.add({offset})],
+                condition=Event.event_id.exists() & ~Event.reminders_sent.contains(offset),
+            )
+        except UpdateError as e:
+            if not _is_conditional_check_failure(e):
+                raise
+            return False
+        return True
+
+    def touch(self) -> None:
+        """
+        Set the created and modified dates, for a save. Events without an
+        explicit start date start when they're created, so that they're
+        listed by the status index; start_date_given tells them apart.
+        """
         if not self.created_date:
             self.created_date = datetime.utcnow()
+        if not self.start_date:
+            self.start_date = self.created_date
         self.modified_date = datetime.utcnow()
+
+    def save(self, *args, **kwargs) -> Dict[str, Any]:
+        self.touch()
         return super(Event, self).save(*args, **kwargs)
@@ -0,0 +1,146 @@
+import logging
+from typing import Any, Callable, Iterable, List, Optional
+
+import gevent
+from gevent.event import AsyncResult
+
+from eventbot import storage
+from eventbot.models.event import Event
+from eventbot.models.user import User
+from eventbot.utils import stats, tracing
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoader(object):
+    """
+    A request-scoped, DataLoader-style loader for a model, backed by the
+    storage backend.
+
+    Keys requested with ``load`` are queued, and a single batch fetch for all
+    queued keys is dispatched in a separate greenlet, which runs the next time
+    the requesting greenlet yields (for instance when it waits on a result, or
+    does network I/O). This means that:
+
+    * keys requested together are deduplicated and fetched in one round trip
+    * loads for different models are fetched concurrently
+    * loads can be started early and waited on only when needed, so that
+      fetches overlap with other work, like writes
+
+    Results are AsyncResults; ``get()`` on the result of a key that doesn't
+    exist raises the model's DoesNotExist exception. Keys that aren't found
+    are looked up again with fallback, if given, which takes a list of keys
+    and returns the items it finds.
+    """
+
+    def __init__(self, model: Any, fallback: Optional[Callable[[List], List]] = None) -> None:
+        self.model = model
+        self.fallback = fallback
+        self._results = {}
+        self._queue = []
+        self._dispatcher = None
+
+    def load(self, key: Any) -> AsyncResult:
+        result = self._results.get(key)
+        if result is None:
+            result = AsyncResult()
+            self._results[key] = result
+            self._queue.append(key)
+            if self._dispatcher is None:
+                self._dispatcher = gevent.spawn(tracing.bind(self._dispatch))
+        return result
+
+    def load_many(self, keys: Iterable[Any]) -> List[AsyncResult]:
+        return [self.load(key) for key in keys]
+
+    def get(self, key: Any) -> Any:
+        return self.load(key).get()
+
+    def get_many(self, keys: Iterable[Any]) -> List[Any]:
+        """
+        Return the items for keys, in order, omitting keys that don't exist.
+        """
+        items = []
+        for result in self.load_many(keys):
+            try:
+                items.append(result.get())
+            except self.model.DoesNotExist:
+                pass
+        return items
+
+    def prime(self, key: Any, obj: Any) -> None:
+        """
+        Set the result for a key that the caller already has, such as an
+        item it just wrote, so that later loads don't fetch it.
+        """
+        result = AsyncResult()
+        result.set(obj)
+        self._results[key] = result
+
+    @stats.pipelined()
+    def _dispatch(self) -> None:
+        keys = self._queue
+        self._queue = []
+        self._dispatcher = None
+        try:
+            items = storage.get_backend().batch_get(self.model, keys)
+        except Exception as e:
+            logger.exception(f'Failed to load {self.model.__name__} items')
+            for key in keys:
+                self._results.pop(key).set_exception(e)
+            return
+        missing = set(keys).difference(getattr(item, self.model._hash_key_name) for item in items)
+        if missing and self.fallback is not None:
+            try:
+                items.extend(self.fallback([key for key in keys if key in missing]))
+            except Exception:
+                logger.exception(f'Failed to load {self.model.__name__} items from the fallback')
+        for item in items:
+            self._results[getattr(item, self.model._hash_key_name)].set(item)
+        for key in keys:
+            if not self._results[key].ready():
+                self._results[key].set_exception(self.model.DoesNotExist())
+
+
+class Loaders(object):
+    """
+    The set of loaders for a single interaction. Create one per request; the
+    loaders hold on to every item they've fetched.
+    """
+
+    def __init__(self) -> None:
+        # Events that aren't in the event table may have been archived.
+        self.event = ModelLoader(Event, fallback=_get_archived_events)
+        self.user = ModelLoader(User)
+        self._attendee_summaries = {}
+
+    def get_attendee_summary(self, event_obj: Event, limit: int) -> 'AttendeeSummary':
+        """
+        Return the first limit attendees of an event, listing them from
+        storage once per state of the event. The cost doesn't depend on the
+        number of attendees.
+        """
+        key = (event_obj.event_id, event_obj.modified_date, limit)
+        summary = self._attendee_summaries.get(key)
+        if summary is None:
+            user_ids = []
+            if event_obj.registered_count:
+                user_ids, _ = storage.get_backend().list_attendees(event_obj, limit=limit)
+            summary = AttendeeSummary(user_ids, max(event_obj.registered_count - len(user_ids), 0))
+            self._attendee_summaries[key] = summary
+        return summary
+
+
+def _get_archived_events(event_ids: List[str]) -> List[Event]:
+    return storage.get_backend().get_archived_events(event_ids)
+
+
+class AttendeeSummary(object):
+    """
+    The first attendees of an event, in order of registration, and the number
+    of attendees after them.
+    """
+
+    def __init__(self, user_ids: List[str], remaining: int) -> None:
+        self.user_ids = user_ids
+        self.remaining = remaining
@@ -0,0 +1,236 @@
+"""
+Client-side throttling of DynamoDB requests, shared by every greenlet of a
+worker. Each table has a read and a write limiter: token buckets, in
+capacity units per second, whose rate is halved whenever DynamoDB throttles
+a request, and recovers gradually as requests succeed. Requests are charged
+a unit up front, then corrected by the capacity DynamoDB reports they
+consumed.
+
+When a bucket is empty, requests wait for it in order of priority, so that
+interactive requests go ahead of background and bulk work, rather than
+retrying on their own and making the throttling worse. Interactive and
+background requests only wait up to DYNAMODB_THROTTLE_MAX_WAIT.
+"""
+import heapq
+import itertools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from gevent.event import Event as GeventEvent
+from pynamodb.signals import pre_dynamodb_send
+
+from eventbot import settings
+from eventbot.utils import stats
+from eventbot.utils.ratelimit import TokenBucket
+
+# Priorities; lower goes first.
+INTERACTIVE = 0
+BACKGROUND = 1
+BULK = 2
+
+_READ_OPERATIONS = frozenset(['GetItem', 'BatchGetItem', 'Query', 'Scan'])
+_WRITE_OPERATIONS = frozenset(['PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem'])
+
+_THROTTLING_ERRORS = (b'ProvisionedThroughputExceededException', b'ThrottlingException', b'RequestLimitExceeded')
+_CAPACITY_UNITS = re.compile(rb'"CapacityUnits":\s*([0-9.]+)')
+
+# Rate, in units per second, regained for each successful request.
+RECOVERY_PER_SUCCESS = 1.0
+# Factor the rate is multiplied by when a request is throttled.
+BACKOFF_FACTOR = 0.5
+
+# The operation being sent, and the priority of its work, per greenlet
+# (threading.local is greenlet-local once gevent has monkey patched).
+_local = threading.local()
+
+_limiters: Dict[Tuple[str, str], 'AdaptiveLimiter'] = {}
+
+
+class AdaptiveLimiter(TokenBucket):
+    """
+    A token bucket that adapts its rate to throttling, and serves waiting
+    greenlets in order of priority. It allows a second's worth of burst at
+    its current rate.
+    """
+
+    def __init__(self, name: str, rate: float, min_rate: float, max_rate: float) -> None:
+        super().__init__(rate)
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._waiters: List = []
+        self._sequence = itertools.count()
+
+    def _set_rate(self, rate: float) -> None:
+        # Refill at the old rate up to now, before the new one applies.
+        self._refill()
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self._tokens = min(self._tokens, self.capacity)
+
+    def acquire(self, amount: float = 1, priority: int = INTERACTIVE, max_wait: Optional[float] = None) -> float:
+        """
+        Take amount units, waiting behind any greenlets of the same or a
+        higher priority, for at most max_wait seconds. Returns the time
+        waited. After max_wait, the units are taken anyway.
+        """
+        self._refill()
+        if not self._waiters and self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        start = time.monotonic()
+        entry = (priority, next(self._sequence), GeventEvent())
+        previous_head = self._waiters[0] if self._waiters else None
+        heapq.heappush(self._waiters, entry)
+        if previous_head is not None and self._waiters[0] is entry:
+            # Wake the previous head, so that it goes back to waiting its turn.
+            previous_head[2].set()
+        try:
+            while True:
+                waited = time.monotonic() - start
+                remaining = None if max_wait is None else max_wait - waited
+                if remaining is not None and remaining <= 0:
+                    stats.incr(f'dynamodb.throttle.{self.name}.timeout')
+                    break
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self._waiters[0] is entry:
+                    if self._tokens >= needed:
+                        break
+                    delay = (needed - self._tokens) / self.rate
+                else:
+                    delay = None
+                if remaining is not None:
+                    delay = remaining if delay is None else min(delay, remaining)
+                entry[2].clear()
+                entry[2].wait(delay)
+        finally:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            if self._waiters:
+                self._waiters[0][2].set()
+        self._tokens -= amount
+        waited = time.monotonic() - start
+        stats.timing(f'dynamodb.throttle.{self.name}.wait', waited * 1000)
+        return waited
+
+    def charge(self, amount: float) -> None:
+        """
+        Take (or, if negative, return) units without waiting; used to
+        correct the estimate of what a request cost.
+        """
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+    def throttled(self) -> None:
+        self._set_rate(max(self.min_rate, self.rate * BACKOFF_FACTOR))
+        self._tokens = min(self._tokens, 0.0)
+        stats.incr(f'dynamodb.throttle.{self.name}.throttled')
+
+    def succeeded(self) -> None:
+        if self.rate < self.max_rate:
+            self._set_rate(min(self.max_rate, self.rate + RECOVERY_PER_SUCCESS))
+
+
+def get_limiter(table_name: str, kind: str) -> AdaptiveLimiter:
+    """
+    Return the worker's read or write limiter for a table.
+    """
+    key = (table_name, kind)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = AdaptiveLimiter(
+            f'{table_name}.{kind}',
+            settings.DYNAMODB_THROTTLE_MAX_RATE,
+            settings.DYNAMODB_THROTTLE_MIN_RATE,
+            settings.DYNAMODB_THROTTLE_MAX_RATE,
+        )
+        _limiters[key] = limiter
+    return limiter
+
+
+def reset() -> None:
+    _limiters.clear()
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """
+    Send the DynamoDB requests this greenlet makes within the block with a
+    priority.
+    """
+    previous = getattr(_local, 'priority', INTERACTIVE)
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority() -> int:
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+def before_send(request: Any) -> Optional[AdaptiveLimiter]:
+    """
+    Wait for the limiter of the request about to be sent, if it's a limited
+    operation, and return the limiter.
+    """
+    if not settings.DYNAMODB_THROTTLE_ENABLED:
+        return None
+    operation = getattr(_local, 'operation', None)
+    if operation is None:
+        return None
+    operation_name, table_name = operation
+    if operation_name in _READ_OPERATIONS:
+        kind = 'read'
+    elif operation_name in _WRITE_OPERATIONS:
+        kind = 'write'
+    else:
+        return None
+    if table_name is None:
+        table_name = _batch_table_name(request)
+    level = current_priority()
+    limiter = get_limiter(table_name, kind)
+    limiter.acquire(
+        priority=level,
+        max_wait=None if level == BULK else settings.DYNAMODB_THROTTLE_MAX_WAIT,
+    )
+    return limiter
+
+
+def after_send(limiter: Optional[AdaptiveLimiter], response: Any) -> None:
+    """
+    Adapt the limiter to the response: back off if DynamoDB throttled the
+    request, and otherwise correct the charge with the consumed capacity.
+    """
+    if limiter is None:
+        return
+    if response.status_code == 400 and any(x in response.content for x in _THROTTLING_ERRORS):
+        limiter.throttled()
+        return
+    if response.status_code < 300:
+        limiter.succeeded()
+        match = _CAPACITY_UNITS.search(response.content)
+        if match:
+            limiter.charge(float(match.group(1)) - 1)
+
+
+def _batch_table_name(request: Any) -> str:
+    # pynamodb doesn't signal the table of batch operations; our batches
+    # only ever touch one table.
+    try:
+        return ','.join(sorted(json.loads(request.body)['RequestItems']))
+    except (KeyError, TypeError, ValueError):
+        return 'unknown'
+
+
+def _on_pre_dynamodb_send(sender, operation_name, table_name, req_uuid) -> None:
+    _local.operation = (operation_name, table_name)
+
+
+pre_dynamodb_send.connect(_on_pre_dynamodb_send)
@@ -7,25 +7,37 @@ from typing import (
 )
 
 from pynamodb.attributes import (
+    NumberAttribute,
     UnicodeAttribute,
     UTCDateTimeAttribute,
 )
 from pynamodb.models import Model
 
 from eventbot import settings
+from eventbot.models import connection
+from eventbot.models.cache import CachedModelMixin
+from eventbot.models.versioned import VersionedModelMixin
+from eventbot.utils.cache import TTLCache
 
 
-class User(Model):
+class User(CachedModelMixin, VersionedModelMixin, Model):
 
     class Meta:
         table_name = settings.DYNAMODB_TABLE_USER
         if settings.DYNAMODB_URL:
             host = settings.DYNAMODB_URL
+        session_cls = connection.shared_session
+        request_timeout_seconds = connection.request_timeout()
 
     user_id = UnicodeAttribute(hash_key=True)
     venmo_handle = UnicodeAttribute()
     created_date = UTCDateTimeAttribute()
     modified_date = UTCDateTimeAttribute()
+    # Incremented by every write; see VersionedModelMixin.
+    version = NumberAttribute(null=True)
+
+    _hash_key_name = 'user_id'
+    _cache = TTLCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL)
 
     @classmethod
     def get_all_paged(
@@ -48,8 +60,14 @@ class User(Model):
             'user_id': {'S': user_id}
         }
 
-    def save(self, *args, **kwargs) -> Dict[str, Any]:
+    def touch(self) -> None:
+        """
+        Set the created and modified dates, for a save.
+        """
         if not self.created_date:
             self.created_date = datetime.utcnow()
         self.modified_date = datetime.utcnow()
+
+    def save(self, *args, **kwargs) -> Dict[str, Any]:
+        self.touch()
         return super(User, self).save(*args, **kwargs)
@@ -0,0 +1,57 @@
+from typing import Any, Dict
+
+from pynamodb.exceptions import PutError
+
+
+def _is_conditional_check_failure(e: Exception) -> bool:
+    """
+    Return True if a pynamodb exception was caused by a failed condition expression.
+    """
+    cause = getattr(e, 'cause', None)
+    response = getattr(cause, 'response', None) or {}
+    return response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+class VersionConflict(Exception):
+    """
+    Raised when saving an item that has been written since it was read.
+    """
+
+
+class VersionedModelMixin(object):
+    """
+    Optimistic concurrency for a pynamodb model's full-item writes.
+
+    Models using this mixin need a nullable ``version`` NumberAttribute. Every
+    save is conditional on the stored version being the one the item was
+    read with, and increments it; a save that finds another version raises
+    VersionConflict, and the caller should read the item again and re-apply
+    its changes. Updates increment the version too, so that a stale item
+    can't be saved over them. Items written before versions were added have
+    no version, and are saved as if they were new.
+    """
+
+    def save(self, condition: Any = None, **kwargs) -> Dict[str, Any]:
+        model = type(self)
+        expected = self.version
+        if expected is None:
+            version_condition = model.version.does_not_exist()
+        else:
+            version_condition = model.version == expected
+        if condition is not None:
+            version_condition = version_condition & condition
+        self.version = (expected or 0) + 1
+        try:
+            return super(VersionedModelMixin, self).save(condition=version_condition, **kwargs)
+        except PutError as e:
+            self.version = expected
+            if _is_conditional_check_failure(e):
+                raise VersionConflict(f'{model.__name__} was written since it was read') from e
+            raise
+        except Exception:
+            self.version = expected
+            raise
+
+    def update(self, actions: Any = None, condition: Any = None, **kwargs) -> Dict[str, Any]:
+        actions = list(actions or []) + [type(self).version.add(1)]
+        return super(VersionedModelMixin, self).update(actions=actions, condition=condition, **kwargs)
@@ -18,7 +18,9 @@ General flow:
 '''
 
 
-from typing import Dict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import functools
 import logging
 
 import omnibot_receiver.response as omnibot_response
@@ -28,18 +30,47 @@ from omnibot_receiver.router import (
     OmnibotRouter,
 )
 
-from eventbot.models.event import Event
+from eventbot import settings, storage
+from eventbot.models.coalescer import coalescer
+from eventbot.models.event import Event, EventClosed, PaymentSummaryMap
+from eventbot.models.loader import AttendeeSummary, Loaders
 from eventbot.models.user import User
+from eventbot.utils import background, slack, stats, tracing
+from eventbot.utils.cache import MISSING, TTLCache
+from eventbot.utils.idempotency import IdempotentRouter
 
 logger = logging.getLogger(__name__)
 
+# Rendered event messages, keyed by everything a render depends on; see
+# _get_render_key.
+_render_cache = TTLCache(settings.RENDER_CACHE_MAX_SIZE, settings.RENDER_CACHE_TTL)
+# The render key of the last chat.update we sent, per event message.
+_last_rendered = TTLCache(settings.RENDER_CACHE_MAX_SIZE, settings.RENDER_CACHE_TTL)
+
+# Actions that update an event's message, and the acknowledgement sent for
+# them when they are applied in the background.
+_EVENT_UPDATE_ACTIONS = {
+    'register': 'Registering <@{user_id}>...',
+    'unregister': 'Unregistering <@{user_id}>...',
+    'refresh': 'Refreshing event details...',
+}
+# The response to changes to an event that has been closed.
+_CLOSED_MESSAGE = 'This event is closed, and can no longer be changed.'
+# How start dates are entered in the edit dialog, in UTC.
+_START_DATE_FORMAT = '%Y-%m-%d %H:%M'
+# Every action the interactive message can send; used to bound metric names.
+_INTERACTIVE_ACTIONS = ('edit', 'update', 'update_venmo', 'show_attendees') + tuple(_EVENT_UPDATE_ACTIONS)
+
 message_router = OmnibotMessageRouter(
     help="Hi! I'll help you create and manage events!"
 )
 interactive_router = OmnibotInteractiveRouter()
-router = OmnibotRouter(
-    message_router=message_router,
-    interactive_router=interactive_router,
+router = IdempotentRouter(
+    OmnibotRouter(
+        message_router=message_router,
+        interactive_router=interactive_router,
+    ),
+    TTLCache(settings.IDEMPOTENCY_CACHE_MAX_SIZE, settings.IDEMPOTENCY_CACHE_TTL),
 )
 
 
@@ -49,7 +80,7 @@ def _get_user_id_by_event(event: Dict) -> str:
 
 def _get_user_by_event(event: Dict):
     try:
-        return User.get(_get_user_id_by_event(event))
+        return storage.get_backend().get(User, _get_user_id_by_event(event), cached=True)
     except User.DoesNotExist:
         return None
 
@@ -99,6 +130,57 @@ def create_event_command(event: Dict) -> Dict:
     }
 
 
+@message_router.route(
+    'event list',
+    match_type='command',
+    help='List open events',
+)
+@message_router.route(
+    'event list <cursor>',
+    match_type='command',
+    help='List more open events, from the cursor given by a previous list',
+)
+def list_events_command(event: Dict, cursor: Optional[str] = None) -> Dict:
+    '''
+    list_events_command receives ``event list`` command messages targeted to this bot. It responds with a page of
+    open events, in order of start date, or creation date for events without one, and the command to list the next
+    page, if there is one.
+    '''
+    try:
+        events, next_cursor = storage.get_backend().list_events(
+            Event.STATUS_OPEN,
+            limit=settings.EVENT_LIST_PAGE_SIZE,
+            cursor=cursor,
+        )
+    except ValueError:
+        events, next_cursor = None, None
+    if events is None:
+        text = 'That cursor is invalid; run `event list` to start from the first page.'
+    elif not events:
+        text = 'There are no open events.'
+    else:
+        lines = [
+            f'• *{x.name}*, starting {x.start_date:%Y-%m-%d %H:%M} UTC, created by <@{x.creator}>'
+            if x.start_date_given else
+            f'• *{x.name}*, created {x.start_date:%Y-%m-%d %H:%M} UTC by <@{x.creator}>'
+            for x in events
+        ]
+        if next_cursor is not None:
+            lines.append(f'To list more: `event list {next_cursor}`')
+        text = '\n'.join(lines)
+    return {
+        'actions': [
+            {
+                'action': 'chat.postMessage',
+                'kwargs': {
+                    'thread_ts': None,
+                    'text': text,
+                },
+            },
+        ],
+    }
+
+
 def _update_venmo_dialog(event: Dict, venmo_handle: str):
     '''
     Given an omnibot interactive component event, and a venmo_handle, return a response to open an interactive
@@ -134,6 +216,7 @@ def _edit_event_dialog(
     description: str = '',
     cost: int = 0,
     extra_attendees: int = 0,
+    start_date: Optional[datetime] = None,
 ) -> Dict:
     '''
     Given an omnibot interactive component event, and a set of pre-set values, return a submission dialog to edit the
@@ -182,6 +265,15 @@ def _edit_event_dialog(
                             ),
                             'value': str(extra_attendees),
                         },
+                        {
+                            'label': 'Start Date (UTC)',
+                            'name': 'start_date',
+                            'type': 'text',
+                            'optional': True,
+                            'placeholder': 'YYYY-MM-DD HH:MM',
+                            'hint': 'When the event starts; reminders are only sent for events with a start date',
+                            'value': f'{start_date:{_START_DATE_FORMAT}}' if start_date is not None else '',
+                        },
                     ],
                 },
             },
@@ -198,28 +290,77 @@ def handle_interactive_event_for_events(event: Dict) -> Dict:
     '''
     state = event['state']
     if state.startswith('update_venmo:'):
-        return _update_venmo_via_event(event)
-    elif state.startswith('update_event:'):
-        return _create_or_edit_event(event)
-    # backwards compat: raw event_id
-    else:
+        with stats.timer('dialog_submission.update_venmo'):
+            return _update_venmo_via_event(event)
+    with stats.timer('dialog_submission.update_event'):
+        # backwards compat: raw event_id, without the update_event: prefix
         return _create_or_edit_event(event)
 
 
-def _update_venmo(user_id: str, venmo_handle: str) -> Dict:
-    try:
-        user = User.get(user_id)
-    except User.DoesNotExist:
-        user = User(user_id=user_id)
-    user.venmo_handle = venmo_handle
+def _update_venmo(
+    user_id: str,
+    venmo_handle: str,
+    event_id: Optional[str] = None,
+    loaders: Optional[Loaders] = None,
+) -> bool:
+    backend = storage.get_backend()
+    previous: Dict[str, Optional[str]] = {}
+
+    def apply(user: User) -> None:
+        previous['venmo_handle'] = user.venmo_handle
+        user.venmo_handle = venmo_handle
+
     try:
-        user.save()
+        backend.edit(User, user_id, apply, create=lambda: User(user_id=user_id))
     except Exception:
         logger.exception(f'Failed to save venmo for user <@{user_id}>')
         return False
+    if previous['venmo_handle'] != venmo_handle:
+        try:
+            _update_payment_summaries(user_id, previous['venmo_handle'], venmo_handle, event_id, loaders)
+        except Exception:
+            # The handle was saved; summaries that missed it are fixed by the repair-summaries command.
+            logger.exception(f'Failed to update payment summaries for user <@{user_id}>')
+            stats.incr('payment_summary.update_error')
     return True
 
 
+def _update_payment_summaries(
+    user_id: str,
+    old_handle: Optional[str],
+    new_handle: str,
+    event_id: Optional[str],
+    loaders: Optional[Loaders],
+) -> None:
+    '''
+    Update the payment summaries of the events a user is registered for, after their venmo handle changed. The event
+    the change was made from, if any, is updated first, and primed in loaders, so that it's rendered with the new
+    handle; the rest are updated in the background.
+    '''
+    backend = storage.get_backend()
+    event_ids = backend.list_attendee_events(user_id)
+    if event_id in event_ids:
+        event_ids.remove(event_id)
+        event_obj = backend.update_payment_handle(event_id, user_id, old_handle, new_handle)
+        if event_obj is not None and loaders is not None:
+            loaders.event.prime(event_id, event_obj)
+    if not event_ids:
+        return
+    if not background.get_pool().submit(_update_payment_handles, event_ids, user_id, old_handle, new_handle):
+        _update_payment_handles(event_ids, user_id, old_handle, new_handle)
+
+
+def _update_payment_handles(
+    event_ids: List[str],
+    user_id: str,
+    old_handle: Optional[str],
+    new_handle: str,
+) -> None:
+    backend = storage.get_backend()
+    for event_id in event_ids:
+        backend.update_payment_handle(event_id, user_id, old_handle, new_handle)
+
+
 def _update_venmo_via_event(event: Dict) -> Dict:
     # TODO (ryan-lane): support more than just venmo
     user_id = _get_user_id_by_event(event)
@@ -228,26 +369,28 @@ def _update_venmo_via_event(event: Dict) -> Dict:
         msg = 'Error: venmo_handle missing from form submission.'
         return omnibot_response.get_simple_response(msg, ephemeral=True)
     venmo_handle = submission['venmo_handle']
-    venmo_updated = _update_venmo(user_id, venmo_handle)
+    event_id = event['state'].replace('update_venmo:', '')
+    loaders = Loaders()
+    # Fetch the event while the update is in flight; if the update changes
+    # the event's payment summary, the updated event replaces it.
+    loaders.event.load(event_id)
+    venmo_updated = _update_venmo(user_id, venmo_handle, event_id, loaders)
     if not venmo_updated:
         msg = 'Failed to save venmo handle'
         return omnibot_response.get_simple_response(msg, ephemeral=True)
     msg = 'Successfully saved venmo handle.'
-    event_id = event['state'].replace('update_venmo:', '')
     try:
-        event_obj = Event.get(event_id)
-        ret = omnibot_response.get_simple_response(msg, ephemeral=True)
+        event_obj = loaders.event.get(event_id)
     except Event.DoesNotExist:
         msg = f'{msg}. However, we could not find the related event; please update manually.'
-        ret = omnibot_response.get_simple_response(msg, ephemeral=True)
-    ret['actions'] = [{
-        'action': 'chat.update',
-        'kwargs': _get_event_kwargs(
-            event_id,
-            event['channel']['id'],
-            event_obj,
-        ),
-    }]
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+    ret = omnibot_response.get_simple_response(msg, ephemeral=True)
+    ret['actions'] = _get_event_update_actions(
+        event_id,
+        event['channel']['id'],
+        event_obj,
+        loaders,
+    )
     return ret
 
 
@@ -262,35 +405,97 @@ def _create_or_edit_event(event: Dict) -> Dict:
     description = submission.get('description', '')
     extra_attendees = int(submission.get('extra_attendees', 0))
     cost = int(float(submission.get('cost', 0)) * 100)
+    start_date = None
+    if submission.get('start_date'):
+        try:
+            start_date = datetime.strptime(submission['start_date'].strip(), _START_DATE_FORMAT)
+        except ValueError:
+            msg = f'Invalid start date {submission["start_date"]}; use YYYY-MM-DD HH:MM, in UTC'
+            return omnibot_response.get_simple_response(msg, ephemeral=True)
 
-    try:
-        event_obj = Event.get(event_id)
-    except Event.DoesNotExist:
-        event_obj = Event(event_id)
+    backend = storage.get_backend()
+    loaders = Loaders()
+
+    def create() -> Event:
+        if backend.get_archived_events([event_id]):
+            raise EventClosed()
+        event_obj = Event(event_id=event_id)
         event_obj.creator = event['parsed_user']['id']
-    event_obj.name = name
-    event_obj.description = description
-    event_obj.extra_attendees = extra_attendees
-    event_obj.cost = cost
+        event_obj.payment_summary = PaymentSummaryMap()
+        return event_obj
+
+    # Only the edited fields are set, so that an edit that raced with
+    # another write is applied again on top of it.
+    def apply(event_obj: Event) -> None:
+        if event_obj.status == Event.STATUS_CLOSED:
+            raise EventClosed()
+        if event_obj.created_date is not None:
+            # Fetch the attendees needed for rendering while the save is in flight
+            _prefetch_attendees(loaders, event_obj)
+        event_obj.name = name
+        event_obj.description = description
+        event_obj.extra_attendees = extra_attendees
+        event_obj.cost = cost
+        scheduled = _get_schedule(event_obj)
+        if start_date is not None:
+            event_obj.start_date = start_date
+            event_obj.start_date_given = True
+        elif event_obj.start_date_given:
+            # Cleared; the save defaults it again.
+            event_obj.start_date = None
+            event_obj.start_date_given = None
+        if _get_schedule(event_obj) != scheduled:
+            # Rescheduled, so its reminders are due again; see
+            # eventbot.receiver.reminders.
+            event_obj.reminders_sent = None
+        if event_obj.channel_id is None:
+            # Where reminders are posted; see eventbot.receiver.reminders.
+            event_obj.channel_id = event['channel']['id']
+
     try:
-        event_obj.save()
+        event_obj = backend.edit(Event, event_id, apply, create=create)
+    except EventClosed:
+        return omnibot_response.get_simple_response(_CLOSED_MESSAGE, ephemeral=True)
     except Exception:
         logger.exception('Failed to create event')
         msg = 'Failed to create event'
         return omnibot_response.get_simple_response(msg, ephemeral=True)
     ret = {
-        'actions': [{
-            'action': 'chat.update',
-            'kwargs': _get_event_kwargs(
-                event_id,
-                event['channel']['id'],
-                event_obj,
-            ),
-        }],
+        'actions': _get_event_update_actions(
+            event_id,
+            event['channel']['id'],
+            event_obj,
+            loaders,
+        ),
     }
     return ret
 
 
+def _get_schedule(event_obj: Event) -> Tuple[Optional[str], bool]:
+    '''
+    Return an event's start date, serialized so that naive and UTC dates compare equal, and whether it was given.
+    '''
+    if event_obj.start_date is None:
+        return None, bool(event_obj.start_date_given)
+    return Event.start_date.serialize(event_obj.start_date), bool(event_obj.start_date_given)
+
+
+def _prefetch_attendees(loaders: Loaders, event_obj: Event) -> None:
+    '''
+    Start loading the user records of an event's attendees, which are needed to render an event without a payment
+    summary.
+    '''
+    if event_obj.payment_summary is None:
+        loaders.user.load_many(_get_attendee_summary(loaders, event_obj).user_ids)
+
+
+def _get_attendee_summary(loaders: Loaders, event_obj: Event) -> AttendeeSummary:
+    '''
+    Return the attendees shown on an event's message.
+    '''
+    return loaders.get_attendee_summary(event_obj, settings.RENDER_ATTENDEE_LIMIT)
+
+
 @interactive_router.route('eventbot_events')
 def interactive_event_handler(event: Dict) -> Dict:
     '''
@@ -300,114 +505,357 @@ def interactive_event_handler(event: Dict) -> Dict:
     internal function.
     '''
     user_id = _get_user_id_by_event(event)
-    venmo_handle = ''
-    try:
-        user = User.get(user_id)
-        if user.venmo_handle:
-            venmo_handle = user.venmo_handle
-    except User.DoesNotExist:
-        pass
     for action in event.get('actions', []):
         event_action = action.get('name')
-        if not event_action:
-            msg = 'Missing value or text in interactive component event'
-            return omnibot_response.get_simple_response(msg, ephemeral=True)
-        if event_action == 'edit':
-            return _edit_event_dialog(event)
-        event_id = action.get('value')
-        if not event_id:
-            msg = 'Missing value or text in interactive component event'
-            return omnibot_response.get_simple_response(msg, ephemeral=True)
-        event_id = event_id.lower()
-        try:
-            event_obj = Event.get(event_id)
-        except Event.DoesNotExist:
-            msg = f'Event with event_id {event_id} does not exist.'
-            return omnibot_response.get_simple_response(msg, ephemeral=True)
-        if event_action == 'register':
-            ret = _register_event(event_obj, user_id)
-        elif event_action == 'unregister':
-            ret = _unregister_event(event_obj, user_id)
-        elif event_action == 'update':
-            # This event triggers a dialog open, but doesn't directly update
-            # the event, so we should return immediately.
-            return _edit_event_dialog(
-                event,
-                event_obj.name,
-                event_obj.description,
-                event_obj.cost,
-                event_obj.extra_attendees,
-            )
-        elif event_action == 'update_venmo':
-            return _update_venmo_dialog(event, venmo_handle)
-        elif event_action == 'refresh':
-            # Just update the event
-            pass
+        if event_action not in _INTERACTIVE_ACTIONS:
+            metric_action = 'unknown'
         else:
-            msg = 'Unrecognized action'
-            return omnibot_response.get_simple_response(msg, ephemeral=True)
-        ret['actions'] = [
-            {
-                'action': 'chat.update',
-                'kwargs': _get_event_kwargs(
-                    event_id,
-                    event['channel']['id'],
-                    event_obj,
-                ),
-            },
-        ]
+            metric_action = event_action
         # We only ever expect to get a single action from an event, so we
         # return in the first loop iteration
-        return ret
+        with stats.timer(f'interactive.{metric_action}'):
+            return _handle_interactive_action(event, action, user_id)
     msg = f'Missing actions in interactive event'
     return omnibot_response.get_simple_response(msg, ephemeral=True)
 
 
-def _register_event(event_obj: Event, attendee: str) -> Dict:
-    if event_obj.user_is_attendee(attendee):
-        msg = f'<@{attendee}> already registered'
-    else:
-        event_obj.add_attendee(attendee)
+def _handle_interactive_action(event: Dict, action: Dict, user_id: str) -> Dict:
+    event_action = action.get('name')
+    if not event_action:
+        msg = 'Missing value or text in interactive component event'
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+    if event_action == 'edit':
+        return _edit_event_dialog(event)
+    event_id = action.get('value')
+    if not event_id:
+        msg = 'Missing value or text in interactive component event'
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+    if event_action == 'show_attendees':
+        # The value may carry a case-sensitive cursor, after the event_id.
+        event_id, _, cursor = event_id.partition(' ')
+        return _show_attendees(event_id.lower(), cursor or None)
+    event_id = event_id.lower()
+    if event_action in _EVENT_UPDATE_ACTIONS:
+        if settings.FAST_ACK_ENABLED and event.get('response_url'):
+            if background.get_pool().submit(_apply_event_action_async, event, event_action, event_id):
+                msg = _EVENT_UPDATE_ACTIONS[event_action].format(user_id=user_id)
+                return omnibot_response.get_simple_response(msg, ephemeral=True)
+        return _apply_event_action(event, event_action, event_id)
+    loaders = Loaders()
+    event_result = loaders.event.load(event_id)
+    if event_action == 'update_venmo':
+        # Fetch the clicking user for the venmo dialog alongside the event.
+        user_result = loaders.user.load(user_id)
+    try:
+        event_obj = event_result.get()
+    except Event.DoesNotExist:
+        msg = f'Event with event_id {event_id} does not exist.'
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+    if event_action == 'update':
+        if event_obj.status == Event.STATUS_CLOSED:
+            return omnibot_response.get_simple_response(_CLOSED_MESSAGE, ephemeral=True)
+        # This event triggers a dialog open, but doesn't directly update
+        # the event, so we should return immediately.
+        return _edit_event_dialog(
+            event,
+            event_obj.name,
+            event_obj.description,
+            event_obj.cost,
+            event_obj.extra_attendees,
+            event_obj.start_date if event_obj.start_date_given else None,
+        )
+    elif event_action == 'update_venmo':
+        venmo_handle = ''
         try:
-            event_obj.save()
+            user = user_result.get()
+            if user.venmo_handle:
+                venmo_handle = user.venmo_handle
+        except User.DoesNotExist:
+            pass
+        return _update_venmo_dialog(event, venmo_handle)
+    else:
+        msg = 'Unrecognized action'
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+
+
+def _show_attendees(event_id: str, cursor: Optional[str]) -> Dict:
+    '''
+    Respond with an ephemeral message listing a page of an event's attendees, in order of registration, with a
+    button to list the next page, so that the full list of a large event can be read without rendering it all in the
+    event's message.
+    '''
+    loaders = Loaders()
+    try:
+        event_obj = loaders.event.get(event_id)
+        user_ids, next_cursor = storage.get_backend().list_attendees(
+            event_obj,
+            limit=settings.ATTENDEE_PAGE_SIZE,
+            cursor=cursor,
+        )
+    except Event.DoesNotExist:
+        msg = f'Event with event_id {event_id} does not exist.'
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+    except ValueError:
+        msg = 'That list of attendees has expired; please start again.'
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+    if not user_ids:
+        return omnibot_response.get_simple_response('No one has registered yet.', ephemeral=True)
+    venmo_handles = {user.user_id: user.venmo_handle for user in loaders.user.get_many(user_ids)}
+    lines = []
+    for user_id in user_ids:
+        if venmo_handles.get(user_id):
+            lines.append(f'<@{user_id}> ({venmo_handles[user_id]})')
+        else:
+            lines.append(f'<@{user_id}>')
+    ret = omnibot_response.get_simple_response('\n'.join(lines), ephemeral=True)
+    if next_cursor is not None:
+        ret['responses'][0]['attachments'] = [{
+            'callback_id': 'eventbot_events',
+            'actions': [{
+                'name': 'show_attendees',
+                'text': 'Show more attendees',
+                'type': 'button',
+                'value': f'{event_id} {next_cursor}',
+            }],
+        }]
+    return ret
+
+
+def _apply_event_action(event: Dict, event_action: str, event_id: str, raise_errors: bool = False) -> Dict:
+    '''
+    Apply a register, unregister or refresh action to an event, and return the response, which includes an update of
+    the event's message. A failed write is reported in the response, or, with raise_errors, raised, so that it can be
+    retried.
+    '''
+    user_id = _get_user_id_by_event(event)
+    loaders = Loaders()
+    event_result = loaders.event.load(event_id)
+    if event_action == 'register':
+        # The clicking user is needed to render them as a new attendee; fetch
+        # them alongside the event.
+        loaders.user.load(user_id)
+    try:
+        event_obj = event_result.get()
+    except Event.DoesNotExist:
+        msg = f'Event with event_id {event_id} does not exist.'
+        return omnibot_response.get_simple_response(msg, ephemeral=True)
+    closed = event_obj.status == Event.STATUS_CLOSED
+    force = event_action == 'refresh'
+    # Fetch the attendees needed for rendering while any write is in flight.
+    # A write changes the event, and so its render; otherwise only fetch them
+    # if the event as loaded would be rendered.
+    if (event_action in ('register', 'unregister') and not closed) or _will_render(
+            event_id, event['channel']['id'], event_obj, force=force):
+        _prefetch_attendees(loaders, event_obj)
+    if closed and event_action != 'refresh':
+        ret = omnibot_response.get_simple_response(_CLOSED_MESSAGE, ephemeral=True)
+    elif event_action == 'register':
+        ret = _register_event(event_obj, user_id, raise_errors=raise_errors)
+    elif event_action == 'unregister':
+        ret = _unregister_event(event_obj, user_id, raise_errors=raise_errors)
+    else:
+        ret = {}
+    ret['actions'] = _get_event_update_actions(
+        event_id,
+        event['channel']['id'],
+        event_obj,
+        loaders,
+        force=force,
+    )
+    return ret
+
+
+def _apply_event_action_async(event: Dict, event_action: str, event_id: str) -> None:
+    '''
+    Apply an event action in the background, after the click has been acknowledged, and send the result to slack
+    via the event's response_url, since we can no longer respond to omnibot. Failed writes are retried, and reported
+    once the last attempt has failed.
+    '''
+    try:
+        ret = background.with_retries(_apply_event_action, event, event_action, event_id, raise_errors=True)
+    except Exception:
+        user_id = _get_user_id_by_event(event)
+        logger.exception(f'Failed to {event_action} <@{user_id}>')
+        msg = f'Failed to {event_action} <@{user_id}>'
+        ret = omnibot_response.get_simple_response(msg, ephemeral=True)
+    response_url = event['response_url']
+    for response in ret.get('responses', []):
+        background.with_retries(slack.post_to_response_url, response_url, response)
+    for action in ret.get('actions', []):
+        background.with_retries(
+            slack.post_to_response_url,
+            response_url,
+            {
+                'replace_original': True,
+                'text': action['kwargs']['text'],
+                'attachments': action['kwargs']['attachments'],
+            },
+        )
+
+
+def _register_event(event_obj: Event, attendee: str, raise_errors: bool = False) -> Dict:
+    # The event may have come from the cache, so rather than checking
+    # attendance locally, let the conditional update decide.
+    try:
+        if coalescer.register(event_obj, attendee):
             msg = f'Registered <@{attendee}>'
-        except Exception:
-            msg = f'Failed to register <@{attendee}>'
+        else:
+            msg = f'<@{attendee}> already registered'
+    except Exception:
+        if raise_errors:
+            raise
+        logger.exception(f'Failed to register <@{attendee}>')
+        msg = f'Failed to register <@{attendee}>'
     return omnibot_response.get_simple_response(msg, ephemeral=True)
 
 
-def _unregister_event(event_obj: Event, attendee: str) -> Dict:
-    if event_obj.user_is_attendee(attendee):
-        event_obj.remove_attendee(attendee)
-        try:
-            event_obj.save()
+def _unregister_event(event_obj: Event, attendee: str, raise_errors: bool = False) -> Dict:
+    try:
+        if coalescer.unregister(event_obj, attendee):
             msg = f'Unregistered <@{attendee}>'
-        except Exception:
-            msg = f'Failed to unregister <@{attendee}>'
-    else:
-        msg = f'<@{attendee}> not registered.'
+        else:
+            msg = f'<@{attendee}> not registered.'
+    except Exception:
+        if raise_errors:
+            raise
+        logger.exception(f'Failed to unregister <@{attendee}>')
+        msg = f'Failed to unregister <@{attendee}>'
     return omnibot_response.get_simple_response(msg, ephemeral=True)
 
 
-def _get_event_kwargs(event_id: str, channel_id: str, event_obj: Event) -> Dict:
+def _get_render_key(event_id: str, channel_id: str, event_obj: Event) -> Tuple:
+    '''
+    Return a key identifying the rendered form of an event. Every write to an event updates its modified_date, and
+    every user write through this worker bumps the user cache version, so a change to either produces a new key.
+    Events with a payment summary don't depend on users, since changes to handles update the summary.
+    '''
+    if event_obj.payment_summary is not None:
+        return (event_id, channel_id, event_obj.modified_date, None)
+    return (event_id, channel_id, event_obj.modified_date, storage.get_backend().data_version(User))
+
+
+def _will_render(event_id: str, channel_id: str, event_obj: Event, force: bool = False) -> bool:
+    '''
+    Return whether _get_event_update_actions would render the event, rather than skip the update or use a cached
+    render.
+    '''
+    if event_obj.modified_date is None:
+        return True
+    render_key = _get_render_key(event_id, channel_id, event_obj)
+    if not force and _last_rendered.get((channel_id, event_id)) == render_key:
+        return False
+    return _render_cache.get(render_key) is MISSING
+
+
+def _get_event_update_actions(
+    event_id: str,
+    channel_id: str,
+    event_obj: Event,
+    loaders: Optional[Loaders] = None,
+    force: bool = False,
+) -> List[Dict]:
+    '''
+    Return a chat.update action for the event's message, or no actions, if the render is identical to the one we
+    last sent for this message. With force, as for an explicit refresh, the update is always sent, since the message
+    may have been changed by another worker.
+    '''
+    message_key = (channel_id, event_id)
+    render_key = _get_render_key(event_id, channel_id, event_obj)
+    if not force and event_obj.modified_date is not None and _last_rendered.get(message_key) == render_key:
+        stats.incr('render.update_skipped')
+        return []
+    kwargs = _get_event_kwargs(event_id, channel_id, event_obj, loaders)
+    _last_rendered.set(message_key, render_key)
+    return [{
+        'action': 'chat.update',
+        'kwargs': kwargs,
+    }]
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_event_buttons(event_id: str) -> Tuple[List[Dict], List[Dict]]:
+    '''
+    Return the (event details, registration) button lists for an event. These only depend on the event_id, so they
+    are built once per event and shared between renders; they must not be mutated.
+    '''
+    details_buttons = [
+        {'name': name, 'text': text, 'type': 'button', 'value': event_id}
+        for name, text in (
+            ('update', 'Update event details'),
+            ('refresh', 'Refresh event details'),
+            ('show_attendees', 'Show all attendees'),
+        )
+    ]
+    registration_buttons = [
+        {'name': name, 'text': text, 'type': 'button', 'value': event_id}
+        for name, text in (
+            ('register', 'Register'),
+            ('unregister', 'Unregister'),
+            ('update_venmo', 'Update Venmo'),
+        )
+    ]
+    return details_buttons, registration_buttons
+
+
+@tracing.traced('render.get_event_kwargs')
+def _get_event_kwargs(
+    event_id: str,
+    channel_id: str,
+    event_obj: Event,
+    loaders: Optional[Loaders] = None,
+) -> Dict:
     '''
     Given an event_id, channel_id, and event_obj (pynamo model), return the event, represented as a slack
-    interactive message.
+    interactive message. Renders are cached by _get_render_key, and the returned dict is shared, so it must not be
+    mutated. If loaders are passed in, attendees are fetched through them.
     '''
+    if loaders is None:
+        loaders = Loaders()
+    if event_obj.modified_date is None:
+        return _render_event_kwargs(event_id, channel_id, event_obj, loaders)
+    render_key = _get_render_key(event_id, channel_id, event_obj)
+    kwargs = _render_cache.get(render_key)
+    if kwargs is MISSING:
+        stats.incr('render.cache.miss')
+        kwargs = _render_event_kwargs(event_id, channel_id, event_obj, loaders)
+        _render_cache.set(render_key, kwargs)
+    else:
+        stats.incr('render.cache.hit')
+    return kwargs
+
+
+@stats.timer('render.event')
+def _render_event_kwargs(event_id: str, channel_id: str, event_obj: Event, loaders: Loaders) -> Dict:
     cost_text = (
         f'Total cost: ${event_obj.cost/100:.2f}; Cost per attendee:'
         f' ${event_obj.cost_per_attendee/100:.2f}'
     )
     _attendees_with_payment = []
     _attendees_without_payment = []
-    if event_obj.attendees:
-        attendees = [x.attendee for x in event_obj.attendees]
-        users = User.batch_get(attendees)
-        for user in users:
-            if user.venmo_handle:
-                _attendees_with_payment.append(user.venmo_handle)
+    remaining_text = ''
+    payment_summary = event_obj.payment_summary
+    if payment_summary is not None:
+        listed = payment_summary.attendees[:settings.RENDER_ATTENDEE_LIMIT]
+        for entry in listed:
+            if entry.venmo_handle:
+                _attendees_with_payment.append(entry.venmo_handle)
             else:
-                _attendees_without_payment.append("<@{}>".format(user.user_id))
+                _attendees_without_payment.append("<@{}>".format(entry.user_id))
+        summary = AttendeeSummary([x.user_id for x in listed], max(event_obj.registered_count - len(listed), 0))
+        remaining_without_payment = max(payment_summary.without_handle - len(_attendees_without_payment), 0)
+        if remaining_without_payment:
+            remaining_text = f', {remaining_without_payment} of them missing a Venmo handle'
+    else:
+        summary = _get_attendee_summary(loaders, event_obj)
+        if summary.user_ids:
+            users = {user.user_id: user for user in loaders.user.get_many(summary.user_ids)}
+            for user_id in summary.user_ids:
+                # Attendees who have never set a venmo handle have no user record
+                user = users.get(user_id)
+                if user is not None and user.venmo_handle:
+                    _attendees_with_payment.append(user.venmo_handle)
+                else:
+                    _attendees_without_payment.append("<@{}>".format(user_id))
     if _attendees_with_payment:
         attendees_with_payment_text = ', '.join(_attendees_with_payment)
     else:
@@ -416,10 +864,28 @@ def _get_event_kwargs(event_id: str, channel_id: str, event_obj: Event) -> Dict:
         attendees_no_payment_text = ', '.join(_attendees_without_payment)
     else:
         attendees_no_payment_text = 'None'
+    more_fields = []
+    if summary.remaining:
+        more_fields.append({
+            'title': 'More attendees',
+            'value': f'and {summary.remaining} more{remaining_text}; use "Show all attendees" to list everyone',
+        })
+    details_buttons, registration_buttons = _get_event_buttons(event_id)
+    registration_attachments = [
+        {
+            'callback_id': 'eventbot_events',
+            'title': 'Manage your registration',
+            'actions': registration_buttons,
+        },
+    ]
+    closed_text = ''
+    if event_obj.status == Event.STATUS_CLOSED:
+        registration_attachments = []
+        closed_text = ' (closed)'
     return {
         'thread_ts': event_id,
         'ts': event_id,
-        'text': f'Event *{event_obj.name}*',
+        'text': f'Event *{event_obj.name}*{closed_text}',
         'channel': channel_id,
         'attachment_type': 'default',
         'attachments': [
@@ -442,6 +908,7 @@ def _get_event_kwargs(event_id: str, channel_id: str, event_obj: Event) -> Dict:
                         'title': 'Attendees missing Venmo handle',
                         'value': attendees_no_payment_text,
                     },
+                    *more_fields,
                     {
                         'title': 'Cost',
                         'value': cost_text,
@@ -451,44 +918,8 @@ def _get_event_kwargs(event_id: str, channel_id: str, event_obj: Event) -> Dict:
                         'value': f'{event_obj.extra_attendees}',
                     },
                 ],
-                'actions': [
-                    {
-                        'name': 'update',
-                        'text': 'Update event details',
-                        'type': 'button',
-                        'value': f'{event_id}',
-                    },
-                    {
-                        'name': 'refresh',
-                        'text': 'Refresh event details',
-                        'type': 'button',
-                        'value': f'{event_id}',
-                    },
-                ],
-            },
-            {
-                'callback_id': 'eventbot_events',
-                'title': 'Manage your registration',
-                'actions': [
-                    {
-                        'name': 'register',
-                        'text': 'Register',
-                        'type': 'button',
-                        'value': f'{event_id}',
-                    },
-                    {
-                        'name': 'unregister',
-                        'text': 'Unregister',
-                        'type': 'button',
-                        'value': f'{event_id}',
-                    },
-                    {
-                        'name': 'update_venmo',
-                        'text': 'Update Venmo',
-                        'type': 'button',
-                        'value': f'{event_id}',
-                    },
-                ],
+                'actions': details_buttons,
             },
+            *registration_attachments,
         ],
     }
@@ -0,0 +1,246 @@
+'''
+Reminders, posted to the thread of an open event's message at each of
+REMINDER_OFFSETS minutes before it starts. Only events whose start date was
+given in the edit dialog get reminders; others start when they're created.
+
+Every worker keeps a heap of the reminders due soon, loaded from the status
+index, which is ordered by start date, so upcoming events are found with a
+query rather than a scan. The heap is reloaded every REMINDER_REFRESH_INTERVAL
+seconds, to pick up new and changed events, and the worker sleeps until the
+earliest reminder is due. Reminders due together are sent as one batch.
+
+Each reminder is claimed in storage before it's sent, so that only one worker
+sends it, and one sent before a restart isn't sent again.
+'''
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import heapq
+import logging
+import time
+
+import gevent
+import gevent.event
+
+from eventbot import settings, storage
+from eventbot.models import throttle
+from eventbot.models.event import Event
+from eventbot.utils import slack, stats
+
+logger = logging.getLogger(__name__)
+
+# Events listed from the status index per page.
+_PAGE_SIZE = 100
+
+_SCHEDULER = None
+
+# A reminder: (event_id, offset in minutes, start timestamp of the event).
+Reminder = Tuple[str, int, float]
+
+
+def _timestamp(date: datetime) -> float:
+    # Stored dates are timezone aware, and the dates of new items aren't;
+    # a round trip through the attribute makes both aware.
+    return Event.start_date.deserialize(Event.start_date.serialize(date)).timestamp()
+
+
+def _format_offset(minutes: int) -> str:
+    parts = []
+    for unit, size in (('day', 24 * 60), ('hour', 60), ('minute', 1)):
+        count, minutes = divmod(minutes, size)
+        if count:
+            parts.append(f'{count} {unit}' + ('s' if count != 1 else ''))
+    return ' '.join(parts)
+
+
+def get_reminder_action(event: Event, offset: int) -> Dict:
+    '''
+    Return the chat.postMessage action for an event's reminder, posted as a
+    reply to the event's message.
+    '''
+    start_date = datetime.utcfromtimestamp(_timestamp(event.start_date))
+    if offset:
+        when = f'starts in {_format_offset(offset)}'
+    else:
+        when = 'is starting now'
+    return {
+        'action': 'chat.postMessage',
+        'kwargs': {
+            'channel': event.channel_id,
+            'thread_ts': event.event_id,
+            'text': f'Reminder: *{event.name}* {when}, at {start_date:%Y-%m-%d %H:%M} UTC',
+        },
+    }
+
+
+class ReminderScheduler(object):
+    '''
+    Schedules the reminders of one worker; see the module docstring.
+    '''
+
+    def __init__(self, offsets: Optional[List[int]] = None) -> None:
+        if offsets is None:
+            offsets = settings.REMINDER_OFFSETS
+        self.offsets = sorted(set(offsets), reverse=True)
+        # (due timestamp, event_id, offset, start timestamp)
+        self._heap: List[Tuple[float, str, int, float]] = []
+        # The start timestamp each (event_id, offset) is scheduled for. Heap
+        # entries for another start date are stale, and are dropped.
+        self._scheduled: Dict[Tuple[str, int], float] = {}
+        self._stopped = gevent.event.Event()
+        self._greenlet: Optional[gevent.Greenlet] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def refresh(self, now: float) -> int:
+        '''
+        Schedule the reminders of open events that will be due before the
+        next refresh. Returns the number of reminders added.
+        '''
+        if not self.offsets:
+            return 0
+        # Events that started up to REMINDER_MAX_LATENESS ago may still have
+        # reminders to send; forget those of events that started before.
+        earliest = now - settings.REMINDER_MAX_LATENESS
+        self._scheduled = {key: start for key, start in self._scheduled.items() if start >= earliest}
+        horizon = now + max(self.offsets) * 60 + settings.REMINDER_REFRESH_INTERVAL
+        since = datetime.utcfromtimestamp(earliest)
+        backend = storage.get_backend()
+        added = 0
+        cursor = None
+        while True:
+            page, cursor = backend.list_events(Event.STATUS_OPEN, since=since, limit=_PAGE_SIZE, cursor=cursor)
+            for event in page:
+                start = _timestamp(event.start_date)
+                if start > horizon:
+                    return added
+                if not event.start_date_given:
+                    # Listed at its creation date; see Event.touch.
+                    continue
+                for offset in self.offsets:
+                    added += self._schedule(event.event_id, offset, start, now)
+            if cursor is None:
+                return added
+
+    def _schedule(self, event_id: str, offset: int, start: float, now: float) -> bool:
+        due = start - offset * 60
+        key = (event_id, offset)
+        if due < now - settings.REMINDER_MAX_LATENESS or self._scheduled.get(key) == start:
+            return False
+        self._scheduled[key] = start
+        heapq.heappush(self._heap, (due, event_id, offset, start))
+        return True
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[Reminder]:
+        '''
+        Remove and return the reminders due at or before now.
+        '''
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, event_id, offset, start = heapq.heappop(self._heap)
+            if self._scheduled.get((event_id, offset)) == start:
+                due.append((event_id, offset, start))
+        return due
+
+    def send(self, reminders: List[Reminder], now: float) -> int:
+        '''
+        Send reminders whose events are still open, and still start when they
+        were scheduled for, claiming each first. Returns the number sent.
+        '''
+        backend = storage.get_backend()
+        events = {x.event_id: x for x in backend.batch_get(Event, [x[0] for x in reminders])}
+        claimed = []
+        for event_id, offset, start in reminders:
+            event = events.get(event_id)
+            # The start date may have been cleared since it was scheduled.
+            if (
+                event is None or
+                event.status != Event.STATUS_OPEN or
+                not event.channel_id or
+                not event.start_date_given or
+                event.start_date is None or
+                _timestamp(event.start_date) != start
+            ):
+                stats.incr('reminders.skipped')
+                continue
+            if now - (start - offset * 60) > settings.REMINDER_MAX_LATENESS:
+                stats.incr('reminders.late')
+                continue
+            if not backend.claim_reminder(event, offset):
+                # Claimed by another worker, or before a restart.
+                stats.incr('reminders.claimed')
+                continue
+            claimed.append((event, offset))
+        errors = slack.post_actions(
+            [get_reminder_action(event, offset) for event, offset in claimed],
+            concurrency=settings.REMINDER_SEND_CONCURRENCY,
+        )
+        sent = 0
+        for (event, offset), error in zip(claimed, errors):
+            if error is not None:
+                # Claims aren't released, so a failed reminder isn't retried.
+                logger.error(f'Failed to send the {offset} minute reminder for {event.event_id}: {error}')
+                stats.incr('reminders.error')
+            else:
+                sent += 1
+        stats.incr('reminders.sent', sent)
+        return sent
+
+    def run(self) -> None:
+        next_refresh = 0.0
+        while not self._stopped.is_set():
+            with throttle.priority(throttle.BACKGROUND), stats.pipelined():
+                now = time.time()
+                if now >= next_refresh:
+                    try:
+                        self.refresh(now)
+                    except Exception:
+                        logger.exception('Failed to refresh reminders')
+                        stats.incr('reminders.refresh.error')
+                    next_refresh = now + settings.REMINDER_REFRESH_INTERVAL
+                due = self.pop_due(now)
+                if due:
+                    try:
+                        with stats.timer('reminders.send'):
+                            self.send(due, now)
+                    except Exception:
+                        logger.exception('Failed to send reminders')
+                        stats.incr('reminders.send.error')
+            wake = next_refresh
+            next_due = self.next_due()
+            if next_due is not None:
+                wake = min(wake, next_due)
+            self._stopped.wait(max(0.0, wake - time.time()))
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._greenlet = gevent.spawn(self.run)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped.set()
+        if self._greenlet is not None:
+            self._greenlet.join(timeout=timeout)
+            self._greenlet = None
+
+
+def start() -> Optional[ReminderScheduler]:
+    '''
+    Start this worker's scheduler, if REMINDERS_ENABLED is set.
+    '''
+    global _SCHEDULER
+    if not settings.REMINDERS_ENABLED or _SCHEDULER is not None:
+        return _SCHEDULER
+    _SCHEDULER = ReminderScheduler()
+    _SCHEDULER.start()
+    return _SCHEDULER
+
+
+def stop() -> None:
+    global _SCHEDULER
+    if _SCHEDULER is not None:
+        _SCHEDULER.stop(timeout=settings.BACKGROUND_DRAIN_TIMEOUT)
+        _SCHEDULER = None
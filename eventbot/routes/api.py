@@ -1,18 +1,47 @@
+import gzip
 import logging
+from typing import Any
 
 from flask import (
+    abort,
     Blueprint,
-    jsonify,
     request,
+    Response,
 )
 
+from eventbot import settings
 from eventbot.receiver.eventbot import router
+from eventbot.utils import jsoncodec, stats, tracing
 
 logger = logging.getLogger(__name__)
 
 blueprint = Blueprint('api', __name__)
 
 
+def _parse_json_request() -> Any:
+    # Like request.get_json(): None unless the request is JSON, and a 400 if
+    # it's invalid.
+    if not request.is_json:
+        return None
+    try:
+        return jsoncodec.loads(request.get_data())
+    except ValueError:
+        abort(400)
+
+
+def _json_response(payload: Any) -> Response:
+    body = jsoncodec.dumps(payload)
+    response = Response(body, mimetype='application/json')
+    if settings.RESPONSE_COMPRESSION_ENABLED:
+        response.vary.add('Accept-Encoding')
+        if (len(body) >= settings.RESPONSE_COMPRESSION_MIN_SIZE and
+                'gzip' in request.accept_encodings):
+            response.set_data(gzip.compress(body, settings.RESPONSE_COMPRESSION_LEVEL))
+            response.headers['Content-Encoding'] = 'gzip'
+            stats.incr('route.eventbot.compressed')
+    return response
+
+
 @blueprint.route('/healthcheck')
 def healthcheck():
     # The healthcheck returns status code 200
@@ -20,9 +49,13 @@ def healthcheck():
 
 
 @blueprint.route('/api/v1/eventbot', methods=['POST'])
-def eventbot_route() -> str:
-    event = request.get_json()
-    logger.debug(f'eventbot_route request event: {event}')
-    ret = router.handle_event(event)
-    logger.debug(f'eventbot_route response: {ret}')
-    return jsonify(ret)
+def eventbot_route() -> Response:
+    with tracing.span('api.parse'):
+        event = _parse_json_request()
+    # Payloads are only formatted when debug logging is enabled.
+    logger.debug('eventbot_route request event: %s', event)
+    with tracing.span('api.handle_event'):
+        ret = router.handle_event(event)
+    logger.debug('eventbot_route response: %s', ret)
+    with tracing.span('api.serialize'):
+        return _json_response(ret)
@@ -0,0 +1,65 @@
+import hmac
+from functools import wraps
+from typing import Callable
+
+from flask import (
+    abort,
+    Blueprint,
+    jsonify,
+    request,
+)
+
+from eventbot import settings
+from eventbot.utils import profiling, tracing
+
+blueprint = Blueprint('debug', __name__, url_prefix='/debug')
+
+
+def require_debug_token(func: Callable) -> Callable:
+    """
+    Only allow requests that send the DEBUG_ENDPOINT_TOKEN in the
+    X-Debug-Token header. Without a token configured, the endpoint doesn't
+    exist.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not settings.DEBUG_ENDPOINT_TOKEN:
+            abort(404)
+        token = request.headers.get('X-Debug-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), settings.DEBUG_ENDPOINT_TOKEN.encode('utf-8')):
+            abort(403)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+@blueprint.route('/traces')
+@require_debug_token
+def traces():
+    # The slowest sampled requests handled by this worker
+    return jsonify({'traces': tracing.slowest()})
+
+
+@blueprint.route('/profile', methods=['GET', 'POST', 'DELETE'])
+@require_debug_token
+def profile():
+    """
+    GET lists the running and finished profiling sessions of this worker;
+    POST starts a session, with a ``kind`` of ``cpu`` or ``memory``, for the
+    next ``requests`` requests or ``seconds`` seconds; DELETE stops the
+    running session.
+    """
+    if not settings.PROFILING_ENABLED:
+        abort(404)
+    if request.method == 'POST':
+        try:
+            requests = int(request.args['requests']) if 'requests' in request.args else None
+            seconds = float(request.args['seconds']) if 'seconds' in request.args else None
+            session = profiling.start(request.args.get('kind', profiling.CPU), requests, seconds)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except profiling.ProfilingInProgress:
+            return jsonify({'error': 'A profiling session is already running'}), 409
+        return jsonify({'session': session})
+    if request.method == 'DELETE':
+        return jsonify({'result': profiling.stop()})
+    return jsonify(profiling.status())
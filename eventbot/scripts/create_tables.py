@@ -3,6 +3,8 @@ import time
 
 from flask_script import Command
 
+from eventbot.models.archive import ArchivedEvent
+from eventbot.models.attendee import Attendee
 from eventbot.models.event import Event
 from eventbot.models.user import User
 
@@ -41,7 +43,7 @@ class CreateTables(Command):
                 time.sleep(2)
 
     def run(self):
-        classes = [Event, User]
+        classes = [Event, User, Attendee, ArchivedEvent]
 
         for cls in classes:
             self.create_table_given_class(cls)
@@ -0,0 +1,148 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from flask_script import Command, Option
+from pynamodb.constants import BATCH_WRITE_PAGE_LIMIT
+
+from eventbot import settings, storage
+from eventbot.models import throttle
+from eventbot.models.event import Event
+from eventbot.utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Events listed from the status index per page.
+_PAGE_SIZE = 100
+
+
+class _NotInactive(Exception):
+    """
+    Raised to abandon closing an event that was changed since it was listed.
+    """
+
+
+def index_events(bucket: Optional[TokenBucket] = None) -> int:
+    """
+    Add the events written without a start date or status, by versions of
+    eventbot before the status index, to the index, at most one per bucket
+    token; other listings only find events through it. This scans every
+    event, so it's only needed once, after upgrading. Returns the number of
+    events indexed.
+    """
+    backend = storage.get_backend()
+    indexed = 0
+    cursor = None
+    while True:
+        event_ids, cursor = backend.list_unindexed_events(limit=_PAGE_SIZE, cursor=cursor)
+        for event_id in event_ids:
+            if bucket is not None:
+                bucket.acquire()
+            if backend.index_event(event_id):
+                indexed += 1
+        if cursor is None:
+            return indexed
+
+
+def is_inactive(event: Event, now: datetime) -> bool:
+    """
+    Whether an open event should be closed: once it has ended, or, without
+    an end date, EVENT_INACTIVE_DAYS after it was last modified.
+    """
+    # Dates are compared serialized, since stored dates are timezone aware,
+    # and the dates of new items aren't.
+    if event.end_date is not None:
+        return Event.end_date.serialize(event.end_date) < Event.end_date.serialize(now)
+    cutoff = Event.modified_date.serialize(now - timedelta(days=settings.EVENT_INACTIVE_DAYS))
+    return event.modified_date is not None and Event.modified_date.serialize(event.modified_date) < cutoff
+
+
+def close_events(now: datetime, bucket: Optional[TokenBucket] = None) -> int:
+    """
+    Close the open events that are inactive, at most one per bucket token.
+    Each event is checked again when it's closed, so that an event changed in
+    the meantime stays open. Returns the number of events closed.
+    """
+    backend = storage.get_backend()
+    closed = 0
+    cursor = None
+    while True:
+        page, cursor = backend.list_events(Event.STATUS_OPEN, limit=_PAGE_SIZE, cursor=cursor)
+        # The status index doesn't have the modified dates.
+        for event in backend.batch_get(Event, [x.event_id for x in page]):
+            if not is_inactive(event, now):
+                continue
+            if bucket is not None:
+                bucket.acquire()
+            if _close_event(event.event_id, now):
+                closed += 1
+        if cursor is None:
+            return closed
+
+
+def _close_event(event_id: str, now: datetime) -> bool:
+    def apply(event: Event) -> None:
+        if event.status != Event.STATUS_OPEN or not is_inactive(event, now):
+            raise _NotInactive()
+        event.status = Event.STATUS_CLOSED
+
+    try:
+        storage.get_backend().edit(Event, event_id, apply)
+    except (_NotInactive, Event.DoesNotExist):
+        return False
+    return True
+
+
+def archive_events(now: datetime, bucket: Optional[TokenBucket] = None) -> int:
+    """
+    Move the events closed more than EVENT_ARCHIVE_AFTER_DAYS ago to the
+    archive, in batches, at most one event per bucket token. Returns the
+    number of events archived.
+    """
+    backend = storage.get_backend()
+    closed_before = now - timedelta(days=settings.EVENT_ARCHIVE_AFTER_DAYS)
+    archived = 0
+    cursor = None
+    while True:
+        page, cursor = backend.list_events(Event.STATUS_CLOSED, limit=_PAGE_SIZE, cursor=cursor)
+        event_ids: List[str] = [x.event_id for x in page]
+        for i in range(0, len(event_ids), BATCH_WRITE_PAGE_LIMIT):
+            batch = event_ids[i:i + BATCH_WRITE_PAGE_LIMIT]
+            if bucket is not None:
+                bucket.acquire(len(batch))
+            archived += len(backend.archive_events(batch, closed_before))
+        if cursor is None:
+            return archived
+
+
+class Lifecycle(Command):
+    """
+    Close inactive events, and move events that have been closed for a while
+    to the archive table. Safe to run while the bot is serving requests, and
+    to run again after an interruption.
+    """
+
+    option_list = (
+        Option('--rate', dest='rate', type=float, default=None,
+               help='Maximum events indexed, closed or archived per second. Default: LIFECYCLE_RATE'),
+        Option('--skip-archive', dest='skip_archive', action='store_true', default=False,
+               help='Only close events'),
+        Option('--index-events', dest='index', action='store_true', default=False,
+               help='First add events written by older versions to the status index; needed once, after upgrading'),
+    )
+
+    def run(self, rate, skip_archive, index):
+        rate = settings.LIFECYCLE_RATE if rate is None else rate
+        bucket = TokenBucket(rate) if rate else None
+        now = datetime.utcnow()
+        start = time.monotonic()
+        with throttle.priority(throttle.BULK):
+            if index:
+                indexed = index_events(bucket)
+                logger.info(f'Indexed {indexed} events in {time.monotonic() - start:.1f}s')
+            closed = close_events(now, bucket)
+            logger.info(f'Closed {closed} events in {time.monotonic() - start:.1f}s')
+            if not skip_archive:
+                archived = archive_events(now, bucket)
+                logger.info(f'Archived {archived} events in {time.monotonic() - start:.1f}s')
@@ -0,0 +1,85 @@
+import json
+import logging
+import subprocess
+import sys
+from typing import Dict, List
+
+from flask_script import Command, Option
+
+logger = logging.getLogger(__name__)
+
+# Run in a fresh interpreter, so that nothing is imported already.
+_PROBE = '''
+import json, time
+start = time.monotonic()
+from eventbot.wsgi import app
+imported = time.monotonic()
+app.test_client().get('/healthcheck')
+done = time.monotonic()
+print(json.dumps({
+    'app_import_ms': (imported - start) * 1000,
+    'first_request_ms': (done - start) * 1000,
+}))
+'''
+
+
+def parse_import_times(output: str) -> List[Dict]:
+    """
+    Parse the output of ``python -X importtime`` into one dict per module,
+    with its own import time and the time including its imports, in
+    milliseconds.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except (IndexError, ValueError):
+            # The header line
+            continue
+        modules.append({
+            'module': fields[2].strip(),
+            'self_ms': self_us / 1000,
+            'cumulative_ms': cumulative_us / 1000,
+        })
+    return modules
+
+
+class StartupReport(Command):
+    """
+    Report how long a worker takes to import the app and serve its first
+    request, and the modules that take longest to import.
+    """
+
+    option_list = (
+        Option('--top', dest='top', type=int, default=20, help='Number of modules to list'),
+        Option('--output', dest='output', default=None, help='Also write the report to this file, as JSON'),
+    )
+
+    def run(self, top, output):
+        command = [sys.executable]
+        # -X importtime is only available from python 3.7
+        if sys.version_info >= (3, 7):
+            command.extend(['-X', 'importtime'])
+        result = subprocess.run(
+            command + ['-c', _PROBE],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        modules = parse_import_times(result.stderr)
+        report['modules'] = sorted(modules, key=lambda x: x['self_ms'], reverse=True)[:top]
+
+        print(f'App import: {report["app_import_ms"]:.1f}ms')
+        print(f'First request: {report["first_request_ms"]:.1f}ms')
+        if report['modules']:
+            print(f'Slowest {len(report["modules"])} modules (own import time, then including their imports):')
+            for module in report['modules']:
+                print(f'  {module["self_ms"]:8.1f}ms {module["cumulative_ms"]:8.1f}ms  {module["module"]}')
+        if output:
+            with open(output, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,125 @@
+import logging
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from flask_script import Command, Option
+
+from eventbot import settings, storage
+from eventbot.models import throttle
+from eventbot.models.event import Event, PaymentSummaryMap
+from eventbot.models.user import User
+from eventbot.scripts.lifecycle import index_events
+from eventbot.utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Events listed from the status index, and attendees listed per event, per page.
+_PAGE_SIZE = 100
+
+
+class _Unchanged(Exception):
+    """
+    Raised to abandon saving an event whose payment summary is correct.
+    """
+
+
+def build_summary(event: Event) -> PaymentSummaryMap:
+    """
+    Build an event's payment summary from its attendees and their users,
+    reading the users a page of attendees at a time.
+    """
+    backend = storage.get_backend()
+    summary = PaymentSummaryMap()
+    cursor = None
+    while True:
+        user_ids, cursor = backend.list_attendees(event, limit=_PAGE_SIZE, cursor=cursor)
+        handles = {x.user_id: x.venmo_handle for x in backend.batch_get(User, user_ids)}
+        for user_id in user_ids:
+            summary.add_attendee(user_id, handles.get(user_id))
+        if cursor is None:
+            return summary
+
+
+def repair_summary(event_id: str) -> bool:
+    """
+    Rebuild an event's payment summary, and recount its attendees, and save
+    them if they differ from the stored ones; a failed write while
+    registering can leave the attendee count wrong. Returns whether they
+    were saved.
+    """
+    def apply(event: Event) -> None:
+        summary = build_summary(event)
+        # Events with a legacy attendees list are counted from the list.
+        count = summary.with_handle + summary.without_handle if event.attendees_migrated else event.attendee_count
+        if event.attendee_count == count and event.payment_summary is not None and (
+                Event.payment_summary.serialize(event.payment_summary) == Event.payment_summary.serialize(summary)):
+            raise _Unchanged()
+        event.payment_summary = summary
+        event.attendee_count = count
+
+    try:
+        storage.get_backend().edit(Event, event_id, apply)
+    except (_Unchanged, Event.DoesNotExist):
+        return False
+    return True
+
+
+def _list_event_ids() -> Iterator[str]:
+    # Events that aren't in the status index are missed; see index_events.
+    backend = storage.get_backend()
+    for status in (Event.STATUS_OPEN, Event.STATUS_CLOSED):
+        cursor = None
+        while True:
+            page, cursor = backend.list_events(status, limit=_PAGE_SIZE, cursor=cursor)
+            for event in page:
+                yield event.event_id
+            if cursor is None:
+                break
+
+
+def repair_summaries(
+        event_ids: Optional[List[str]] = None,
+        bucket: Optional[TokenBucket] = None,
+) -> Tuple[int, int]:
+    """
+    Repair the payment summaries of the given events, or of every open and
+    closed event, at most one event per bucket token. Returns the number of
+    events checked, and the number repaired.
+    """
+    checked = repaired = 0
+    for event_id in event_ids or _list_event_ids():
+        if bucket is not None:
+            bucket.acquire()
+        checked += 1
+        if repair_summary(event_id):
+            logger.debug(f'Repaired the payment summary of event {event_id}')
+            repaired += 1
+    return checked, repaired
+
+
+class RepairSummaries(Command):
+    """
+    Rebuild the payment summaries and attendee counts of events from their
+    attendees, and save those that drifted, or are missing. Safe to run while
+    the bot is serving requests.
+    """
+
+    option_list = (
+        Option('--event-id', dest='event_ids', action='append', default=None,
+               help='An event to repair; may be repeated. Default: every open and closed event'),
+        Option('--rate', dest='rate', type=float, default=None,
+               help='Maximum events indexed or checked per second. Default: SUMMARY_REPAIR_RATE'),
+        Option('--index-events', dest='index', action='store_true', default=False,
+               help='First add events written by older versions to the status index; needed once, after upgrading'),
+    )
+
+    def run(self, event_ids, rate, index):
+        rate = settings.SUMMARY_REPAIR_RATE if rate is None else rate
+        bucket = TokenBucket(rate) if rate else None
+        start = time.monotonic()
+        with throttle.priority(throttle.BULK):
+            if index:
+                indexed = index_events(bucket)
+                logger.info(f'Indexed {indexed} events in {time.monotonic() - start:.1f}s')
+            checked, repaired = repair_summaries(event_ids, bucket)
+        logger.info(f'Repaired {repaired} of {checked} payment summaries in {time.monotonic() - start:.1f}s')
@@ -0,0 +1,238 @@
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, IO, Iterable, List, Optional
+
+import gevent
+from flask_script import Command, Option
+from gevent.pool import Pool
+from gevent.queue import Queue
+from pynamodb.constants import BATCH_WRITE_PAGE_LIMIT, ITEMS, LAST_EVALUATED_KEY, PUT_REQUEST, UNPROCESSED_ITEMS
+
+from eventbot.models import throttle
+from eventbot.models.archive import ArchivedEvent
+from eventbot.models.attendee import Attendee
+from eventbot.models.event import Event
+from eventbot.models.user import User
+from eventbot.utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# The tables that are exported, by the name used for them in export files,
+# so that an export can be imported into tables with other names.
+MODELS = {
+    'event': Event,
+    'user': User,
+    'attendee': Attendee,
+    'archived_event': ArchivedEvent,
+}
+# The tables exported by default; the archive table only exists where the
+# lifecycle command is used.
+DEFAULT_TABLES = ('event', 'user', 'attendee')
+
+# Retries of items DynamoDB leaves unprocessed, when throttled, and the
+# initial backoff between them, in seconds.
+WRITE_RETRIES = 8
+WRITE_RETRY_BACKOFF = 0.05
+
+# Scanned items waiting to be written, per export.
+_QUEUE_SIZE = 1000
+_DONE = object()
+
+
+class UnprocessedItemsError(Exception):
+    """
+    Raised when DynamoDB still hasn't written some items of a batch after
+    every retry.
+    """
+
+
+def export_tables(out: IO, names: Iterable[str], segments: int) -> Dict[str, int]:
+    """
+    Write every item of the named tables to out, as JSON lines of
+    ``{"table": name, "item": item}``, with items in DynamoDB's format.
+    Each table is read with a parallel scan of segments segments; tables
+    are exported one after another, so that each table's lines are together.
+    Scans are sent with bulk priority, so they wait out throttling rather
+    than add to it. Returns the number of items exported per table.
+    """
+    counts = {}
+    for name in names:
+        model = MODELS[name]
+        queue = Queue(_QUEUE_SIZE)
+        pool = Pool(segments)
+        for segment in range(segments):
+            pool.spawn(_scan_segment, model, segment, segments, queue)
+        gevent.spawn(_close_when_done, pool, queue)
+        counts[name] = 0
+        while True:
+            item = queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                pool.kill()
+                raise item
+            out.write(json.dumps({'table': name, 'item': item}, separators=(',', ':'), sort_keys=True))
+            out.write('\n')
+            counts[name] += 1
+        logger.info(f'Exported {counts[name]} {name} items')
+    return counts
+
+
+def _scan_segment(model: Any, segment: int, total_segments: int, queue: Queue) -> None:
+    try:
+        with throttle.priority(throttle.BULK):
+            connection = model._get_connection()
+            last_evaluated_key = None
+            while True:
+                data = connection.scan(
+                    segment=segment,
+                    total_segments=total_segments,
+                    exclusive_start_key=last_evaluated_key,
+                )
+                for item in data.get(ITEMS, []):
+                    queue.put(item)
+                last_evaluated_key = data.get(LAST_EVALUATED_KEY)
+                if not last_evaluated_key:
+                    return
+    except Exception as e:
+        queue.put(e)
+
+
+def _close_when_done(pool: Pool, queue: Queue) -> None:
+    pool.join()
+    queue.put(_DONE)
+
+
+def import_lines(
+        lines: Iterable[str],
+        rate: Optional[float] = None,
+        start_line: int = 0,
+        checkpoint: Optional[str] = None,
+) -> int:
+    """
+    Write the items of an export to their tables, with BatchWriteItem, at
+    most rate items per second. Lines before start_line are skipped. After
+    each batch, the number of lines written so far is saved to the
+    checkpoint file, if given, so that an interrupted import can resume.
+    Writes are sent with bulk priority, like the export's scans.
+    Returns the number of lines read.
+    """
+    with throttle.priority(throttle.BULK):
+        return _import_lines(lines, rate, start_line, checkpoint)
+
+
+def _import_lines(lines: Iterable[str], rate: Optional[float], start_line: int, checkpoint: Optional[str]) -> int:
+    bucket = TokenBucket(rate) if rate else None
+    batch: List[Dict] = []
+    batch_table = None
+    line_number = 0
+    for line_number, line in enumerate(lines, 1):
+        if line_number <= start_line or not line.strip():
+            continue
+        record = json.loads(line)
+        if batch and (record['table'] != batch_table or len(batch) >= BATCH_WRITE_PAGE_LIMIT):
+            _write_batch(MODELS[batch_table], batch, bucket)
+            _save_checkpoint(checkpoint, line_number - 1)
+            batch = []
+        batch_table = record['table']
+        batch.append(record['item'])
+    if batch:
+        _write_batch(MODELS[batch_table], batch, bucket)
+        _save_checkpoint(checkpoint, line_number)
+    return line_number
+
+
+def _write_batch(model: Any, items: List[Dict], bucket: Optional[TokenBucket]) -> None:
+    if bucket is not None:
+        bucket.acquire(len(items))
+    connection = model._get_connection()
+    table_name = model.Meta.table_name
+    for attempt in range(WRITE_RETRIES + 1):
+        data = connection.batch_write_item(put_items=items)
+        unprocessed = (data or {}).get(UNPROCESSED_ITEMS, {}).get(table_name)
+        if not unprocessed:
+            return
+        items = [x[PUT_REQUEST]['Item'] for x in unprocessed]
+        if attempt < WRITE_RETRIES:
+            gevent.sleep(WRITE_RETRY_BACKOFF * 2 ** attempt)
+    raise UnprocessedItemsError(f'{len(items)} {table_name} items unprocessed after {WRITE_RETRIES} retries')
+
+
+def load_checkpoint(path: str) -> int:
+    """
+    Return the number of lines a previous import of the same file wrote, or
+    0 if there's no checkpoint.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)['line']
+    except FileNotFoundError:
+        return 0
+
+
+def _save_checkpoint(path: Optional[str], line_number: int) -> None:
+    if path is None:
+        return
+    # Write and rename, so that an interrupted write doesn't leave a broken
+    # checkpoint.
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({'line': line_number}, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def _table_names(tables: str) -> List[str]:
+    names = [x.strip() for x in tables.split(',') if x.strip()]
+    unknown = [x for x in names if x not in MODELS]
+    if unknown:
+        raise ValueError(f'Unknown tables: {", ".join(unknown)}; expected some of {", ".join(MODELS)}')
+    return names
+
+
+class Export(Command):
+    """
+    Export tables to a gzipped JSON lines file.
+    """
+
+    option_list = (
+        Option('--output', dest='output', required=True, help='The file to write; .jsonl.gz by convention'),
+        Option('--tables', dest='tables', default=','.join(DEFAULT_TABLES),
+               help='Comma separated tables to export'),
+        Option('--segments', dest='segments', type=int, default=4, help='Number of parallel scan segments per table'),
+    )
+
+    def run(self, output, tables, segments):
+        start = time.monotonic()
+        with gzip.open(output, 'wt', encoding='utf-8') as out:
+            counts = export_tables(out, _table_names(tables), segments)
+        logger.info(f'Exported {sum(counts.values())} items to {output} in {time.monotonic() - start:.1f}s')
+
+
+class Import(Command):
+    """
+    Import a file written by the export command. Items are written as they
+    are, replacing existing items with the same keys.
+    """
+
+    option_list = (
+        Option('--input', dest='input', required=True, help='The file to import'),
+        Option('--rate', dest='rate', type=float, default=100.0, help='Maximum items written per second; 0 for none'),
+        Option('--checkpoint', dest='checkpoint', default=None,
+               help='Where progress is saved, to resume an interrupted import. Default: the input file + .checkpoint'),
+        Option('--restart', dest='restart', action='store_true', default=False,
+               help='Ignore the checkpoint, and import the whole file'),
+    )
+
+    def run(self, input, rate, checkpoint, restart):
+        checkpoint = checkpoint or f'{input}.checkpoint'
+        start_line = 0 if restart else load_checkpoint(checkpoint)
+        if start_line:
+            logger.info(f'Resuming import of {input} after line {start_line}')
+        start = time.monotonic()
+        with gzip.open(input, 'rt', encoding='utf-8') as lines:
+            line_count = import_lines(lines, rate=rate, start_line=start_line, checkpoint=checkpoint)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        logger.info(f'Imported {line_count - start_line} lines from {input} in {time.monotonic() - start:.1f}s')
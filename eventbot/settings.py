@@ -1,4 +1,4 @@
-from eventbot.utils.settings import bool_env, int_env, str_env
+from eventbot.utils.settings import bool_env, float_env, int_env, list_env, str_env
 
 # Flask settings
 
@@ -15,8 +15,202 @@ DYNAMODB_URL = str_env('DYNAMODB_URL')
 # The DynamoDB table to use for storage of events
 DYNAMODB_TABLE_EVENT = str_env('DYNAMODB_TABLE_EVENT')
 DYNAMODB_GSI_EVENT_STATUS = str_env('DYNAMODB_GSI_EVENT_STATUS')
+# The DynamoDB table closed events are moved to by the lifecycle command
+DYNAMODB_TABLE_EVENT_ARCHIVE = str_env('DYNAMODB_TABLE_EVENT_ARCHIVE', 'eventbot-event-archive')
 # The DynamoDB table to use for storage of user data
 DYNAMODB_TABLE_USER = str_env('DYNAMODB_TABLE_USER')
+# The DynamoDB table to use for storage of event attendees, and its local
+# index of attendees by registration date
+DYNAMODB_TABLE_ATTENDEE = str_env('DYNAMODB_TABLE_ATTENDEE')
+DYNAMODB_LSI_ATTENDEE_REGISTRATION = str_env('DYNAMODB_LSI_ATTENDEE_REGISTRATION', 'attendee-registration')
+# The global index on the attendee table of the events each user is
+# registered for
+DYNAMODB_GSI_ATTENDEE_USER = str_env('DYNAMODB_GSI_ATTENDEE_USER', 'attendee-user')
+
+# Number of concurrent BatchGetItem requests per bulk fetch, when fetching
+# more keys than fit in one request, and the number of times to retry keys
+# DynamoDB leaves unprocessed, with the initial backoff between retries, in
+# seconds.
+BATCH_GET_CONCURRENCY = int_env('BATCH_GET_CONCURRENCY', 4)
+BATCH_GET_RETRIES = int_env('BATCH_GET_RETRIES', 5)
+BATCH_GET_RETRY_BACKOFF = float_env('BATCH_GET_RETRY_BACKOFF', 0.05)
+
+# Number of connections to DynamoDB kept open per worker. Greenlets beyond the
+# pool size open short-lived connections of their own, so this should match
+# the number of requests a worker handles concurrently.
+DYNAMODB_POOL_SIZE = int_env('DYNAMODB_POOL_SIZE', 50)
+# Timeouts, in seconds, for connecting to DynamoDB and for reading a response.
+DYNAMODB_CONNECT_TIMEOUT = float_env('DYNAMODB_CONNECT_TIMEOUT', 2.0)
+DYNAMODB_READ_TIMEOUT = float_env('DYNAMODB_READ_TIMEOUT', 10.0)
+# Whether workers connect to each table when they start, rather than on the
+# first request that needs it.
+DYNAMODB_WARM_UP = bool_env('DYNAMODB_WARM_UP', True)
+# Whether workers limit the rate of their requests to each table, slowing
+# down when DynamoDB throttles them, rather than retrying straight away.
+DYNAMODB_THROTTLE_ENABLED = bool_env('DYNAMODB_THROTTLE_ENABLED', True)
+# The rate, in capacity units per second per worker, that each table's reads
+# and writes start at and recover to, and the lowest rate they slow down to.
+DYNAMODB_THROTTLE_MAX_RATE = float_env('DYNAMODB_THROTTLE_MAX_RATE', 100.0)
+DYNAMODB_THROTTLE_MIN_RATE = float_env('DYNAMODB_THROTTLE_MIN_RATE', 1.0)
+# The longest, in seconds, interactive and background requests wait for their
+# turn before being sent anyway; bulk jobs wait as long as it takes.
+DYNAMODB_THROTTLE_MAX_WAIT = float_env('DYNAMODB_THROTTLE_MAX_WAIT', 1.0)
+
+# Storage settings
+
+# Where events and users are stored: dynamodb, sqlite, or memory. The sqlite
+# backend is for single host deployments; the memory backend keeps everything
+# in the worker's memory, and is meant for tests and local development.
+STORAGE_BACKEND = str_env('STORAGE_BACKEND', 'dynamodb')
+# The database file for the sqlite backend.
+SQLITE_PATH = str_env('SQLITE_PATH', 'eventbot.db')
+# Number of times an edit of an event or user is read and applied again when
+# the item was written by someone else between the read and the save.
+EDIT_CONFLICT_RETRIES = int_env('EDIT_CONFLICT_RETRIES', 5)
+
+# Number of events listed per page by the `event list` command.
+EVENT_LIST_PAGE_SIZE = int_env('EVENT_LIST_PAGE_SIZE', 10)
+
+# Lifecycle settings
+
+# Open events without an end date are closed by the lifecycle command this
+# many days after they were last modified; events with one are closed once
+# they've ended.
+EVENT_INACTIVE_DAYS = int_env('EVENT_INACTIVE_DAYS', 30)
+# Closed events are moved to the archive table this many days after they were
+# closed.
+EVENT_ARCHIVE_AFTER_DAYS = int_env('EVENT_ARCHIVE_AFTER_DAYS', 7)
+# Maximum number of events the lifecycle command closes or archives per
+# second.
+LIFECYCLE_RATE = float_env('LIFECYCLE_RATE', 25.0)
+
+# Reminder settings
+
+# Whether workers post reminders to the threads of open events, at each of
+# REMINDER_OFFSETS minutes before they start. Reminders are sent through
+# omnibot's API; see the omnibot settings.
+REMINDERS_ENABLED = bool_env('REMINDERS_ENABLED', False)
+REMINDER_OFFSETS = [int(x) for x in list_env('REMINDER_OFFSETS', '1440,60')]
+# Seconds between reloads of upcoming reminders from the status index.
+REMINDER_REFRESH_INTERVAL = float_env('REMINDER_REFRESH_INTERVAL', 60.0)
+# Reminders more than this many seconds late, for instance because no worker
+# was running when they were due, are skipped.
+REMINDER_MAX_LATENESS = float_env('REMINDER_MAX_LATENESS', 900.0)
+# Maximum number of reminders sent concurrently, per worker.
+REMINDER_SEND_CONCURRENCY = int_env('REMINDER_SEND_CONCURRENCY', 10)
+
+# Omnibot settings
+
+# Where omnibot's API is, and the team and bot names messages are sent as,
+# for messages that aren't responses to a request, like reminders.
+OMNIBOT_URL = str_env('OMNIBOT_URL')
+OMNIBOT_TEAM_NAME = str_env('OMNIBOT_TEAM_NAME')
+OMNIBOT_BOT_NAME = str_env('OMNIBOT_BOT_NAME', 'eventbot')
+# Timeout, in seconds, for requests to omnibot's API.
+OMNIBOT_TIMEOUT = float_env('OMNIBOT_TIMEOUT', 5.0)
+
+# API settings
+
+# The library used to encode and decode API payloads: orjson, ujson, json, or
+# auto, for the first of them that's installed.
+JSON_CODEC = str_env('JSON_CODEC', 'auto')
+# Whether to gzip API responses of at least RESPONSE_COMPRESSION_MIN_SIZE
+# bytes, for clients that accept it, and the gzip compression level.
+RESPONSE_COMPRESSION_ENABLED = bool_env('RESPONSE_COMPRESSION_ENABLED', False)
+RESPONSE_COMPRESSION_MIN_SIZE = int_env('RESPONSE_COMPRESSION_MIN_SIZE', 4096)
+RESPONSE_COMPRESSION_LEVEL = int_env('RESPONSE_COMPRESSION_LEVEL', 6)
+
+# Tracing settings
+
+# Share of requests, from 0 to 1, for which the time spent in each phase is
+# recorded. Traces are logged, and the slowest are kept, per worker, for the
+# debug endpoint.
+TRACE_SAMPLE_RATE = float_env('TRACE_SAMPLE_RATE', 0.01)
+# Number of slowest traces kept per worker.
+TRACE_SLOWEST_COUNT = int_env('TRACE_SLOWEST_COUNT', 20)
+# Maximum number of spans recorded per trace; the rest are counted.
+TRACE_MAX_SPANS = int_env('TRACE_MAX_SPANS', 200)
+
+# Debug endpoint settings
+
+# A secret that requests to the /debug endpoints must send in the
+# X-Debug-Token header. The endpoints are disabled when it isn't set.
+DEBUG_ENDPOINT_TOKEN = str_env('DEBUG_ENDPOINT_TOKEN')
+
+# Profiling settings
+
+# Whether workers can be profiled on demand, through the /debug/profile
+# endpoint, which also needs DEBUG_ENDPOINT_TOKEN to be set.
+PROFILING_ENABLED = bool_env('PROFILING_ENABLED', False)
+# The directory profiles are written to.
+PROFILE_DIR = str_env('PROFILE_DIR', '/tmp/eventbot-profiles')
+# The longest a profiling session can run for, in seconds.
+PROFILE_MAX_SECONDS = float_env('PROFILE_MAX_SECONDS', 300.0)
+# Number of frames recorded per allocation by memory profiling.
+PROFILE_TRACEMALLOC_FRAMES = int_env('PROFILE_TRACEMALLOC_FRAMES', 10)
+# Number of finished sessions listed by the endpoint, per worker.
+PROFILE_MAX_RESULTS = int_env('PROFILE_MAX_RESULTS', 20)
+
+# Model cache settings
+
+# Per-worker read-through caches in front of the User and Event models. Set a
+# max size to 0 to disable the respective cache. Venmo handles rarely change,
+# so users can be cached for much longer than events.
+USER_CACHE_MAX_SIZE = int_env('USER_CACHE_MAX_SIZE', 2000)
+USER_CACHE_TTL = float_env('USER_CACHE_TTL', 300.0)
+EVENT_CACHE_MAX_SIZE = int_env('EVENT_CACHE_MAX_SIZE', 500)
+EVENT_CACHE_TTL = float_env('EVENT_CACHE_TTL', 5.0)
+# Archived events don't change, so they can be cached for longer; this cache
+# is only consulted for events that aren't in the event table.
+ARCHIVED_EVENT_CACHE_TTL = float_env('ARCHIVED_EVENT_CACHE_TTL', 300.0)
+# Per-worker cache of rendered event messages, keyed on the event's modified
+# date and the version of the user cache they were rendered from.
+RENDER_CACHE_MAX_SIZE = int_env('RENDER_CACHE_MAX_SIZE', 500)
+RENDER_CACHE_TTL = float_env('RENDER_CACHE_TTL', 60.0)
+
+# Idempotency settings
+
+# Per-worker cache of responses to recent interactions, so that events omnibot
+# retries are answered from the cache instead of being handled again. Set the
+# max size to 0 to disable it.
+IDEMPOTENCY_CACHE_MAX_SIZE = int_env('IDEMPOTENCY_CACHE_MAX_SIZE', 1000)
+IDEMPOTENCY_CACHE_TTL = float_env('IDEMPOTENCY_CACHE_TTL', 300.0)
+
+# Rendering settings
+
+# Number of attendees listed on an event's message; the rest are summarized
+# as "and N more", and can be listed with the "Show all attendees" button.
+RENDER_ATTENDEE_LIMIT = int_env('RENDER_ATTENDEE_LIMIT', 50)
+# Number of attendees per message when listing all of an event's attendees.
+ATTENDEE_PAGE_SIZE = int_env('ATTENDEE_PAGE_SIZE', 100)
+# Maximum number of events the repair-summaries command checks per second.
+SUMMARY_REPAIR_RATE = float_env('SUMMARY_REPAIR_RATE', 25.0)
+
+# Registration settings
+
+# Seconds to wait, after the first register/unregister click for an event,
+# for more clicks to arrive, before writing them all in a single write. Clicks
+# that arrive while a write is in flight are always coalesced into the next
+# write, even with a window of 0.
+REGISTRATION_COALESCE_WINDOW = float_env('REGISTRATION_COALESCE_WINDOW', 0.0)
+
+# Fast-ack settings
+
+# When enabled, register, unregister and refresh clicks are acknowledged
+# immediately with an ephemeral message, and the write and message update are
+# applied in the background, then sent to slack via the event's response_url.
+FAST_ACK_ENABLED = bool_env('FAST_ACK_ENABLED', False)
+# Maximum number of concurrent background jobs per worker. When the pool is
+# full, clicks are handled synchronously.
+BACKGROUND_POOL_SIZE = int_env('BACKGROUND_POOL_SIZE', 20)
+# Number of times to retry a failed background step, and the initial backoff
+# between retries, in seconds.
+BACKGROUND_RETRIES = int_env('BACKGROUND_RETRIES', 3)
+BACKGROUND_RETRY_BACKOFF = float_env('BACKGROUND_RETRY_BACKOFF', 0.5)
+# Seconds to wait for background jobs to finish when a worker exits.
+BACKGROUND_DRAIN_TIMEOUT = float_env('BACKGROUND_DRAIN_TIMEOUT', 10.0)
+# Timeout, in seconds, for posting to slack response URLs.
+RESPONSE_URL_TIMEOUT = float_env('RESPONSE_URL_TIMEOUT', 5.0)
 
 # StatsD Settings
 
@@ -0,0 +1,35 @@
+from eventbot import settings
+from eventbot.storage.base import StorageBackend
+
+_BACKEND = None
+
+
+def get_backend() -> StorageBackend:
+    """
+    Return the storage backend selected by the STORAGE_BACKEND setting.
+    """
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = _create_backend(settings.STORAGE_BACKEND)
+    return _BACKEND
+
+
+def set_backend(backend: StorageBackend) -> None:
+    """
+    Replace the storage backend; mostly useful for tests.
+    """
+    global _BACKEND
+    _BACKEND = backend
+
+
+def _create_backend(name: str) -> StorageBackend:
+    if name == 'dynamodb':
+        from eventbot.storage.dynamodb import DynamoDBBackend
+        return DynamoDBBackend()
+    if name == 'memory':
+        from eventbot.storage.memory import MemoryBackend
+        return MemoryBackend()
+    if name == 'sqlite':
+        from eventbot.storage.sqlite import SQLiteBackend
+        return SQLiteBackend(settings.SQLITE_PATH)
+    raise ValueError(f'Unknown storage backend: {name}')
@@ -0,0 +1,268 @@
+import base64
+import binascii
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Text, Tuple
+
+from eventbot import settings
+from eventbot.models.event import Event
+from eventbot.models.versioned import VersionConflict
+from eventbot.utils import stats
+
+
+def encode_cursor(position: Dict) -> str:
+    """
+    Encode a backend's position in a listing as an opaque, URL-safe cursor.
+    """
+    data = json.dumps(position, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """
+    Decode a cursor made by encode_cursor, raising ValueError if it's invalid.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(data.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if not isinstance(position, dict):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return position
+
+
+class _NoPaymentSummary(Exception):
+    """
+    Raised to abandon updating the payment summary of an event that has none,
+    or that the user has left.
+    """
+
+
+class StorageBackend(ABC):
+    """
+    Where events and users are stored.
+
+    Whatever the backend, items are passed around as the pynamodb models in
+    eventbot.models; only backends that talk to DynamoDB call the models' own
+    persistence methods. Models constructed with keyword arguments don't need
+    DynamoDB to be reachable.
+    """
+
+    @abstractmethod
+    def get(self, model: Any, hash_key: Any, cached: bool = False, consistent_read: bool = False) -> Any:
+        """
+        Get a single item, raising the model's DoesNotExist if it isn't
+        stored. If cached is True, the item may be served from a per-worker
+        cache, so it mustn't be used as the base of a full-item write. If
+        consistent_read is True, the item reflects every write that succeeded
+        before the read; otherwise, a backend may return a stale item.
+        """
+
+    @abstractmethod
+    def batch_get(self, model: Any, hash_keys: Iterable[Any]) -> List:
+        """
+        Get the items for hash_keys, possibly from a per-worker cache, in the
+        order of hash_keys, with duplicates and missing items omitted.
+        """
+
+    @abstractmethod
+    def save(self, obj: Any) -> None:
+        """
+        Write a whole item, setting its created and modified dates, and
+        incrementing its version. Raises VersionConflict if the stored item's
+        version isn't the one obj was read with; see VersionedModelMixin.
+        """
+
+    def edit(
+            self,
+            model: Any,
+            hash_key: Any,
+            apply: Callable[[Any], None],
+            create: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        """
+        Read an item, change it with apply, and save it. If the item was
+        written by someone else in between, it's read and changed again, up
+        to EDIT_CONFLICT_RETRIES times, so apply should only set the fields
+        being edited. Items that don't exist are made with create, or the
+        model's DoesNotExist is raised. Returns the saved item.
+        """
+        for attempt in range(settings.EDIT_CONFLICT_RETRIES + 1):
+            try:
+                # A stale read would conflict again on every retry.
+                obj = self.get(model, hash_key, consistent_read=True)
+            except model.DoesNotExist:
+                if create is None:
+                    raise
+                obj = create()
+            apply(obj)
+            try:
+                self.save(obj)
+            except VersionConflict:
+                stats.incr(f'storage.{model.__name__.lower()}.version_conflict')
+                if attempt == settings.EDIT_CONFLICT_RETRIES:
+                    raise
+                continue
+            return obj
+
+    @abstractmethod
+    def data_version(self, model: Any) -> int:
+        """
+        A counter that changes whenever an item of model is written through
+        this worker.
+        """
+
+    @abstractmethod
+    def list_events(
+            self,
+            status: str,
+            since: Optional[datetime] = None,
+            limit: int = 10,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Event], Optional[str]]:
+        """
+        List up to limit events with status, in order of start date, starting
+        after cursor, and optionally only those starting at or after since.
+        Returns the events and the cursor for the next page, or None if this
+        was the last page. The events only have their key, name, creator and
+        dates set.
+
+        Listing costs time proportional to the number of matching events, not
+        to the number of stored events.
+        """
+
+    @abstractmethod
+    def list_unindexed_events(
+            self,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        """
+        List up to limit event_ids, starting after cursor, of events that
+        list_events misses, because they were written without a start date or
+        status, by versions of eventbot before the status index. Returns the
+        event_ids and the cursor for the next page, or None if this was the
+        last page.
+
+        Listing scans every stored event; see index_event.
+        """
+
+    @abstractmethod
+    def index_event(self, event_id: Text) -> bool:
+        """
+        Give an event listed by list_unindexed_events its created date as its
+        start date, and the open status if it has none, so that list_events
+        lists it. The modified date is left as it is, so that the event's
+        activity isn't changed. Returns False if the event doesn't exist, or
+        was already indexed.
+        """
+
+    @abstractmethod
+    def archive_events(self, event_ids: Iterable[Text], closed_before: datetime) -> List[Text]:
+        """
+        Move the given events to the archive, if they're closed and were last
+        modified before closed_before; other events are left as they are.
+        Attendees aren't moved. Returns the event_ids that were archived.
+        """
+
+    @abstractmethod
+    def get_archived_events(self, event_ids: Iterable[Text]) -> List[Event]:
+        """
+        Get archived events, possibly from a per-worker cache, in the order of
+        event_ids, with duplicates and events that aren't archived omitted.
+        """
+
+    @abstractmethod
+    def claim_reminder(self, event: Event, offset: int) -> bool:
+        """
+        Record that the reminder offset minutes before an event's start is
+        being sent. Claims are atomic with respect to other workers, and
+        survive restarts, so each reminder is claimed once; returns False if
+        it already was.
+        """
+
+    @abstractmethod
+    def is_attendee(self, event: Event, user_id: Text) -> bool:
+        """
+        Whether user_id is registered for an event.
+        """
+
+    @abstractmethod
+    def list_attendee_events(self, user_id: Text) -> List[Text]:
+        """
+        List the event_ids of the events a user is registered for, including
+        archived events.
+        """
+
+    def update_payment_handle(
+            self,
+            event_id: Text,
+            user_id: Text,
+            old_handle: Optional[Text],
+            new_handle: Optional[Text],
+    ) -> Optional[Event]:
+        """
+        Update the payment summary of an event that user_id is registered
+        for, after their venmo handle changed from old_handle to new_handle.
+        Returns the updated event, or None if the event doesn't exist, has no
+        summary, or the user isn't registered for it.
+        """
+        def apply(event: Event) -> None:
+            if event.payment_summary is None or not self.is_attendee(event, user_id):
+                raise _NoPaymentSummary()
+            event.payment_summary.set_attendee_handle(user_id, old_handle, new_handle)
+
+        try:
+            return self.edit(Event, event_id, apply)
+        except (_NoPaymentSummary, Event.DoesNotExist):
+            return None
+
+    @abstractmethod
+    def list_attendees(
+            self,
+            event: Event,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        """
+        List up to limit attendee user_ids of an event, in order of
+        registration, starting after cursor. Returns the user_ids and the
+        cursor for the next page, or None if this was the last page.
+        """
+
+    def get_attendees(self, event: Event, page_size: int = 100) -> List[Text]:
+        """
+        Return every attendee user_id of an event, fetched page by page.
+        """
+        user_ids = []
+        cursor = None
+        while True:
+            page, cursor = self.list_attendees(event, limit=page_size, cursor=cursor)
+            user_ids.extend(page)
+            if cursor is None:
+                return user_ids
+
+    @abstractmethod
+    def apply_attendee_changes(
+            self,
+            event: Event,
+            changes: List[Tuple[Text, bool]],
+    ) -> List[bool]:
+        """
+        Apply a batch of (user_id, register) changes to the attendees of an
+        event, its attendee count and its payment summary, if it has one, and
+        update event to the new state of the item. Each change is conditional
+        on the user's registration, so concurrent changes for the same user
+        take effect once; the count and summary are updated after the
+        attendees, which on DynamoDB is a separate write. The changes
+        increment the event's version. Returns, for each change, whether it
+        took effect.
+        """
+
+    def register_attendee(self, event: Event, user_id: Text) -> bool:
+        return self.apply_attendee_changes(event, [(user_id, True)])[0]
+
+    def unregister_attendee(self, event: Event, user_id: Text) -> bool:
+        return self.apply_attendee_changes(event, [(user_id, False)])[0]
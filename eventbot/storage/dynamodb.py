@@ -0,0 +1,195 @@
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Text, Tuple
+
+from pynamodb.exceptions import DeleteError, UpdateError
+
+from eventbot.models import batch
+from eventbot.models.archive import ArchivedEvent
+from eventbot.models.attendee import Attendee
+from eventbot.models.event import Event
+from eventbot.models.user import User
+from eventbot.models.versioned import _is_conditional_check_failure
+from eventbot.storage.base import StorageBackend, decode_cursor, encode_cursor
+
+# The attributes of the keys DynamoDB returns as the last evaluated key of a
+# page, which cursors hold: the table key and the queried index's key.
+_EVENT_STATUS_KEY = frozenset(['event_id', 'status', 'start_date'])
+_ATTENDEE_REGISTRATION_KEY = frozenset(['event_id', 'user_id', 'registered_date'])
+_EVENT_KEY = frozenset(['event_id'])
+
+
+class DynamoDBBackend(StorageBackend):
+    """
+    Stores items in DynamoDB, through the models, with their per-worker read
+    caches in front.
+    """
+
+    def get(self, model: Any, hash_key: Any, cached: bool = False, consistent_read: bool = False) -> Any:
+        if cached and not consistent_read:
+            return model.get_cached(hash_key)
+        return model.get(hash_key, consistent_read=consistent_read)
+
+    def batch_get(self, model: Any, hash_keys: Iterable[Any]) -> List:
+        return model.batch_get_cached(hash_keys)
+
+    def save(self, obj: Any) -> None:
+        obj.save()
+
+    def data_version(self, model: Any) -> int:
+        return model.cache_version()
+
+    def list_events(
+            self,
+            status: str,
+            since: Optional[datetime] = None,
+            limit: int = 10,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Event], Optional[str]]:
+        last_evaluated_key = None
+        if cursor is not None:
+            last_evaluated_key = _decode_key(cursor, _EVENT_STATUS_KEY)
+            if last_evaluated_key['status'] != {'S': status}:
+                raise ValueError(f'Invalid cursor: {cursor}')
+        results = Event.query_by_status(
+            status,
+            since=since,
+            limit=limit,
+            last_evaluated_key=last_evaluated_key,
+        )
+        events = list(results)
+        next_cursor = None
+        if len(events) == limit and results.last_evaluated_key:
+            next_cursor = encode_cursor(results.last_evaluated_key)
+        return events, next_cursor
+
+    def list_unindexed_events(
+            self,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        last_evaluated_key = None
+        if cursor is not None:
+            last_evaluated_key = _decode_key(cursor, _EVENT_KEY)
+        results = Event.scan(
+            filter_condition=Event.start_date.does_not_exist() | Event.status.does_not_exist(),
+            limit=limit,
+            last_evaluated_key=last_evaluated_key,
+        )
+        event_ids = [x.event_id for x in results]
+        next_cursor = None
+        if len(event_ids) == limit and results.last_evaluated_key:
+            next_cursor = encode_cursor(results.last_evaluated_key)
+        return event_ids, next_cursor
+
+    def index_event(self, event_id: Text) -> bool:
+        try:
+            Event(event_id=event_id).update(
+                actions=[
+                    Event.start_date.set(Event.start_date | Event.created_date),
+                    Event.status.set(Event.status | Event.STATUS_OPEN),
+                ],
+                condition=(
+                    Event.created_date.exists() &
+                    (Event.start_date.does_not_exist() | Event.status.does_not_exist())
+                ),
+            )
+        except UpdateError as e:
+            if not _is_conditional_check_failure(e):
+                raise
+            return False
+        return True
+
+    def archive_events(self, event_ids: Iterable[Text], closed_before: datetime) -> List[Text]:
+        closed_before = Event.modified_date.serialize(closed_before)
+        events = [
+            x for x in batch.batch_get(Event, event_ids)
+            if x.status == Event.STATUS_CLOSED and Event.modified_date.serialize(x.modified_date) < closed_before
+        ]
+        for event in events:
+            event.migrate_attendees()
+        with ArchivedEvent.batch_write() as archive:
+            for event in events:
+                archive.save(ArchivedEvent.from_event(event))
+        archived = []
+        for event in events:
+            # An event written since it was read stays, and is archived again
+            # by a later run.
+            if event.version is None:
+                condition = Event.version.does_not_exist()
+            else:
+                condition = Event.version == event.version
+            try:
+                event.delete(condition=condition)
+            except DeleteError as e:
+                if not _is_conditional_check_failure(e):
+                    raise
+                continue
+            archived.append(event.event_id)
+        return archived
+
+    def get_archived_events(self, event_ids: Iterable[Text]) -> List[Event]:
+        return [x.to_event() for x in ArchivedEvent.batch_get_cached(event_ids)]
+
+    def claim_reminder(self, event: Event, offset: int) -> bool:
+        return event.claim_reminder(offset)
+
+    def is_attendee(self, event: Event, user_id: Text) -> bool:
+        return event.is_attendee(user_id)
+
+    def list_attendee_events(self, user_id: Text) -> List[Text]:
+        return Attendee.event_ids_for(user_id)
+
+    def list_attendees(
+            self,
+            event: Event,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        last_evaluated_key = None
+        if cursor is not None:
+            last_evaluated_key = decode_cursor(cursor)
+            if set(last_evaluated_key) == {'offset'}:
+                # A page of attendees not yet migrated to the attendee table
+                if not isinstance(last_evaluated_key['offset'], int) or last_evaluated_key['offset'] < 0:
+                    raise ValueError(f'Invalid cursor: {cursor}')
+            else:
+                last_evaluated_key = _decode_key(cursor, _ATTENDEE_REGISTRATION_KEY)
+                if last_evaluated_key['event_id'] != {'S': event.event_id}:
+                    raise ValueError(f'Invalid cursor: {cursor}')
+        user_ids, last_evaluated_key = event.list_attendees(
+            limit=limit,
+            last_evaluated_key=last_evaluated_key,
+        )
+        if last_evaluated_key is None:
+            return user_ids, None
+        return user_ids, encode_cursor(last_evaluated_key)
+
+    def apply_attendee_changes(
+            self,
+            event: Event,
+            changes: List[Tuple[Text, bool]],
+    ) -> List[bool]:
+        return event.apply_attendee_changes(changes, get_handles=_get_handles)
+
+    def register_attendee(self, event: Event, user_id: Text) -> bool:
+        return event.register_attendee(user_id, get_handles=_get_handles)
+
+    def unregister_attendee(self, event: Event, user_id: Text) -> bool:
+        return event.unregister_attendee(user_id, get_handles=_get_handles)
+
+
+def _decode_key(cursor: str, names: FrozenSet[str]) -> Dict:
+    """
+    Decode a cursor holding a DynamoDB key made of the string attributes in
+    names, raising ValueError if it doesn't, rather than letting DynamoDB
+    reject the query.
+    """
+    key = decode_cursor(cursor)
+    if set(key) != names or not all(
+            isinstance(x, dict) and list(x) == ['S'] and isinstance(x['S'], str) for x in key.values()):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return key
+
+
+def _get_handles(user_ids: List[Text]) -> Dict[Text, Optional[Text]]:
+    return {x.user_id: x.venmo_handle for x in User.batch_get_cached(user_ids)}
@@ -0,0 +1,253 @@
+import copy
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Text, Tuple
+
+from eventbot import settings
+from eventbot.models.event import Event
+from eventbot.models.user import User
+from eventbot.models.versioned import VersionConflict
+from eventbot.storage.base import StorageBackend, decode_cursor, encode_cursor
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Stores items in a dict, in this process only. Useful for tests, local
+    development and load tests that shouldn't depend on the network; nothing
+    is shared between workers, or survives a restart.
+
+    Stored items are copied on the way in and out, like cached items. The
+    attendees of each event are kept in an ordered dict, keyed on user_id.
+    """
+
+    def __init__(self) -> None:
+        self._items = {}
+        self._archived: Dict[str, Event] = {}
+        self._attendees: Dict[str, OrderedDict] = {}
+        self._versions: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _get_stored(self, model: Any, hash_key: Any) -> Any:
+        try:
+            return self._items[(model, hash_key)]
+        except KeyError:
+            raise model.DoesNotExist()
+
+    def get(self, model: Any, hash_key: Any, cached: bool = False, consistent_read: bool = False) -> Any:
+        return copy.deepcopy(self._get_stored(model, hash_key))
+
+    def batch_get(self, model: Any, hash_keys: Iterable[Any]) -> List:
+        items = []
+        seen = set()
+        for hash_key in hash_keys:
+            if hash_key in seen:
+                continue
+            seen.add(hash_key)
+            obj = self._items.get((model, hash_key))
+            if obj is not None:
+                items.append(copy.deepcopy(obj))
+        return items
+
+    def save(self, obj: Any) -> None:
+        model = type(obj)
+        key = (model, getattr(obj, model._hash_key_name))
+        with self._lock:
+            stored = self._items.get(key)
+            if (stored.version if stored is not None else None) != obj.version:
+                raise VersionConflict(f'{model.__name__} was written since it was read')
+            obj.touch()
+            obj.version = (obj.version or 0) + 1
+            if model is Event:
+                attendees = self._attendees.setdefault(obj.event_id, OrderedDict())
+                if obj.attendees is not None:
+                    # Attendees are kept apart from the event; a list given
+                    # with the event replaces them.
+                    attendees.clear()
+                    attendees.update((x.attendee, None) for x in obj.attendees)
+                    obj.attendees = None
+                    # Until it's repaired; see PaymentSummaryMap.
+                    obj.payment_summary = None
+                obj.attendee_count = len(attendees)
+            self._items[key] = copy.deepcopy(obj)
+            self._versions[model] += 1
+
+    def data_version(self, model: Any) -> int:
+        return self._versions[model]
+
+    def list_events(
+            self,
+            status: str,
+            since: Optional[datetime] = None,
+            limit: int = 10,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Event], Optional[str]]:
+        # Unlike the other backends, this is a scan; it's only meant for small
+        # data sets.
+        def sort_key(obj):
+            return (Event.start_date.serialize(obj.start_date), obj.event_id)
+
+        events = sorted(
+            (
+                obj for (model, _), obj in self._items.items()
+                if model is Event and obj.status == status and obj.start_date is not None and
+                (since is None or sort_key(obj)[0] >= Event.start_date.serialize(since))
+            ),
+            key=sort_key,
+        )
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            try:
+                after = (position['start_date'], position['event_id'])
+            except KeyError:
+                raise ValueError(f'Invalid cursor: {cursor}')
+            events = [x for x in events if sort_key(x) > after]
+        page = [
+            Event(
+                event_id=x.event_id,
+                name=x.name,
+                creator=x.creator,
+                status=x.status,
+                start_date=x.start_date,
+                start_date_given=x.start_date_given,
+                end_date=x.end_date,
+            )
+            for x in events[:limit]
+        ]
+        next_cursor = None
+        if len(events) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor({
+                'start_date': Event.start_date.serialize(last.start_date),
+                'event_id': last.event_id,
+            })
+        return page, next_cursor
+
+    def list_unindexed_events(
+            self,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        event_ids = sorted(
+            obj.event_id for (model, _), obj in self._items.items()
+            if model is Event and (obj.start_date is None or obj.status is None)
+        )
+        if cursor is not None:
+            try:
+                after = decode_cursor(cursor)['event_id']
+            except KeyError:
+                raise ValueError(f'Invalid cursor: {cursor}')
+            event_ids = [x for x in event_ids if x > after]
+        next_cursor = None
+        if len(event_ids) > limit:
+            next_cursor = encode_cursor({'event_id': event_ids[limit - 1]})
+        return event_ids[:limit], next_cursor
+
+    def index_event(self, event_id: Text) -> bool:
+        with self._lock:
+            stored = self._items.get((Event, event_id))
+            if stored is None or stored.created_date is None or (
+                    stored.start_date is not None and stored.status is not None):
+                return False
+            if stored.start_date is None:
+                stored.start_date = stored.created_date
+            if stored.status is None:
+                stored.status = Event.STATUS_OPEN
+            stored.version = (stored.version or 0) + 1
+            self._versions[Event] += 1
+        return True
+
+    def archive_events(self, event_ids: Iterable[Text], closed_before: datetime) -> List[Text]:
+        archived = []
+        with self._lock:
+            for event_id in dict.fromkeys(event_ids):
+                obj = self._items.get((Event, event_id))
+                if obj is None or obj.status != Event.STATUS_CLOSED:
+                    continue
+                if Event.modified_date.serialize(obj.modified_date) >= Event.modified_date.serialize(closed_before):
+                    continue
+                self._archived[event_id] = self._items.pop((Event, event_id))
+                archived.append(event_id)
+            if archived:
+                self._versions[Event] += 1
+        return archived
+
+    def get_archived_events(self, event_ids: Iterable[Text]) -> List[Event]:
+        return [
+            copy.deepcopy(self._archived[event_id])
+            for event_id in dict.fromkeys(event_ids)
+            if event_id in self._archived
+        ]
+
+    def claim_reminder(self, event: Event, offset: int) -> bool:
+        with self._lock:
+            stored = self._items.get((Event, event.event_id))
+            if stored is None or offset in (stored.reminders_sent or ()):
+                return False
+            stored.reminders_sent = set(stored.reminders_sent or ()) | {offset}
+            stored.version = (stored.version or 0) + 1
+        return True
+
+    def is_attendee(self, event: Event, user_id: Text) -> bool:
+        return user_id in self._attendees.get(event.event_id, ())
+
+    def list_attendee_events(self, user_id: Text) -> List[Text]:
+        with self._lock:
+            return [event_id for event_id, attendees in self._attendees.items() if user_id in attendees]
+
+    def _get_handles(self, user_ids: List[Text]) -> Dict[Text, Optional[Text]]:
+        return {
+            user_id: self._items[(User, user_id)].venmo_handle
+            for user_id in user_ids
+            if (User, user_id) in self._items
+        }
+
+    def list_attendees(
+            self,
+            event: Event,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        start = 0
+        if cursor is not None:
+            try:
+                start = int(decode_cursor(cursor)['offset'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f'Invalid cursor: {cursor}')
+        user_ids = list(self._attendees.get(event.event_id, ()))
+        next_cursor = None
+        if start + limit < len(user_ids):
+            next_cursor = encode_cursor({'offset': start + limit})
+        return user_ids[start:start + limit], next_cursor
+
+    def apply_attendee_changes(
+            self,
+            event: Event,
+            changes: List[Tuple[Text, bool]],
+    ) -> List[bool]:
+        with self._lock:
+            stored = self._get_stored(Event, event.event_id)
+            attendees = self._attendees[event.event_id]
+            results = []
+            for user_id, register in changes:
+                results.append(register != (user_id in attendees))
+                if register:
+                    attendees.setdefault(user_id, None)
+                else:
+                    attendees.pop(user_id, None)
+            if any(results):
+                stored.attendee_count = len(attendees)
+                stored.modified_date = datetime.utcnow()
+                stored.version = (stored.version or 0) + 1
+                summary = stored.payment_summary
+                if summary is not None:
+                    summary.apply_attendee_changes(changes, results, self._get_handles)
+                    if summary.needs_refill(len(attendees)):
+                        summary.refill(list(attendees)[:settings.RENDER_ATTENDEE_LIMIT], self._get_handles)
+                self._versions[Event] += 1
+            event.attendees = None
+            event.attendee_count = stored.attendee_count
+            event.modified_date = stored.modified_date
+            event.payment_summary = copy.deepcopy(stored.payment_summary)
+            event.version = stored.version
+        return results
@@ -0,0 +1,541 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Text, Tuple
+
+from pynamodb.attributes import BooleanAttribute, MapAttribute, UTCDateTimeAttribute
+
+from eventbot import settings
+from eventbot.models.event import Event
+from eventbot.models.user import User
+from eventbot.models.versioned import VersionConflict
+from eventbot.storage.base import StorageBackend, decode_cursor, encode_cursor
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    created_date TEXT,
+    modified_date TEXT,
+    start_date TEXT,
+    start_date_given INTEGER,
+    end_date TEXT,
+    status TEXT,
+    creator TEXT,
+    channel_id TEXT,
+    extra_attendees NUMERIC,
+    cost NUMERIC,
+    attendee_count INTEGER NOT NULL DEFAULT 0,
+    payment_summary TEXT,
+    version INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_status_start_date ON events (status, start_date, event_id);
+CREATE TABLE IF NOT EXISTS event_attendees (
+    event_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (event_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS event_attendees_position ON event_attendees (event_id, position);
+CREATE INDEX IF NOT EXISTS event_attendees_user ON event_attendees (user_id);
+CREATE TABLE IF NOT EXISTS event_reminders (
+    event_id TEXT NOT NULL,
+    offset_minutes INTEGER NOT NULL,
+    PRIMARY KEY (event_id, offset_minutes)
+);
+CREATE TABLE IF NOT EXISTS archived_events (
+    event_id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    created_date TEXT,
+    modified_date TEXT,
+    start_date TEXT,
+    start_date_given INTEGER,
+    end_date TEXT,
+    status TEXT,
+    creator TEXT,
+    channel_id TEXT,
+    extra_attendees NUMERIC,
+    cost NUMERIC,
+    attendee_count INTEGER NOT NULL DEFAULT 0,
+    payment_summary TEXT,
+    version INTEGER,
+    archived_date TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    venmo_handle TEXT,
+    created_date TEXT,
+    modified_date TEXT,
+    version INTEGER
+);
+'''
+
+# Columns added since the first version of the schema, which are added to
+# existing databases when they're opened, as (table, column, type).
+_ADDED_COLUMNS = (
+    ('events', 'version', 'INTEGER'),
+    ('users', 'version', 'INTEGER'),
+    ('events', 'channel_id', 'TEXT'),
+    ('archived_events', 'channel_id', 'TEXT'),
+    ('events', 'payment_summary', 'TEXT'),
+    ('archived_events', 'payment_summary', 'TEXT'),
+    ('events', 'start_date_given', 'INTEGER'),
+    ('archived_events', 'start_date_given', 'INTEGER'),
+)
+
+_TABLES = {
+    Event: ('events', (
+        'event_id',
+        'name',
+        'description',
+        'created_date',
+        'modified_date',
+        'start_date',
+        'start_date_given',
+        'end_date',
+        'status',
+        'creator',
+        'channel_id',
+        'extra_attendees',
+        'cost',
+        'attendee_count',
+        'payment_summary',
+        'version',
+    )),
+    User: ('users', (
+        'user_id',
+        'venmo_handle',
+        'created_date',
+        'modified_date',
+        'version',
+    )),
+}
+
+# SQLite's default limit on the number of parameters in a single statement is 999.
+_MAX_PARAMS = 500
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Stores items in a local SQLite database, in WAL mode, so that readers in
+    every worker can proceed while a write is in progress. Suitable for single
+    host deployments, where every worker can reach the same file.
+
+    Attendees are kept in their own table, keyed on (event_id, user_id), so
+    registering or unregistering is a single indexed insert or delete, rather
+    than a rewrite of the event's whole attendee list.
+
+    Each process opens its own connection, on first use, so the backend can be
+    created before gunicorn forks its workers.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._versions: Counter = Counter()
+        self._lock = threading.RLock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_SCHEMA)
+            for table, column, column_type in _ADDED_COLUMNS:
+                existing = [row[1] for row in connection.execute(f'PRAGMA table_info({table})')]
+                if column not in existing:
+                    connection.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        A write transaction. BEGIN IMMEDIATE takes the write lock up front,
+        so that read-modify-write transactions don't fail on upgrade.
+        """
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    @staticmethod
+    def _to_column(model: Any, name: str, value: Any) -> Any:
+        if value is None:
+            return None
+        attribute = model.get_attributes()[name]
+        if isinstance(attribute, UTCDateTimeAttribute):
+            return attribute.serialize(value)
+        if isinstance(attribute, MapAttribute):
+            return json.dumps(attribute.serialize(value))
+        return value
+
+    @staticmethod
+    def _from_column(model: Any, name: str, value: Any) -> Any:
+        if value is None:
+            return None
+        attribute = model.get_attributes()[name]
+        if isinstance(attribute, UTCDateTimeAttribute):
+            return attribute.deserialize(value)
+        if isinstance(attribute, MapAttribute):
+            return attribute.deserialize(json.loads(value))
+        if isinstance(attribute, BooleanAttribute):
+            return bool(value)
+        return value
+
+    def _from_row(self, model: Any, row: Tuple) -> Any:
+        _, columns = _TABLES[model]
+        return model(**{
+            name: self._from_column(model, name, value)
+            for name, value in zip(columns, row)
+        })
+
+    def get(self, model: Any, hash_key: Any, cached: bool = False, consistent_read: bool = False) -> Any:
+        items = self.batch_get(model, [hash_key])
+        if not items:
+            raise model.DoesNotExist()
+        return items[0]
+
+    def batch_get(self, model: Any, hash_keys: Iterable[Any]) -> List:
+        keys = list(dict.fromkeys(hash_keys))
+        table, columns = _TABLES[model]
+        found = {}
+        with self._lock:
+            connection = self._get_connection()
+            for chunk in _chunks(keys, _MAX_PARAMS):
+                rows = connection.execute(
+                    f'SELECT {", ".join(columns)} FROM {table} '
+                    f'WHERE {model._hash_key_name} IN ({",".join("?" * len(chunk))})',
+                    chunk,
+                )
+                for row in rows:
+                    found[row[0]] = self._from_row(model, row)
+        return [found[key] for key in keys if key in found]
+
+    def save(self, obj: Any) -> None:
+        obj.touch()
+        model = type(obj)
+        table, columns = _TABLES[model]
+        hash_key_name = model._hash_key_name
+        expected = obj.version
+        obj.version = (expected or 0) + 1
+        if model is Event and obj.attendees is not None:
+            # Replacing the attendees drops the payment summary, until it's
+            # repaired; see PaymentSummaryMap.
+            obj.payment_summary = None
+        values = [self._to_column(model, name, getattr(obj, name)) for name in columns]
+        try:
+            with self._transaction() as connection:
+                stored = connection.execute(
+                    f'SELECT version FROM {table} WHERE {hash_key_name} = ?',
+                    (getattr(obj, hash_key_name),),
+                ).fetchone()
+                if (stored[0] if stored is not None else None) != expected:
+                    raise VersionConflict(f'{model.__name__} was written since it was read')
+                if model is Event:
+                    stored_schedule = connection.execute(
+                        'SELECT start_date, start_date_given FROM events WHERE event_id = ?',
+                        (obj.event_id,),
+                    ).fetchone()
+                connection.execute(
+                    f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) '
+                    f'VALUES ({",".join("?" * len(columns))})',
+                    values,
+                )
+                if model is Event:
+                    if obj.attendees is not None:
+                        # Attendees are kept apart from the event; a list given
+                        # with the event replaces them.
+                        connection.execute('DELETE FROM event_attendees WHERE event_id = ?', (obj.event_id,))
+                        connection.executemany(
+                            'INSERT OR IGNORE INTO event_attendees (event_id, user_id, position) VALUES (?, ?, ?)',
+                            [(obj.event_id, x.attendee, i) for i, x in enumerate(obj.attendees)],
+                        )
+                        obj.attendees = None
+                    schedule = (values[columns.index('start_date')], values[columns.index('start_date_given')])
+                    if stored_schedule is not None and stored_schedule != schedule:
+                        # Reminders are claimed apart from the event too; when
+                        # it's rescheduled they're due again, as when
+                        # reminders_sent is cleared in the other backends.
+                        connection.execute('DELETE FROM event_reminders WHERE event_id = ?', (obj.event_id,))
+                    # The count on the object may be stale; a save mustn't overwrite the maintained one.
+                    obj.attendee_count = connection.execute(
+                        'SELECT COUNT(*) FROM event_attendees WHERE event_id = ?',
+                        (obj.event_id,),
+                    ).fetchone()[0]
+                    connection.execute(
+                        'UPDATE events SET attendee_count = ? WHERE event_id = ?',
+                        (obj.attendee_count, obj.event_id),
+                    )
+        except Exception:
+            obj.version = expected
+            raise
+        self._versions[model] += 1
+
+    def data_version(self, model: Any) -> int:
+        return self._versions[model]
+
+    def list_events(
+            self,
+            status: str,
+            since: Optional[datetime] = None,
+            limit: int = 10,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Event], Optional[str]]:
+        # Dates are stored in a fixed width UTC format, so they sort as text.
+        where = ['status = ?', 'start_date IS NOT NULL']
+        params: List[Any] = [status]
+        if since is not None:
+            where.append('start_date >= ?')
+            params.append(self._to_column(Event, 'start_date', since))
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            try:
+                params.extend([position['start_date'], position['start_date'], position['event_id']])
+            except KeyError:
+                raise ValueError(f'Invalid cursor: {cursor}')
+            where.append('(start_date > ? OR (start_date = ? AND event_id > ?))')
+        columns = ('event_id', 'name', 'creator', 'status', 'start_date', 'start_date_given', 'end_date')
+        with self._lock:
+            rows = self._get_connection().execute(
+                f'SELECT {", ".join(columns)} FROM events WHERE {" AND ".join(where)} '
+                'ORDER BY start_date, event_id LIMIT ?',
+                params + [limit + 1],
+            ).fetchall()
+        events = [
+            Event(**{
+                name: self._from_column(Event, name, value)
+                for name, value in zip(columns, row)
+            })
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor({'start_date': rows[limit - 1][4], 'event_id': rows[limit - 1][0]})
+        return events, next_cursor
+
+    def list_unindexed_events(
+            self,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        where = ['(start_date IS NULL OR status IS NULL)']
+        params: List[Any] = []
+        if cursor is not None:
+            try:
+                params.append(decode_cursor(cursor)['event_id'])
+            except KeyError:
+                raise ValueError(f'Invalid cursor: {cursor}')
+            where.append('event_id > ?')
+        with self._lock:
+            rows = self._get_connection().execute(
+                f'SELECT event_id FROM events WHERE {" AND ".join(where)} ORDER BY event_id LIMIT ?',
+                params + [limit + 1],
+            ).fetchall()
+        event_ids = [x[0] for x in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor({'event_id': event_ids[-1]})
+        return event_ids, next_cursor
+
+    def index_event(self, event_id: Text) -> bool:
+        with self._transaction() as connection:
+            indexed = connection.execute(
+                'UPDATE events SET start_date = COALESCE(start_date, created_date), status = COALESCE(status, ?), '
+                'version = COALESCE(version, 0) + 1 '
+                'WHERE event_id = ? AND created_date IS NOT NULL AND (start_date IS NULL OR status IS NULL)',
+                (Event.STATUS_OPEN, event_id),
+            ).rowcount
+        if indexed:
+            self._versions[Event] += 1
+        return bool(indexed)
+
+    def archive_events(self, event_ids: Iterable[Text], closed_before: datetime) -> List[Text]:
+        _, columns = _TABLES[Event]
+        archived = []
+        with self._transaction() as connection:
+            for event_id in dict.fromkeys(event_ids):
+                cursor = connection.execute(
+                    f'INSERT OR REPLACE INTO archived_events ({", ".join(columns)}, archived_date) '
+                    f'SELECT {", ".join(columns)}, ? FROM events '
+                    'WHERE event_id = ? AND status = ? AND modified_date < ?',
+                    (
+                        self._to_column(Event, 'modified_date', datetime.utcnow()),
+                        event_id,
+                        Event.STATUS_CLOSED,
+                        self._to_column(Event, 'modified_date', closed_before),
+                    ),
+                )
+                if cursor.rowcount > 0:
+                    connection.execute('DELETE FROM events WHERE event_id = ?', (event_id,))
+                    connection.execute('DELETE FROM event_reminders WHERE event_id = ?', (event_id,))
+                    archived.append(event_id)
+        if archived:
+            self._versions[Event] += 1
+        return archived
+
+    def get_archived_events(self, event_ids: Iterable[Text]) -> List[Event]:
+        keys = list(dict.fromkeys(event_ids))
+        _, columns = _TABLES[Event]
+        found = {}
+        with self._lock:
+            connection = self._get_connection()
+            for chunk in _chunks(keys, _MAX_PARAMS):
+                rows = connection.execute(
+                    f'SELECT {", ".join(columns)} FROM archived_events '
+                    f'WHERE event_id IN ({",".join("?" * len(chunk))})',
+                    chunk,
+                )
+                for row in rows:
+                    found[row[0]] = self._from_row(Event, row)
+        return [found[key] for key in keys if key in found]
+
+    def claim_reminder(self, event: Event, offset: int) -> bool:
+        with self._transaction() as connection:
+            claimed = connection.execute(
+                'INSERT OR IGNORE INTO event_reminders (event_id, offset_minutes) '
+                'SELECT event_id, ? FROM events WHERE event_id = ?',
+                (offset, event.event_id),
+            ).rowcount
+            if claimed:
+                # So that an edit that raced with the claim, and may reschedule
+                # the event, is applied again.
+                connection.execute(
+                    'UPDATE events SET version = COALESCE(version, 0) + 1 WHERE event_id = ?',
+                    (event.event_id,),
+                )
+        return claimed > 0
+
+    def is_attendee(self, event: Event, user_id: Text) -> bool:
+        with self._lock:
+            row = self._get_connection().execute(
+                'SELECT 1 FROM event_attendees WHERE event_id = ? AND user_id = ?',
+                (event.event_id, user_id),
+            ).fetchone()
+        return row is not None
+
+    def list_attendee_events(self, user_id: Text) -> List[Text]:
+        with self._lock:
+            rows = self._get_connection().execute(
+                'SELECT event_id FROM event_attendees WHERE user_id = ?',
+                (user_id,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _get_handles(connection: sqlite3.Connection, user_ids: List[Text]) -> Dict[Text, Optional[Text]]:
+        handles = {}
+        for chunk in _chunks(user_ids, _MAX_PARAMS):
+            rows = connection.execute(
+                f'SELECT user_id, venmo_handle FROM users WHERE user_id IN ({",".join("?" * len(chunk))})',
+                chunk,
+            )
+            handles.update(rows)
+        return handles
+
+    def list_attendees(
+            self,
+            event: Event,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> Tuple[List[Text], Optional[str]]:
+        after = -1
+        if cursor is not None:
+            try:
+                after = int(decode_cursor(cursor)['position'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f'Invalid cursor: {cursor}')
+        with self._lock:
+            rows = self._get_connection().execute(
+                'SELECT user_id, position FROM event_attendees WHERE event_id = ? AND position > ? '
+                'ORDER BY position LIMIT ?',
+                (event.event_id, after, limit + 1),
+            ).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor({'position': rows[limit - 1][1]})
+        return [row[0] for row in rows[:limit]], next_cursor
+
+    def apply_attendee_changes(
+            self,
+            event: Event,
+            changes: List[Tuple[Text, bool]],
+    ) -> List[bool]:
+        results = []
+        with self._transaction() as connection:
+            exists = connection.execute(
+                'SELECT 1 FROM events WHERE event_id = ?',
+                (event.event_id,),
+            ).fetchone()
+            if exists is None:
+                raise Event.DoesNotExist()
+            for user_id, register in changes:
+                if register:
+                    cursor = connection.execute(
+                        'INSERT OR IGNORE INTO event_attendees (event_id, user_id, position) '
+                        'SELECT ?, ?, COALESCE(MAX(position), -1) + 1 FROM event_attendees WHERE event_id = ?',
+                        (event.event_id, user_id, event.event_id),
+                    )
+                else:
+                    cursor = connection.execute(
+                        'DELETE FROM event_attendees WHERE event_id = ? AND user_id = ?',
+                        (event.event_id, user_id),
+                    )
+                results.append(cursor.rowcount > 0)
+            delta = sum(1 if register else -1 for (_, register), result in zip(changes, results) if result)
+            if any(results):
+                connection.execute(
+                    'UPDATE events SET attendee_count = attendee_count + ?, modified_date = ?, '
+                    'version = COALESCE(version, 0) + 1 WHERE event_id = ?',
+                    (delta, self._to_column(Event, 'modified_date', datetime.utcnow()), event.event_id),
+                )
+            attendee_count, modified_date, payment_summary, version = connection.execute(
+                'SELECT attendee_count, modified_date, payment_summary, version FROM events WHERE event_id = ?',
+                (event.event_id,),
+            ).fetchone()
+            summary = self._from_column(Event, 'payment_summary', payment_summary)
+            if summary is not None and any(results):
+                def get_handles(user_ids: List[Text]) -> Dict[Text, Optional[Text]]:
+                    return self._get_handles(connection, user_ids)
+
+                summary.apply_attendee_changes(changes, results, get_handles)
+                if summary.needs_refill(attendee_count):
+                    rows = connection.execute(
+                        'SELECT user_id FROM event_attendees WHERE event_id = ? ORDER BY position LIMIT ?',
+                        (event.event_id, settings.RENDER_ATTENDEE_LIMIT),
+                    )
+                    summary.refill([row[0] for row in rows], get_handles)
+                connection.execute(
+                    'UPDATE events SET payment_summary = ? WHERE event_id = ?',
+                    (self._to_column(Event, 'payment_summary', summary), event.event_id),
+                )
+        if any(results):
+            self._versions[Event] += 1
+        event.attendees = None
+        event.attendee_count = attendee_count
+        event.modified_date = self._from_column(Event, 'modified_date', modified_date)
+        event.payment_summary = summary
+        event.version = version
+        return results
@@ -0,0 +1,97 @@
+import logging
+from typing import Any, Callable
+
+import gevent
+import gevent.pool
+
+from eventbot import settings
+from eventbot.models import throttle
+from eventbot.utils import stats
+
+logger = logging.getLogger(__name__)
+
+_POOL = None
+
+
+class BackgroundPool(object):
+    """
+    A bounded pool of greenlets, for work that happens after we've already
+    responded to a request. Work is never queued: if the pool is full, or
+    draining, submit returns False and the caller should do the work inline.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._pool = gevent.pool.Pool(size)
+        self._draining = False
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def submit(self, func: Callable, *args, **kwargs) -> bool:
+        if self._draining or self._pool.full():
+            return False
+        self._pool.spawn(self._run, func, args, kwargs)
+        return True
+
+    @staticmethod
+    @stats.pipelined()
+    def _run(func: Callable, args: tuple, kwargs: dict) -> None:
+        try:
+            with throttle.priority(throttle.BACKGROUND), stats.timer(f'background.{func.__name__}'):
+                func(*args, **kwargs)
+        except Exception:
+            logger.exception(f'Background job {func.__name__} failed')
+            stats.incr(f'background.{func.__name__}.error')
+
+    def drain(self, timeout: float = None) -> bool:
+        """
+        Stop accepting new work and wait up to timeout seconds for running
+        work to finish. Returns False if work was still running.
+        """
+        self._draining = True
+        self._pool.join(timeout=timeout)
+        remaining = len(self._pool)
+        if remaining:
+            logger.warning(f'{remaining} background jobs still running after drain')
+        return not remaining
+
+
+def get_pool() -> BackgroundPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = BackgroundPool(settings.BACKGROUND_POOL_SIZE)
+    return _POOL
+
+
+def drain() -> bool:
+    if _POOL is None:
+        return True
+    return _POOL.drain(timeout=settings.BACKGROUND_DRAIN_TIMEOUT)
+
+
+def with_retries(
+        func: Callable,
+        *args,
+        retries: int = None,
+        backoff: float = None,
+        **kwargs
+) -> Any:
+    """
+    Call func, retrying with exponential backoff if it raises. The exception
+    from the last attempt is re-raised.
+    """
+    if retries is None:
+        retries = settings.BACKGROUND_RETRIES
+    if backoff is None:
+        backoff = settings.BACKGROUND_RETRY_BACKOFF
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            if attempt == retries:
+                raise
+            logger.warning(
+                f'Retrying {func.__name__} after failed attempt {attempt + 1}',
+                exc_info=True,
+            )
+            gevent.sleep(backoff * 2 ** attempt)
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Sentinel returned by TTLCache.get on a miss, since None is a valid cached
+# value (used for negative caching).
+MISSING = object()
+
+
+class TTLCache(object):
+    """
+    A bounded, in-process LRU cache, where every entry also expires after a
+    fixed TTL. This is a per-worker cache; it isn't shared between gunicorn
+    workers, so entries can be stale for up to `ttl` seconds with respect to
+    writes made by other workers.
+
+    Arguments:
+
+        max_size: The maximum number of entries to keep. When full, the least
+            recently used entry is evicted. A max_size of 0 disables the cache.
+        ttl: The number of seconds an entry is valid for.
+        clock: A function returning the current time in seconds.
+    """
+
+    def __init__(
+            self,
+            max_size: int,
+            ttl: float,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Incremented on every explicit invalidation, so that anything derived
+        # from cached values can be keyed on the version it was derived from.
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Get the value for key, or MISSING if it isn't cached or has expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self.version += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.version += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit/miss/eviction counters and the current size of the cache.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+        }
@@ -0,0 +1,80 @@
+from typing import Any, Dict, Optional, Tuple
+
+from gevent.event import AsyncResult
+
+from eventbot.utils import stats
+from eventbot.utils.cache import MISSING, TTLCache
+
+
+def get_idempotency_key(event: Dict) -> Optional[Tuple]:
+    """
+    Return a key identifying a single user interaction, which is the same for
+    every retry of the event omnibot sends us for it, or None if the event
+    can't be identified.
+
+    Interactive components are identified by their trigger_id and action_ts,
+    with the user, callback and actions; messages by their channel and ts.
+    """
+    payload_type = event.get('omnibot_payload_type')
+    user_id = (event.get('parsed_user') or {}).get('id')
+    if payload_type == 'interactive_component':
+        trigger_id = event.get('trigger_id')
+        action_ts = event.get('action_ts')
+        if not trigger_id and not action_ts:
+            return None
+        actions = tuple(
+            (action.get('name'), action.get('value'))
+            for action in event.get('actions') or []
+        )
+        return (
+            payload_type,
+            trigger_id,
+            action_ts,
+            user_id,
+            event.get('callback_id'),
+            event.get('type'),
+            actions,
+        )
+    if payload_type == 'message':
+        ts = event.get('ts')
+        if not ts:
+            return None
+        return (payload_type, (event.get('channel') or {}).get('id'), ts, user_id)
+    return None
+
+
+class IdempotentRouter(object):
+    """
+    Wraps an OmnibotRouter, so that events omnibot retries, because we were
+    slow to respond the first time, aren't handled again. The response to
+    each interaction is kept in a bounded TTL cache, and returned for any
+    retry; a retry that arrives while the first attempt is still being
+    handled waits for its response.
+
+    The cache is per worker, so a retry that reaches another worker is
+    handled again. Events that fail aren't cached, so that they can be
+    retried.
+    """
+
+    def __init__(self, router: Any, cache: TTLCache) -> None:
+        self.router = router
+        self._cache = cache
+
+    def handle_event(self, event: Dict) -> Dict:
+        key = get_idempotency_key(event)
+        if key is None:
+            return self.router.handle_event(event)
+        result = self._cache.get(key)
+        if result is not MISSING:
+            stats.incr('idempotency.duplicate')
+            return result.get()
+        result = AsyncResult()
+        self._cache.set(key, result)
+        try:
+            ret = self.router.handle_event(event)
+        except Exception as e:
+            self._cache.invalidate(key)
+            result.set_exception(e)
+            raise
+        result.set(ret)
+        return ret
@@ -0,0 +1,118 @@
+"""
+JSON encoding and decoding for API payloads, through the fastest available
+library. orjson and ujson are optional; without them, or if JSON_CODEC is set
+to ``json``, the standard library is used.
+
+The fast libraries are limited to the types the standard library encodes, so
+output and errors don't depend on what's installed: anything else, such as a
+datetime, raises TypeError with every codec. The exceptions are types the
+libraries encode natively without a way to turn it off: orjson encodes UUIDs
+and enums, and ujson encodes Decimals.
+"""
+import json
+import logging
+from typing import Any, Callable, NamedTuple, Optional
+
+from eventbot import settings
+
+logger = logging.getLogger(__name__)
+
+Codec = NamedTuple('Codec', [
+    ('name', str),
+    ('loads', Callable[[bytes], Any]),
+    ('dumps', Callable[[Any], bytes]),
+])
+
+# In order of preference, for JSON_CODEC=auto.
+CODEC_NAMES = ('orjson', 'ujson', 'json')
+
+_CODEC: Optional[Codec] = None
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _unsupported(obj: Any) -> Any:
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def load_codec(name: str) -> Codec:
+    """
+    Return the codec for a library, raising ImportError if it isn't
+    installed.
+    """
+    if name == 'orjson':
+        import orjson
+
+        # Hand datetimes, dataclasses and subclasses of str, int, dict and
+        # list to default, rather than encoding them as json wouldn't.
+        orjson_options = (
+            orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+        )
+
+        def orjson_dumps(obj: Any) -> bytes:
+            return orjson.dumps(obj, default=_unsupported, option=orjson_options)
+        return Codec('orjson', orjson.loads, orjson_dumps)
+    if name == 'ujson':
+        import ujson
+
+        def ujson_dumps(obj: Any) -> bytes:
+            return ujson.dumps(
+                obj,
+                ensure_ascii=False,
+                escape_forward_slashes=False,
+                default=_unsupported,
+            ).encode('utf-8')
+        return Codec('ujson', ujson.loads, ujson_dumps)
+    if name == 'json':
+        return Codec('json', json.loads, _json_dumps)
+    raise ValueError(f'Unknown JSON codec: {name}')
+
+
+def get_codec() -> Codec:
+    """
+    Return the codec selected by the JSON_CODEC setting: the name of a
+    library, or ``auto`` for the first installed one of CODEC_NAMES.
+    """
+    global _CODEC
+    if _CODEC is None:
+        if settings.JSON_CODEC != 'auto':
+            _CODEC = load_codec(settings.JSON_CODEC)
+        else:
+            for name in CODEC_NAMES:
+                try:
+                    _CODEC = load_codec(name)
+                    break
+                except ImportError:
+                    continue
+        logger.debug(f'Using the {_CODEC.name} JSON codec')
+    return _CODEC
+
+
+def set_codec(codec: Optional[Codec]) -> None:
+    """
+    Replace the codec; None selects it again from settings. Mostly useful
+    for tests and benchmarks.
+    """
+    global _CODEC
+    _CODEC = codec
+
+
+def loads(data: bytes) -> Any:
+    """
+    Decode JSON, raising ValueError if it's invalid.
+    """
+    return get_codec().loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode obj as compact UTF-8 JSON. Values the fast libraries reject, such
+    as non-string keys or subclasses of builtin types, are left to the
+    standard library, which raises TypeError if it can't encode them either.
+    """
+    try:
+        return get_codec().dumps(obj)
+    except TypeError:
+        return _json_dumps(obj)
@@ -0,0 +1,188 @@
+"""
+On-demand profiling of a live worker. A session profiles either CPU, with
+cProfile, or memory allocations, with tracemalloc, until the worker has
+handled a number of requests, or for a fixed time, then writes its results
+to PROFILE_DIR. Only one session runs at a time, per worker.
+
+When no session is running, the only cost is a check in each request's
+teardown.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import gevent
+
+from eventbot import settings
+
+logger = logging.getLogger(__name__)
+
+CPU = 'cpu'
+MEMORY = 'memory'
+
+# Number of entries written to the text summaries.
+SUMMARY_LIMIT = 50
+
+_session: Optional['ProfileSession'] = None
+# The files written by this worker's sessions, most recent last.
+_results: List[Dict] = []
+
+
+class ProfilingInProgress(Exception):
+    """
+    Raised when starting a session while another one is running.
+    """
+
+
+class ProfileSession(object):
+
+    def __init__(self, kind: str, requests: Optional[int], seconds: float) -> None:
+        self.kind = kind
+        self.requests = requests
+        self.seconds = seconds
+        self.requests_done = 0
+        self.start_time = time.monotonic()
+        self.timestamp = time.time()
+        self._profiler: Optional[cProfile.Profile] = None
+        self._snapshot: Any = None
+        self._timer: Any = None
+
+    def start(self) -> None:
+        if self.kind == CPU:
+            # The profiler follows the thread, so it sees every greenlet that
+            # runs during the session, not just request handlers.
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+            self._snapshot = tracemalloc.take_snapshot()
+        self._timer = gevent.spawn_later(self.seconds, _stop_session, self)
+
+    def stop(self) -> Dict:
+        if self._timer is not None and self._timer is not gevent.getcurrent():
+            self._timer.kill(block=False)
+        elapsed = time.monotonic() - self.start_time
+        # Stop profiling before writing anything, so that it stops even if
+        # the results can't be written.
+        if self.kind == CPU:
+            self._profiler.disable()
+            after = None
+        else:
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(
+            settings.PROFILE_DIR,
+            f'{self.kind}-{os.getpid()}-{time.strftime("%Y%m%dT%H%M%S", time.gmtime(self.timestamp))}',
+        )
+        if self.kind == CPU:
+            files = self._write_cpu(base)
+        else:
+            files = self._write_memory(base, after)
+        return {
+            'kind': self.kind,
+            'pid': os.getpid(),
+            'requests': self.requests_done,
+            'seconds': round(elapsed, 3),
+            'files': files,
+        }
+
+    def _write_cpu(self, base: str) -> List[str]:
+        self._profiler.dump_stats(f'{base}.prof')
+        summary = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LIMIT)
+        with open(f'{base}.txt', 'w') as f:
+            f.write(summary.getvalue())
+        return [f'{base}.prof', f'{base}.txt']
+
+    def _write_memory(self, base: str, snapshot: Any) -> List[str]:
+        self._snapshot.dump(f'{base}.before.snapshot')
+        snapshot.dump(f'{base}.after.snapshot')
+        diff = snapshot.compare_to(self._snapshot, 'lineno')
+        with open(f'{base}.txt', 'w') as f:
+            f.write(f'Top {SUMMARY_LIMIT} allocation differences, by line:\n')
+            for line in diff[:SUMMARY_LIMIT]:
+                f.write(f'{line}\n')
+        return [f'{base}.before.snapshot', f'{base}.after.snapshot', f'{base}.txt']
+
+    def to_dict(self) -> Dict:
+        return {
+            'kind': self.kind,
+            'requests': self.requests,
+            'requests_done': self.requests_done,
+            'seconds': self.seconds,
+            'elapsed': round(time.monotonic() - self.start_time, 3),
+        }
+
+
+def start(kind: str, requests: Optional[int] = None, seconds: Optional[float] = None) -> Dict:
+    """
+    Start profiling until requests more requests have been handled, or for
+    seconds; whichever comes first, and at most PROFILE_MAX_SECONDS.
+    """
+    global _session
+    if kind not in (CPU, MEMORY):
+        raise ValueError(f'Unknown profile kind: {kind}')
+    if requests is not None and requests < 1:
+        raise ValueError('requests must be positive')
+    if seconds is not None and seconds <= 0:
+        raise ValueError('seconds must be positive')
+    if _session is not None:
+        raise ProfilingInProgress()
+    seconds = min(seconds or settings.PROFILE_MAX_SECONDS, settings.PROFILE_MAX_SECONDS)
+    _session = ProfileSession(kind, requests, seconds)
+    _session.start()
+    logger.info(f'Started {kind} profiling', extra={'profile': _session.to_dict()})
+    return _session.to_dict()
+
+
+def request_done(request_start: float) -> None:
+    """
+    Count a finished request, which started at request_start (monotonic), and
+    stop the session once it has seen enough requests. Requests that started
+    before the session, like the one that started it, aren't counted.
+    """
+    session = _session
+    if session is None or request_start < session.start_time:
+        return
+    session.requests_done += 1
+    if session.requests is not None and session.requests_done >= session.requests:
+        _stop_session(session)
+
+
+def stop() -> Optional[Dict]:
+    """
+    Stop the running session, if there is one, and return its results.
+    """
+    if _session is None:
+        return None
+    return _stop_session(_session)
+
+
+def status() -> Dict:
+    return {
+        'session': _session.to_dict() if _session is not None else None,
+        'results': list(_results),
+    }
+
+
+def _stop_session(session: ProfileSession) -> Optional[Dict]:
+    global _session
+    if _session is not session:
+        return None
+    _session = None
+    try:
+        result = session.stop()
+    except Exception:
+        logger.exception(f'Failed to write {session.kind} profile')
+        return None
+    _results.append(result)
+    del _results[:-settings.PROFILE_MAX_RESULTS]
+    logger.info(f'Finished {session.kind} profiling', extra={'profile': result})
+    return result
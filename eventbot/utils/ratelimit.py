@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+import gevent
+
+
+class TokenBucket(object):
+    """
+    Limits the rate of an operation to rate units per second, allowing bursts
+    of up to capacity units. Waiting greenlets sleep, rather than block the
+    worker.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Take amount units, waiting until they're available; return the time
+        waited, in seconds. An amount larger than the capacity is allowed, by
+        waiting until the bucket is full, and going into debt for the rest.
+        """
+        waited = 0.0
+        self._refill()
+        needed = min(amount, self.capacity)
+        while self._tokens < needed:
+            delay = (needed - self._tokens) / self.rate
+            gevent.sleep(delay)
+            waited += delay
+            self._refill()
+        self._tokens -= amount
+        return waited
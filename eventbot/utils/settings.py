@@ -56,3 +56,12 @@ def str_env(var_name, default=''):
     This has the same arguments as bool_env.
     """
     return getenv(var_name, default)
+
+
+def list_env(var_name, default=''):
+    """
+    Get an environment variable as a list of strings, split on commas, with
+    surrounding whitespace and empty items removed.
+    This has the same arguments as bool_env.
+    """
+    return [x.strip() for x in getenv(var_name, default).split(',') if x.strip()]
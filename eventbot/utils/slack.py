@@ -0,0 +1,59 @@
+import json
+from typing import Dict, List, Optional
+
+import gevent.pool
+
+from eventbot import settings
+
+
+def _post_json(url: str, payload: Dict, timeout: float) -> bytes:
+    # Only needed by background jobs, so it's imported on first use rather
+    # than when a worker starts.
+    import urllib.request
+
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def post_to_response_url(response_url: str, payload: Dict) -> None:
+    """
+    Post a message payload to the response_url of a slack interactive
+    component event. This is how we respond to an interaction after the
+    request for it has already been answered; see
+    https://api.slack.com/interactivity/handling#message_responses
+    """
+    _post_json(response_url, payload, settings.RESPONSE_URL_TIMEOUT)
+
+
+def post_action(action: str, kwargs: Dict) -> None:
+    """
+    Call a slack API action, like chat.postMessage, through omnibot, as the
+    configured bot. This is for messages that aren't a response to a request,
+    which are sent by returning actions instead.
+    """
+    url = f'{settings.OMNIBOT_URL}/api/v1/slack/action/{settings.OMNIBOT_TEAM_NAME}/{settings.OMNIBOT_BOT_NAME}'
+    _post_json(url, {'action': action, 'kwargs': kwargs}, settings.OMNIBOT_TIMEOUT)
+
+
+def _try_post_action(action: Dict) -> Optional[Exception]:
+    try:
+        post_action(action['action'], action['kwargs'])
+    except Exception as e:
+        return e
+    return None
+
+
+def post_actions(actions: List[Dict], concurrency: int = 10) -> List[Optional[Exception]]:
+    """
+    Call several slack API actions, given as dicts with action and kwargs
+    keys, like the actions of a response, at most concurrency at a time.
+    Returns the exception each action failed with, or None if it succeeded.
+    """
+    pool = gevent.pool.Pool(concurrency)
+    return list(pool.imap(_try_post_action, actions))
@@ -0,0 +1,76 @@
+"""
+Start-up timing, and the state that has to be reset when gunicorn forks a
+worker from a master that preloaded the app.
+"""
+import logging
+import sys
+import time
+from typing import Optional
+
+from eventbot.utils import stats
+
+logger = logging.getLogger(__name__)
+
+# When the eventbot package started importing; set by eventbot/__init__.py.
+_import_start: Optional[float] = None
+# How long importing the app took, in milliseconds.
+_app_import_ms: Optional[float] = None
+# When this worker started, or the process if it isn't a forked worker.
+_worker_start: Optional[float] = None
+_first_request_seen = False
+
+
+def import_started(start: float) -> None:
+    global _import_start
+    _import_start = start
+
+
+def app_loaded() -> None:
+    """
+    Record how long importing the app took. Called once eventbot.wsgi has
+    been imported, whether by a worker or by a master preloading the app.
+    """
+    global _app_import_ms
+    if _import_start is not None and _app_import_ms is None:
+        _app_import_ms = (time.monotonic() - _import_start) * 1000
+
+
+def after_fork() -> None:
+    """
+    Called in each worker, right after gunicorn forks it. Clients the master
+    created while preloading the app hold sockets that mustn't be shared
+    between workers, so they're dropped, to be recreated on first use.
+    """
+    global _worker_start, _first_request_seen
+    _worker_start = time.monotonic()
+    _first_request_seen = False
+    stats.reset()
+    if 'eventbot.models.connection' in sys.modules:
+        from eventbot.models import connection
+        connection.reset()
+
+
+def first_request_done() -> None:
+    """
+    Record the time from the worker's start to the end of its first request,
+    and how long importing the app took, once per worker.
+    """
+    global _first_request_seen
+    if _first_request_seen:
+        return
+    _first_request_seen = True
+    start = _worker_start if _worker_start is not None else _import_start
+    if start is None:
+        return
+    first_request_ms = (time.monotonic() - start) * 1000
+    stats.timing('startup.first_request', first_request_ms)
+    if _app_import_ms is not None:
+        stats.timing('startup.app_import', _app_import_ms)
+    logger.info(
+        'First request served',
+        extra={'startup': {
+            'app_import_ms': _app_import_ms,
+            'first_request_ms': first_request_ms,
+            'preloaded': _worker_start is not None and _import_start is not None and _import_start < _worker_start,
+        }},
+    )
@@ -0,0 +1,150 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+import statsd
+from greenlet import getcurrent
+from pynamodb.signals import post_dynamodb_send, pre_dynamodb_send
+
+from eventbot import settings
+from eventbot.utils import tracing
+
+_STATS_CLIENT = None
+
+# The current pipeline, per greenlet (threading.local is greenlet-local once
+# gevent has monkey patched).
+_local = threading.local()
+
+# DynamoDB calls in flight, keyed by the request uuid pynamodb generates.
+_dynamodb_in_flight = {}
+
+
+def get_stats() -> statsd.StatsClient:
+    global _STATS_CLIENT
+    if _STATS_CLIENT is None:
+        _STATS_CLIENT = statsd.StatsClient(
+            settings.STATSD_HOST,
+            settings.STATSD_PORT,
+            prefix=settings.STATSD_PREFIX
+        )
+    return _STATS_CLIENT
+
+
+def reset() -> None:
+    """
+    Drop the client, and this greenlet's pipeline, so that they're recreated
+    by this process; used after a fork.
+    """
+    global _STATS_CLIENT
+    _STATS_CLIENT = None
+    _local.pipeline = None
+    _dynamodb_in_flight.clear()
+
+
+def current() -> Union[statsd.StatsClient, statsd.client.Pipeline]:
+    """
+    Return the pipeline for the current request, if one was started, so that
+    its metrics are sent in as few packets as possible when it's flushed;
+    otherwise return the client, which sends every metric immediately.
+    """
+    pipeline = getattr(_local, 'pipeline', None)
+    if pipeline is not None:
+        return pipeline
+    return get_stats()
+
+
+def start_pipeline() -> None:
+    _local.pipeline = get_stats().pipeline()
+
+
+def flush_pipeline() -> None:
+    _flush_failed_dynamodb_calls()
+    pipeline = getattr(_local, 'pipeline', None)
+    _local.pipeline = None
+    if pipeline is not None:
+        pipeline.send()
+
+
+@contextmanager
+def pipelined() -> Iterator[None]:
+    """
+    Batch all metrics sent by this greenlet within the block into a single
+    pipeline. Nested blocks share the outermost pipeline.
+    """
+    if getattr(_local, 'pipeline', None) is not None:
+        yield
+        return
+    start_pipeline()
+    try:
+        yield
+    finally:
+        flush_pipeline()
+
+
+def incr(stat: str, count: int = 1) -> None:
+    current().incr(stat, count)
+
+
+def timing(stat: str, delta: float) -> None:
+    current().timing(stat, delta)
+
+
+@contextmanager
+def timer(stat: str) -> Iterator[None]:
+    """
+    Time the block, in milliseconds. Can also be used as a decorator. The
+    block is also recorded as a span of the current request's trace.
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        end = time.monotonic()
+        timing(stat, (end - start) * 1000)
+        tracing.record(stat, start, end)
+
+
+def _dynamodb_stat(operation_name: str, table_name: str) -> str:
+    if table_name:
+        return f'dynamodb.{table_name}.{operation_name}'
+    return f'dynamodb.{operation_name}'
+
+
+def _on_pre_dynamodb_send(sender, operation_name, table_name, req_uuid) -> None:
+    _dynamodb_in_flight[req_uuid] = (
+        operation_name,
+        table_name,
+        time.monotonic(),
+        getcurrent(),
+    )
+
+
+def _on_post_dynamodb_send(sender, operation_name, table_name, req_uuid) -> None:
+    call = _dynamodb_in_flight.pop(req_uuid, None)
+    if call is None:
+        return
+    timing(
+        _dynamodb_stat(operation_name, table_name),
+        (time.monotonic() - call[2]) * 1000,
+    )
+
+
+def _flush_failed_dynamodb_calls() -> None:
+    """
+    pynamodb only signals after successful calls, so a call that is still in
+    flight when the greenlet that made it finishes its request, or has died,
+    raised an exception; count it as an error.
+    """
+    if not _dynamodb_in_flight:
+        return
+    this_greenlet = getcurrent()
+    for req_uuid, call in list(_dynamodb_in_flight.items()):
+        operation_name, table_name, _, greenlet = call
+        if greenlet is this_greenlet or greenlet.dead:
+            del _dynamodb_in_flight[req_uuid]
+            incr(f'{_dynamodb_stat(operation_name, table_name)}.error')
+
+
+pre_dynamodb_send.connect(_on_pre_dynamodb_send)
+post_dynamodb_send.connect(_on_post_dynamodb_send)
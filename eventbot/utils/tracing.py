@@ -0,0 +1,209 @@
+"""
+Per-request traces: how long each phase of a sampled request took. A trace
+is started for a sampled share of requests, and collects a span for every
+stats.timer block and every DynamoDB call made by the request's greenlet.
+Finished traces are logged, and the slowest are kept in memory for the
+debug endpoint.
+"""
+import functools
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from pynamodb.signals import post_dynamodb_send, pre_dynamodb_send
+
+from eventbot import settings
+
+logger = logging.getLogger(__name__)
+
+# The current trace, per greenlet (threading.local is greenlet-local once
+# gevent has monkey patched).
+_local = threading.local()
+
+# The slowest finished traces, as a min-heap of (duration, sequence, trace),
+# bounded to TRACE_SLOWEST_COUNT.
+_slowest: List = []
+_sequence = itertools.count()
+
+
+class Trace(object):
+    """
+    The spans recorded for a single request. Span times are in milliseconds,
+    relative to the start of the request.
+    """
+
+    def __init__(self, request_id: Optional[str], name: str) -> None:
+        self.request_id = request_id
+        self.name = name
+        self.timestamp = time.time()
+        self.start = time.monotonic()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[Dict] = []
+        self.dropped_spans = 0
+        self._dynamodb_in_flight: Dict = {}
+
+    def add_span(self, name: str, start: float, end: float) -> None:
+        if len(self.spans) >= settings.TRACE_MAX_SPANS:
+            self.dropped_spans += 1
+            return
+        self.spans.append({
+            'name': name,
+            'start_ms': round((start - self.start) * 1000, 3),
+            'duration_ms': round((end - start) * 1000, 3),
+        })
+
+    def finish(self, status: Optional[int]) -> None:
+        end = time.monotonic()
+        # pynamodb only signals after successful calls, so calls still in
+        # flight failed.
+        for name, start in self._dynamodb_in_flight.values():
+            self.add_span(f'{name}.error', start, end)
+        self._dynamodb_in_flight.clear()
+        self.status = status
+        self.duration_ms = round((end - self.start) * 1000, 3)
+
+    def to_dict(self) -> Dict:
+        return {
+            'request_id': self.request_id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'spans': self.spans,
+            'dropped_spans': self.dropped_spans,
+        }
+
+
+def current() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+
+def start(request_id: Optional[str], name: str) -> Optional[Trace]:
+    """
+    Start a trace for the current request, if it's sampled, and return it.
+    """
+    trace = None
+    if settings.TRACE_SAMPLE_RATE > 0 and random.random() < settings.TRACE_SAMPLE_RATE:
+        trace = Trace(request_id, name)
+    _local.trace = trace
+    return trace
+
+
+def record(name: str, start: float, end: float) -> None:
+    """
+    Record a span, with monotonic start and end times, in the current trace,
+    if there is one.
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.add_span(name, start, end)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Record the block as a span of the current trace, if there is one. Use
+    stats.timer instead for phases that should also be sent as metrics; its
+    blocks are recorded as spans too.
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record(name, start, time.monotonic())
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorate a function to record each call as a span. Cheaper than using
+    span as a decorator when there's no trace, for functions on hot paths.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            trace = getattr(_local, 'trace', None)
+            if trace is None:
+                return func(*args, **kwargs)
+            start = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                trace.add_span(name, start, time.monotonic())
+        return wrapper
+    return decorator
+
+
+def bind(func: Callable) -> Callable:
+    """
+    Return func wrapped to run with the current trace, if there is one. Traces
+    are per greenlet, so work a request spawns into other greenlets needs its
+    function bound to be traced.
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> Any:
+        previous = getattr(_local, 'trace', None)
+        _local.trace = trace
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.trace = previous
+    return wrapper
+
+
+def finish(status: Optional[int] = None) -> Optional[Trace]:
+    """
+    Finish the current trace, if there is one, log it, and keep it if it's
+    one of the slowest.
+    """
+    trace = getattr(_local, 'trace', None)
+    _local.trace = None
+    if trace is None:
+        return None
+    trace.finish(status)
+    entry = (trace.duration_ms, next(_sequence), trace)
+    if len(_slowest) < settings.TRACE_SLOWEST_COUNT:
+        heapq.heappush(_slowest, entry)
+    elif _slowest and entry > _slowest[0]:
+        heapq.heapreplace(_slowest, entry)
+    logger.info('Request trace', extra={'trace': trace.to_dict()})
+    return trace
+
+
+def slowest() -> List[Dict]:
+    """
+    Return the slowest traces kept by this worker, slowest first.
+    """
+    return [trace.to_dict() for _, _, trace in sorted(_slowest, reverse=True)]
+
+
+def clear() -> None:
+    del _slowest[:]
+
+
+def _on_pre_dynamodb_send(sender, operation_name, table_name, req_uuid) -> None:
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        name = f'dynamodb.{table_name}.{operation_name}' if table_name else f'dynamodb.{operation_name}'
+        trace._dynamodb_in_flight[req_uuid] = (name, time.monotonic())
+
+
+def _on_post_dynamodb_send(sender, operation_name, table_name, req_uuid) -> None:
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        call = trace._dynamodb_in_flight.pop(req_uuid, None)
+        if call is not None:
+            trace.add_span(call[0], call[1], time.monotonic())
+
+
+pre_dynamodb_send.connect(_on_pre_dynamodb_send)
+post_dynamodb_send.connect(_on_post_dynamodb_send)
@@ -1,31 +1,59 @@
 import logging
+import time
 from typing import Text, Tuple
 
-import statsd
-from flask import jsonify
+from flask import g, jsonify, request, Response
 from werkzeug.exceptions import HTTPException
 
 from eventbot import settings
 from eventbot.app import app
 from eventbot.routes import api # noqa:E402
+from eventbot.routes import debug
+from eventbot.utils import profiling, startup, stats, tracing
 
 logger = logging.getLogger(__name__)
 
 # register your blueprint here
 app.register_blueprint(api.blueprint)
-
-_STATS_CLIENT = None
+app.register_blueprint(debug.blueprint)
 
 
 def _get_stats():
-    global _STATS_CLIENT
-    if _STATS_CLIENT is None:
-        _STATS_CLIENT = statsd.StatsClient(
-            settings.STATSD_HOST,
-            settings.STATSD_PORT,
-            prefix=settings.STATSD_PREFIX
-        )
-    return _STATS_CLIENT
+    return stats.get_stats()
+
+
+# Metrics sent while handling a request are batched into a pipeline, which is
+# sent when the request is torn down.
+@app.before_request
+def start_request_stats() -> None:
+    g.request_start = time.monotonic()
+    stats.start_pipeline()
+    tracing.start(request.headers.get('X-Request-ID'), request.endpoint or 'unknown')
+
+
+@app.after_request
+def record_request_stats(response: Response) -> Response:
+    endpoint = request.endpoint or 'unknown'
+    stats.timing(
+        f'route.{endpoint}',
+        (time.monotonic() - g.request_start) * 1000,
+    )
+    stats.timing(f'route.{endpoint}.request_size', request.content_length or 0)
+    stats.timing(f'route.{endpoint}.response_size', response.calculate_content_length() or 0)
+    stats.incr(f'route.{endpoint}.status.{response.status_code}')
+    tracing.finish(response.status_code)
+    return response
+
+
+@app.teardown_request
+def flush_request_stats(exc: Exception) -> None:
+    # Requests that failed before a response was made
+    tracing.finish()
+    # Requests to the debug endpoints aren't counted towards profiling sessions
+    if request.blueprint != debug.blueprint.name:
+        profiling.request_done(g.get('request_start', 0))
+    startup.first_request_done()
+    stats.flush_pipeline()
 
 
 # handle abort()
@@ -50,6 +78,9 @@ def handle_error(e: Exception) -> Tuple[Text, int]:
     ), 500
 
 
+startup.app_loaded()
+
+
 if __name__ == '__main__':
     app.run(
         host=settings.get('HOST', '0.0.0.0'),
@@ -5,9 +5,18 @@ from eventbot.app import app
 
 from flask_script import Manager
 from eventbot.scripts.create_tables import CreateTables
+from eventbot.scripts.lifecycle import Lifecycle
+from eventbot.scripts.startup_report import StartupReport
+from eventbot.scripts.summaries import RepairSummaries
+from eventbot.scripts.transfer import Export, Import
 
 manager = Manager(app)
 manager.add_command('create-tables', CreateTables())
+manager.add_command('startup-report', StartupReport())
+manager.add_command('export', Export())
+manager.add_command('import', Import())
+manager.add_command('lifecycle', Lifecycle())
+manager.add_command('repair-summaries', RepairSummaries())
 
 if __name__ == "__main__":
     manager.run()
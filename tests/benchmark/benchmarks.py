@@ -0,0 +1,221 @@
+'''
+Microbenchmarks for the model and receiver hot paths, using synthetic data. DynamoDB is replaced with the in-memory
+storage backend, so these measure our own CPU cost, not network latency.
+
+Every benchmark is a generator function that takes no arguments, does any setup, and yields the callable to time;
+anything after the yield is teardown. The in-memory backend copies items on every read, much like deserializing a
+real response would, so that cost is included in the handler benchmarks.
+'''
+import itertools
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List
+
+import flask
+
+from eventbot import storage
+from eventbot.models.event import AttendeeMap, Event
+from eventbot.models.user import User
+from eventbot.receiver import eventbot
+from eventbot.storage.memory import MemoryBackend
+from eventbot.utils import jsoncodec, stats
+from eventbot.wsgi import app
+
+ATTENDEE_COUNTS = (10, 100, 1000, 5000)
+
+EVENT_ID = '1234.5678'
+
+BENCHMARKS: Dict[str, Callable[[], Iterator[Callable[[], None]]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    def register(func: Callable) -> Callable:
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def _user_id(i: int) -> str:
+    return f'U{i:08d}'
+
+
+def _event(attendee_count: int) -> Event:
+    return Event(
+        event_id=EVENT_ID,
+        name='Team lunch',
+        description='Tacos',
+        creator=_user_id(0),
+        created_date=datetime(2019, 1, 1),
+        modified_date=datetime(2019, 1, 1),
+        cost=123456,
+        extra_attendees=2,
+        attendees=[AttendeeMap(attendee=_user_id(i)) for i in range(attendee_count)],
+    )
+
+
+def _users(attendee_count: int) -> List[User]:
+    # Half of the attendees have a venmo handle
+    return [
+        User(user_id=_user_id(i), venmo_handle=f'@user-{i}' if i % 2 else None)
+        for i in range(attendee_count)
+    ]
+
+
+@contextmanager
+def fake_storage(events: List[Event], users: List[User]) -> Iterator[MemoryBackend]:
+    '''
+    Store the given items in an in-memory storage backend, use it for the duration of the block, and clear all caches.
+    '''
+    backend = MemoryBackend()
+    for item in events + users:
+        backend.save(item)
+    eventbot._render_cache.clear()
+    eventbot._last_rendered.clear()
+    storage.set_backend(backend)
+    try:
+        yield backend
+    finally:
+        storage.set_backend(None)
+
+
+def _make_model_benchmarks(attendee_count: int) -> None:
+    last_user = _user_id(attendee_count - 1)
+    missing_user = 'U-missing'
+
+    @benchmark(f'storage.is_attendee[{attendee_count}]')
+    def is_attendee():
+        with fake_storage([_event(attendee_count)], []) as backend:
+            event_obj = backend.get(Event, EVENT_ID)
+            yield lambda: backend.is_attendee(event_obj, last_user)
+
+    @benchmark(f'storage.register_unregister_attendee[{attendee_count}]')
+    def register_unregister_attendee():
+        with fake_storage([_event(attendee_count)], []) as backend:
+            event_obj = backend.get(Event, EVENT_ID)
+
+            def run():
+                backend.register_attendee(event_obj, missing_user)
+                backend.unregister_attendee(event_obj, missing_user)
+            yield run
+
+    @benchmark(f'event.total_attendees[{attendee_count}]')
+    def total_attendees():
+        event_obj = _event(attendee_count)
+        yield lambda: event_obj.total_attendees
+
+    @benchmark(f'event.cost_per_attendee[{attendee_count}]')
+    def cost_per_attendee():
+        event_obj = _event(attendee_count)
+        yield lambda: event_obj.cost_per_attendee
+
+    @benchmark(f'receiver.render_event_kwargs[{attendee_count}]')
+    def render_event_kwargs():
+        event_obj = _event(attendee_count)
+        with fake_storage([event_obj], _users(attendee_count)):
+            yield lambda: eventbot._render_event_kwargs(EVENT_ID, 'C1', event_obj, eventbot.Loaders())
+
+    @benchmark(f'receiver.get_event_kwargs_cached[{attendee_count}]')
+    def get_event_kwargs_cached():
+        event_obj = _event(attendee_count)
+        with fake_storage([event_obj], _users(attendee_count)):
+            eventbot._get_event_kwargs(EVENT_ID, 'C1', event_obj)
+            yield lambda: eventbot._get_event_kwargs(EVENT_ID, 'C1', event_obj)
+
+    @benchmark(f'receiver.interactive_event_handler.register[{attendee_count}]')
+    def interactive_register():
+        click = {
+            'parsed_user': {'id': 'U-clicker'},
+            'channel': {'id': 'C1'},
+            'trigger_id': 'T1',
+            'message_ts': EVENT_ID,
+            'actions': [{'name': 'register', 'value': EVENT_ID}],
+        }
+
+        def run():
+            with stats.pipelined():
+                eventbot.interactive_event_handler(click)
+
+        with fake_storage([_event(attendee_count)], _users(attendee_count)):
+            yield run
+
+    @benchmark(f'receiver.handle_interactive_event_for_events.update_event[{attendee_count}]')
+    def dialog_update_event():
+        submission = {
+            'parsed_user': {'id': 'U-clicker'},
+            'channel': {'id': 'C1'},
+            'state': f'update_event:{EVENT_ID}',
+            'submission': {
+                'name': 'Team dinner',
+                'description': 'Pizza',
+                'cost': '250.00',
+                'extra_attendees': '3',
+            },
+        }
+
+        def run():
+            with stats.pipelined():
+                eventbot.handle_interactive_event_for_events(submission)
+
+        with fake_storage([_event(attendee_count)], _users(attendee_count)):
+            yield run
+
+
+def _make_api_benchmarks(attendee_count: int) -> None:
+    def response_payload() -> Dict:
+        event_obj = _event(attendee_count)
+        with fake_storage([event_obj], _users(attendee_count)):
+            kwargs = eventbot._render_event_kwargs(EVENT_ID, 'C1', event_obj, eventbot.Loaders())
+        return {'responses': [{'response_type': 'in_channel', 'text': '', 'replace_original': True, **kwargs}]}
+
+    # How the route used to encode responses, for comparison
+    @benchmark(f'api.encode_response.jsonify[{attendee_count}]')
+    def encode_jsonify():
+        payload = response_payload()
+        with app.app_context():
+            yield lambda: flask.jsonify(payload)
+
+    for codec_name in jsoncodec.CODEC_NAMES:
+        try:
+            codec = jsoncodec.load_codec(codec_name)
+        except ImportError:
+            continue
+
+        @benchmark(f'api.encode_response.{codec_name}[{attendee_count}]')
+        def encode_codec(codec=codec):
+            payload = response_payload()
+            yield lambda: codec.dumps(payload)
+
+    # What formatting payloads for debug logging costs, whether or not debug
+    # logging is enabled, when formatted eagerly
+    @benchmark(f'api.format_debug_payload[{attendee_count}]')
+    def format_debug_payload():
+        payload = response_payload()
+        yield lambda: f'eventbot_route response: {payload}'
+
+    @benchmark(f'api.eventbot_route.register[{attendee_count}]')
+    def eventbot_route_register():
+        client = app.test_client()
+        # A new trigger for every click, so that none is answered from the idempotency cache
+        triggers = itertools.count()
+
+        def run():
+            body = json.dumps({
+                'omnibot_payload_type': 'interactive_component',
+                'type': 'interactive_message',
+                'callback_id': 'eventbot_events',
+                'parsed_user': {'id': 'U-clicker'},
+                'channel': {'id': 'C1'},
+                'trigger_id': f'T{next(triggers)}',
+                'message_ts': EVENT_ID,
+                'actions': [{'name': 'register', 'value': EVENT_ID}],
+            })
+            client.post('/api/v1/eventbot', data=body, content_type='application/json')
+
+        with fake_storage([_event(attendee_count)], _users(attendee_count)):
+            yield run
+
+
+for _attendee_count in ATTENDEE_COUNTS:
+    _make_model_benchmarks(_attendee_count)
+    _make_api_benchmarks(_attendee_count)
@@ -0,0 +1,109 @@
+'''
+Run the microbenchmarks in tests.benchmark.benchmarks, write the results as JSON, and optionally compare them against
+a saved baseline, exiting non-zero if any benchmark regressed.
+
+Usage:
+
+    python -m tests.benchmark.run --output build/benchmark.json --baseline tests/benchmark/baseline.json
+'''
+import argparse
+import json
+import logging
+import platform
+import sys
+import timeit
+from typing import Callable, Dict, Iterator, List
+
+# Import the benchmark definitions through the tests package, so that gevent
+# is monkey patched before anything else is imported.
+from tests.benchmark.benchmarks import BENCHMARKS
+
+# Minimum time, in seconds, that a single timing run should take
+MIN_RUN_TIME = 0.2
+REPEAT = 5
+
+
+def run_benchmark(func: Callable[[], Iterator[Callable[[], None]]]) -> Dict:
+    '''
+    Time a benchmark, returning the best time per call, in microseconds, across REPEAT runs.
+    '''
+    setup = func()
+    try:
+        timer = timeit.Timer(next(setup))
+        number = 1
+        while timer.timeit(number) < MIN_RUN_TIME:
+            number *= 2
+        timings = timer.repeat(repeat=REPEAT, number=number)
+    finally:
+        setup.close()
+    return {
+        'per_call_us': min(timings) / number * 1e6,
+        'number': number,
+        'repeat': REPEAT,
+    }
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    '''
+    Print a comparison of results against baseline, and return the names of the benchmarks that are slower than
+    the baseline by more than max_regression (a fraction).
+    '''
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            print(f'{name:<70} {result["per_call_us"]:>12.2f}us (new)')
+            continue
+        ratio = result['per_call_us'] / baseline[name]['per_call_us']
+        flag = ''
+        if ratio > 1 + max_regression:
+            flag = ' REGRESSION'
+            regressions.append(name)
+        print(f'{name:<70} {result["per_call_us"]:>12.2f}us {ratio:>6.2f}x{flag}')
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', required=True, help='File to write the JSON results to.')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against.')
+    parser.add_argument(
+        '--max-regression',
+        type=float,
+        default=0.3,
+        help='Fraction a benchmark may be slower than the baseline before it is a regression. Default: 0.3',
+    )
+    parser.add_argument('--filter', default='', help='Only run benchmarks whose name contains this string.')
+    args = parser.parse_args(argv)
+
+    # The handler benchmarks log expected failures; keep the output readable.
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for name, func in sorted(BENCHMARKS.items()):
+        if args.filter in name:
+            results[name] = run_benchmark(func)
+            print(f'{name:<70} {results[name]["per_call_us"]:>12.2f}us', file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(
+            {
+                'python': platform.python_version(),
+                'results': results,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f'{len(regressions)} benchmarks regressed by more than {args.max_regression:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import pytest
+
+from eventbot import storage
+from eventbot.storage.memory import MemoryBackend
+from eventbot.storage.sqlite import SQLiteBackend
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    """
+    Each local storage backend in turn, set as the storage backend.
+    """
+    if request.param == 'memory':
+        backend = MemoryBackend()
+    else:
+        backend = SQLiteBackend(str(tmp_path / 'eventbot.db'))
+    storage.set_backend(backend)
+    yield backend
+    storage.set_backend(None)
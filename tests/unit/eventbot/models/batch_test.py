@@ -0,0 +1,38 @@
+import pytest
+
+from eventbot.models import batch
+from eventbot.models.user import User
+
+
+@pytest.fixture
+def pages(mocker):
+    mocker.patch('eventbot.settings.BATCH_GET_RETRY_BACKOFF', 0)
+    mocker.patch.object(User, '_serialize_keys', side_effect=lambda key: (key, None))
+    mocker.patch.object(User, 'from_raw_data', side_effect=lambda data: User(user_id=data['user_id']))
+
+    def _page(keys, **kwargs):
+        # Return every other key, and leave the last key unprocessed on the first try
+        user_ids = [key['user_id'] for key in keys]
+        items = [{'user_id': x} for x in user_ids[:-1] if not x.endswith('7')]
+        if len(keys) > 1:
+            return items, keys[-1:]
+        return [{'user_id': user_ids[0]}], None
+
+    return mocker.patch.object(User, '_batch_get_page', side_effect=_page)
+
+
+def test_batch_get_chunks_and_keeps_order(pages):
+    keys = [f'U{i:03d}' for i in range(250, 0, -1)]
+    users = batch.batch_get(User, keys + keys[:10])
+    assert [x.user_id for x in users] == [x for x in keys if not x.endswith('7')]
+    # three chunks, each retried once for its unprocessed key
+    assert pages.call_count == 6
+
+
+def test_batch_get_gives_up_on_unprocessed_keys(pages, mocker):
+    mocker.patch('eventbot.settings.BATCH_GET_RETRIES', 1)
+    pages.side_effect = lambda keys, **kwargs: ([], keys)
+    with pytest.raises(batch.UnprocessedKeysError) as e:
+        batch.batch_get(User, ['U1', 'U2'])
+    assert len(e.value.keys) == 2
+    assert pages.call_count == 2
@@ -0,0 +1,48 @@
+import gevent
+import pytest
+
+from eventbot import storage
+from eventbot.models.coalescer import AttendeeWriteCoalescer
+from eventbot.models.event import AttendeeMap, Event
+from eventbot.storage.memory import MemoryBackend
+
+
+@pytest.fixture
+def backend():
+    backend = MemoryBackend()
+    backend.save(Event(
+        event_id='1234.5678',
+        name='Lunch',
+        attendees=[AttendeeMap(attendee='U9')],
+    ))
+    storage.set_backend(backend)
+    yield backend
+    storage.set_backend(None)
+
+
+def test_single_change_uses_atomic_update(backend, mocker):
+    register = mocker.spy(backend, 'register_attendee')
+    apply_changes = mocker.spy(backend, 'apply_attendee_changes')
+    coalescer = AttendeeWriteCoalescer(0)
+    assert coalescer.register(backend.get(Event, '1234.5678'), 'U1')
+    assert register.call_count == 1
+    assert apply_changes.call_count == 1
+
+
+def test_burst_is_coalesced(backend, mocker):
+    apply_changes = mocker.spy(backend, 'apply_attendee_changes')
+    coalescer = AttendeeWriteCoalescer(0.01)
+    events = [backend.get(Event, '1234.5678') for _ in range(4)]
+    greenlets = [
+        gevent.spawn(coalescer.register, events[0], 'U1'),
+        gevent.spawn(coalescer.register, events[1], 'U2'),
+        gevent.spawn(coalescer.register, events[2], 'U1'),
+        gevent.spawn(coalescer.unregister, events[3], 'U9'),
+    ]
+    gevent.joinall(greenlets)
+    assert [g.value for g in greenlets] == [True, True, False, True]
+    assert apply_changes.call_count == 1
+    assert backend.get_attendees(backend.get(Event, '1234.5678')) == ['U1', 'U2']
+    # Every caller's event reflects the state after the write
+    for event in events:
+        assert event.attendee_count == 2
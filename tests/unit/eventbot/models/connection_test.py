@@ -0,0 +1,44 @@
+import pytest
+
+from eventbot.models import connection
+from eventbot.models.attendee import Attendee
+from eventbot.models.event import Event
+from eventbot.models.user import User
+
+
+@pytest.fixture
+def get_meta_table(mocker):
+    mocker.patch('eventbot.settings.STORAGE_BACKEND', 'dynamodb')
+    mocker.patch('eventbot.settings.DYNAMODB_WARM_UP', True)
+    yield mocker.patch('pynamodb.connection.base.Connection.get_meta_table')
+    connection.reset()
+
+
+def test_models_share_a_pooled_session(mocker):
+    mocker.patch('eventbot.settings.DYNAMODB_POOL_SIZE', 7)
+    connection.reset()
+    session = connection.shared_session()
+    assert connection.shared_session() is session
+    assert session.get_adapter('https://dynamodb.us-east-1.amazonaws.com')._pool_maxsize == 7
+    for model in (Event, User, Attendee):
+        assert model._get_connection().connection.requests_session is session
+    connection.reset()
+
+
+def test_warm_up_fetches_each_table(get_meta_table):
+    connection.warm_up()
+    assert sorted(x[0][0] for x in get_meta_table.call_args_list) == sorted(
+        model.Meta.table_name for model in (Event, User, Attendee)
+    )
+
+
+def test_warm_up_failure_is_not_raised(get_meta_table):
+    get_meta_table.side_effect = Exception('unreachable')
+    connection.warm_up()
+    assert get_meta_table.call_count == 3
+
+
+def test_warm_up_is_skipped_for_other_backends(get_meta_table, mocker):
+    mocker.patch('eventbot.settings.STORAGE_BACKEND', 'memory')
+    connection.warm_up()
+    assert not get_meta_table.called
@@ -0,0 +1,195 @@
+import botocore.exceptions
+import pytest
+from pynamodb.exceptions import DeleteError, PutError, UpdateError
+
+from eventbot.models.attendee import Attendee
+from eventbot.models.event import AttendeeMap, AttendeeMigrationInProgress, Event, PaymentSummaryMap
+from eventbot.models.versioned import VersionConflict
+
+
+def _conditional_check_failure(error_class=UpdateError):
+    cause = botocore.exceptions.ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}},
+        'UpdateItem',
+    )
+    return error_class('Conditional check failed', cause)
+
+
+def _event(*attendees):
+    return Event(
+        event_id='1234.5678',
+        attendees=[AttendeeMap(attendee=a) for a in attendees],
+    )
+
+
+def _migrated_event(attendee_count=0):
+    return Event(event_id='1234.5678', attendee_count=attendee_count)
+
+
+def test_register_attendee(mocker):
+    event = _migrated_event()
+    save = mocker.patch.object(Attendee, 'save')
+    update = mocker.patch.object(Event, 'update')
+    assert event.register_attendee('U1')
+    assert save.call_count == 1
+    assert update.call_count == 1
+
+
+def test_register_attendee_already_registered(mocker):
+    event = _migrated_event(1)
+    mocker.patch.object(Attendee, 'save', side_effect=_conditional_check_failure(PutError))
+    update = mocker.patch.object(Event, 'update')
+    assert not event.register_attendee('U1')
+    assert update.call_count == 0
+
+
+def test_register_attendee_other_failure(mocker):
+    event = _migrated_event()
+    mocker.patch.object(Attendee, 'save', side_effect=PutError('boom'))
+    with pytest.raises(PutError):
+        event.register_attendee('U1')
+
+
+def test_unregister_attendee_not_registered(mocker):
+    event = _migrated_event(1)
+    mocker.patch.object(Attendee, 'delete', side_effect=_conditional_check_failure(DeleteError))
+    update = mocker.patch.object(Event, 'update')
+    assert not event.unregister_attendee('U1')
+    assert update.call_count == 0
+
+
+def test_apply_attendee_changes(mocker):
+    event = _migrated_event(1)
+    mocker.patch.object(Attendee, 'save')
+    mocker.patch.object(
+        Attendee,
+        'delete',
+        side_effect=[None, _conditional_check_failure(DeleteError)],
+    )
+    update = mocker.patch.object(Event, 'update')
+    results = event.apply_attendee_changes([('U2', True), ('U1', False), ('U3', False)])
+    assert results == [True, True, False]
+    assert update.call_count == 1
+
+
+def test_attendee_changes_update_the_payment_summary(mocker):
+    mocker.patch('eventbot.settings.RENDER_ATTENDEE_LIMIT', 2)
+    event = _migrated_event(2)
+    event.payment_summary = PaymentSummaryMap()
+    event.payment_summary.add_attendee('U1', '@u1')
+    event.payment_summary.add_attendee('U2', None)
+    mocker.patch.object(Attendee, 'save')
+    mocker.patch.object(Attendee, 'delete')
+    mocker.patch.object(Event, 'list_attendees', return_value=(['U2', 'U3'], None))
+    # The event was stale; the summary is changed again from the fresh one.
+    update = mocker.patch.object(Event, 'update', side_effect=[_conditional_check_failure(), None])
+    refresh = mocker.patch.object(Event, 'refresh')
+    results = event.apply_attendee_changes(
+        [('U3', True), ('U1', False)],
+        get_handles=lambda user_ids: {'U1': '@u1', 'U3': '@u3'},
+    )
+    assert results == [True, True]
+    assert update.call_count == 2
+    assert refresh.call_count == 1
+    summary = update.call_args[1]['actions'][2].values[1].value
+    assert summary['M']['with_handle'] == {'N': '1'}
+    assert summary['M']['without_handle'] == {'N': '1'}
+    assert [x['M']['user_id']['S'] for x in summary['M']['attendees']['L']] == ['U2', 'U3']
+
+
+def test_payment_summary_handles():
+    summary = PaymentSummaryMap()
+    summary.add_attendee('U1', None)
+    summary.set_attendee_handle('U1', None, '@u1')
+    assert (summary.with_handle, summary.without_handle) == (1, 0)
+    assert summary.attendees[0].venmo_handle == '@u1'
+    # Unlisted attendees are only counted
+    summary.set_attendee_handle('U2', '@u2', '')
+    assert (summary.with_handle, summary.without_handle) == (0, 1)
+
+
+def test_register_migrates_legacy_attendees(mocker):
+    event = _event('U1', 'U2', 'U1')
+    batch = mocker.patch.object(Attendee, 'batch_write').return_value.__enter__.return_value
+    mocker.patch.object(Attendee, 'save')
+    update = mocker.patch.object(Event, 'update')
+    assert event.register_attendee('U3')
+    assert [x[0][0].user_id for x in batch.save.call_args_list] == ['U1', 'U2']
+    # claim, finish, and the registration itself
+    assert update.call_count == 3
+    assert event.attendees_migrated
+
+
+def test_migration_waits_for_other_worker(mocker):
+    event = _event('U1')
+    mocker.patch.object(Event, 'update', side_effect=_conditional_check_failure())
+
+    def _refresh(*args, **kwargs):
+        event.attendees = None
+        event.attendee_count = 1
+
+    mocker.patch.object(Event, 'refresh', side_effect=_refresh)
+    event.migrate_attendees()
+    assert event.total_attendees == 1
+
+
+def test_migration_in_progress(mocker):
+    event = _event('U1')
+    mocker.patch.object(Event, 'ATTENDEE_MIGRATION_WAIT', 0)
+    mocker.patch.object(Event, 'update', side_effect=_conditional_check_failure())
+    mocker.patch.object(Event, 'refresh')
+    with pytest.raises(AttendeeMigrationInProgress):
+        event.migrate_attendees()
+
+
+def test_list_legacy_attendees():
+    event = _event('U1', 'U2', 'U3')
+    user_ids, key = event.list_attendees(limit=2)
+    assert user_ids == ['U1', 'U2']
+    assert event.list_attendees(limit=2, last_evaluated_key=key) == (['U3'], None)
+
+
+def test_get_cached(mocker):
+    Event._cache.clear()
+    get = mocker.patch.object(Event, 'get', return_value=_event('U1'))
+    assert Event.get_cached('1234.5678').is_attendee('U1')
+    assert Event.get_cached('1234.5678').is_attendee('U1')
+    assert get.call_count == 1
+
+
+def test_get_cached_does_not_exist(mocker):
+    Event._cache.clear()
+    get = mocker.patch.object(Event, 'get', side_effect=Event.DoesNotExist())
+    for _ in range(2):
+        with pytest.raises(Event.DoesNotExist):
+            Event.get_cached('1234.5678')
+    assert get.call_count == 1
+
+
+def test_update_invalidates_cache(mocker):
+    Event._cache.clear()
+    get = mocker.patch.object(Event, 'get', return_value=_migrated_event())
+    mocker.patch.object(Attendee, 'save')
+    mocker.patch('pynamodb.models.Model.update')
+    event = Event.get_cached('1234.5678')
+    event.register_attendee('U1')
+    Event.get_cached('1234.5678')
+    assert get.call_count == 2
+
+
+def test_save_is_conditional_on_version(mocker):
+    save = mocker.patch('pynamodb.models.Model.save')
+    event = _migrated_event()
+    event.save()
+    assert event.version == 1
+    assert save.call_args[1]['condition'] is not None
+    save.side_effect = _conditional_check_failure(PutError)
+    with pytest.raises(VersionConflict):
+        event.save()
+    assert event.version == 1
+
+
+def test_update_increments_version(mocker):
+    update = mocker.patch('pynamodb.models.Model.update')
+    _migrated_event().update(actions=[Event.cost.set(100)])
+    assert len(update.call_args[1]['actions']) == 2
@@ -0,0 +1,43 @@
+import pytest
+
+from eventbot.models.loader import ModelLoader
+from eventbot.models.user import User
+
+
+def _batch_get(keys):
+    return [User(user_id=key) for key in keys if key != 'missing']
+
+
+def test_load_dedupes_and_batches(mocker):
+    batch_get = mocker.patch.object(User, 'batch_get_cached', side_effect=_batch_get)
+    loader = ModelLoader(User)
+    results = loader.load_many(['U1', 'U2', 'U1'])
+    assert [r.get().user_id for r in results] == ['U1', 'U2', 'U1']
+    batch_get.assert_called_once_with(['U1', 'U2'])
+    # Already loaded keys aren't fetched again
+    assert loader.get('U2').user_id == 'U2'
+    assert batch_get.call_count == 1
+
+
+def test_missing_key(mocker):
+    mocker.patch.object(User, 'batch_get_cached', side_effect=_batch_get)
+    loader = ModelLoader(User)
+    with pytest.raises(User.DoesNotExist):
+        loader.get('missing')
+    assert [u.user_id for u in loader.get_many(['U1', 'missing', 'U2'])] == ['U1', 'U2']
+
+
+def test_failed_fetch_is_retried(mocker):
+    mocker.patch.object(User, 'batch_get_cached', side_effect=[Exception('boom'), _batch_get(['U1'])])
+    loader = ModelLoader(User)
+    with pytest.raises(Exception):
+        loader.get('U1')
+    assert loader.get('U1').user_id == 'U1'
+
+
+def test_prime(mocker):
+    batch_get = mocker.patch.object(User, 'batch_get_cached')
+    loader = ModelLoader(User)
+    loader.prime('U1', User(user_id='U1'))
+    assert loader.get('U1').user_id == 'U1'
+    assert batch_get.call_count == 0
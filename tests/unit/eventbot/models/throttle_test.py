@@ -0,0 +1,89 @@
+import json
+import time
+
+import gevent
+import pytest
+from botocore.vendored import requests
+
+from eventbot.models import throttle
+
+
+@pytest.fixture(autouse=True)
+def limiters():
+    throttle.reset()
+    yield
+    throttle.reset()
+
+
+def _response(status_code, content):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(content).encode('utf-8')
+    return response
+
+
+def test_throttling_halves_the_rate_and_success_recovers_it():
+    limiter = throttle.AdaptiveLimiter('event.read', 100, 10, 100)
+    limiter.throttled()
+    assert limiter.rate == 50
+    for _ in range(4):
+        limiter.throttled()
+    assert limiter.rate == 10
+    limiter.succeeded()
+    assert limiter.rate == 11
+
+
+def test_waiters_are_served_in_priority_order():
+    limiter = throttle.AdaptiveLimiter('event.write', 50, 1, 50)
+    limiter.acquire(limiter.capacity)
+    order = []
+
+    def acquire(name, priority):
+        limiter.acquire(priority=priority)
+        order.append(name)
+
+    jobs = [gevent.spawn(acquire, 'bulk', throttle.BULK)]
+    gevent.sleep(0)
+    jobs.append(gevent.spawn(acquire, 'background', throttle.BACKGROUND))
+    gevent.sleep(0)
+    jobs.append(gevent.spawn(acquire, 'interactive', throttle.INTERACTIVE))
+    gevent.joinall(jobs, timeout=2)
+    assert order == ['interactive', 'background', 'bulk']
+
+
+def test_acquire_gives_up_waiting_after_max_wait():
+    limiter = throttle.AdaptiveLimiter('event.read', 1, 1, 1)
+    limiter.acquire()
+    start = time.monotonic()
+    limiter.acquire(max_wait=0.05)
+    assert time.monotonic() - start < 0.5
+
+
+def test_send_adapts_to_throttling_and_consumed_capacity(mocker):
+    mocker.patch('eventbot.settings.DYNAMODB_THROTTLE_MAX_RATE', 100.0)
+    throttle._on_pre_dynamodb_send(None, 'Query', 'events', 'uuid')
+    limiter = throttle.before_send(None)
+    assert limiter is throttle.get_limiter('events', 'read')
+
+    throttle.after_send(limiter, _response(400, {'__type': 'ProvisionedThroughputExceededException'}))
+    assert limiter.rate == 50
+
+    tokens = limiter._tokens
+    throttle.after_send(limiter, _response(200, {'ConsumedCapacity': {'TableName': 'events', 'CapacityUnits': 5.5}}))
+    assert limiter.rate == 51
+    assert limiter._tokens < tokens - 4
+
+
+def test_batch_operations_are_limited_by_their_table():
+    throttle._on_pre_dynamodb_send(None, 'BatchWriteItem', None, 'uuid')
+    request = requests.Request('POST', 'http://dynamodb', data=json.dumps({'RequestItems': {'attendees': []}}))
+    limiter = throttle.before_send(request.prepare())
+    assert limiter is throttle.get_limiter('attendees', 'write')
+
+
+def test_other_operations_and_disabled_throttling_are_not_limited(mocker):
+    throttle._on_pre_dynamodb_send(None, 'DescribeTable', 'events', 'uuid')
+    assert throttle.before_send(None) is None
+    mocker.patch('eventbot.settings.DYNAMODB_THROTTLE_ENABLED', False)
+    throttle._on_pre_dynamodb_send(None, 'GetItem', 'events', 'uuid')
+    assert throttle.before_send(None) is None
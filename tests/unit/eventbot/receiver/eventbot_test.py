@@ -0,0 +1,295 @@
+from datetime import datetime, timedelta
+
+import gevent
+import pytest
+
+from eventbot.models.archive import ArchivedEvent
+from eventbot.models.event import AttendeeMap, Event, PaymentSummaryMap
+from eventbot.models.user import User
+from eventbot.receiver import eventbot
+from eventbot.storage.memory import MemoryBackend
+from eventbot.utils.background import BackgroundPool
+
+
+def _click(action, event_id='1234.5678'):
+    return {
+        'parsed_user': {'id': 'U1'},
+        'channel': {'id': 'C1'},
+        'trigger_id': 'T1',
+        'message_ts': event_id,
+        'actions': [{'name': action, 'value': event_id}],
+    }
+
+
+@pytest.fixture
+def event_obj(mocker):
+    eventbot._render_cache.clear()
+    eventbot._last_rendered.clear()
+    event_obj = Event(
+        event_id='1234.5678',
+        name='Lunch',
+        description='Tacos',
+        modified_date=datetime(2019, 1, 1),
+        attendees=[AttendeeMap(attendee='U2')],
+    )
+    mocker.patch.object(Event, 'batch_get_cached', return_value=[event_obj])
+    mocker.patch.object(ArchivedEvent, 'batch_get_cached', return_value=[])
+    mocker.patch.object(
+        User,
+        'batch_get_cached',
+        return_value=[User(user_id='U2', venmo_handle='@u2')],
+    )
+    return event_obj
+
+
+def test_refresh_renders_event(event_obj):
+    ret = eventbot.interactive_event_handler(_click('refresh'))
+    assert len(ret['actions']) == 1
+    kwargs = ret['actions'][0]['kwargs']
+    assert kwargs['ts'] == '1234.5678'
+    assert kwargs['attachments'][0]['fields'][2]['value'] == '@u2'
+
+
+def test_refresh_sends_unchanged_update(event_obj):
+    eventbot.interactive_event_handler(_click('refresh'))
+    ret = eventbot.interactive_event_handler(_click('refresh'))
+    assert len(ret['actions']) == 1
+    # The render itself is cached
+    assert User.batch_get_cached.call_count == 1
+
+
+def test_refresh_prefetches_only_to_render(event_obj, mocker):
+    eventbot.interactive_event_handler(_click('refresh'))
+    prefetch = mocker.spy(eventbot, '_prefetch_attendees')
+    eventbot.interactive_event_handler(_click('refresh'))
+    assert prefetch.call_count == 0
+
+
+def test_register_skips_unchanged_update(event_obj, mocker):
+    mocker.patch.object(Event, 'register_attendee', return_value=False)
+    eventbot.interactive_event_handler(_click('refresh'))
+    ret = eventbot.interactive_event_handler(_click('register'))
+    assert ret['responses'][0]['text'] == '<@U1> already registered'
+    assert ret['actions'] == []
+
+
+def test_refresh_sends_changed_update(event_obj):
+    eventbot.interactive_event_handler(_click('refresh'))
+    event_obj.modified_date = datetime(2019, 1, 2)
+    ret = eventbot.interactive_event_handler(_click('refresh'))
+    assert len(ret['actions']) == 1
+
+
+def test_missing_event(event_obj):
+    Event.batch_get_cached.return_value = []
+    ret = eventbot.interactive_event_handler(_click('refresh'))
+    assert 'does not exist' in ret['responses'][0]['text']
+
+
+def test_update_venmo_dialog(event_obj):
+    User.batch_get_cached.return_value = [User(user_id='U1', venmo_handle='@u1')]
+    ret = eventbot.interactive_event_handler(_click('update_venmo'))
+    elements = ret['actions'][0]['kwargs']['dialog']['elements']
+    assert elements[0]['value'] == '@u1'
+
+
+def test_fast_ack(event_obj, mocker):
+    mocker.patch('eventbot.settings.FAST_ACK_ENABLED', True)
+    post = mocker.patch('eventbot.utils.slack.post_to_response_url')
+    mocker.patch.object(Event, 'register_attendee', return_value=True)
+    event = _click('register')
+    event['response_url'] = 'https://hooks.slack.com/actions/1'
+    pool = BackgroundPool(1)
+    mocker.patch('eventbot.utils.background.get_pool', return_value=pool)
+
+    ret = eventbot.interactive_event_handler(event)
+    assert ret['responses'][0]['text'] == 'Registering <@U1>...'
+    assert 'actions' not in ret
+
+    pool.drain(timeout=1)
+    payloads = [call[0][1] for call in post.call_args_list]
+    assert payloads[0]['text'] == 'Registered <@U1>'
+    assert payloads[1]['replace_original']
+
+
+def test_fast_ack_retries_failed_writes(event_obj, mocker):
+    mocker.patch('eventbot.settings.FAST_ACK_ENABLED', True)
+    mocker.patch('eventbot.settings.BACKGROUND_RETRIES', 2)
+    mocker.patch('eventbot.settings.BACKGROUND_RETRY_BACKOFF', 0)
+    post = mocker.patch('eventbot.utils.slack.post_to_response_url')
+    register = mocker.patch.object(Event, 'register_attendee', side_effect=[Exception('boom'), True])
+    event = _click('register')
+    event['response_url'] = 'https://hooks.slack.com/actions/1'
+    pool = BackgroundPool(1)
+    mocker.patch('eventbot.utils.background.get_pool', return_value=pool)
+
+    eventbot.interactive_event_handler(event)
+    pool.drain(timeout=1)
+    assert register.call_count == 2
+    assert post.call_args_list[0][0][1]['text'] == 'Registered <@U1>'
+
+
+def test_fast_ack_reports_failure_after_last_retry(event_obj, mocker):
+    mocker.patch('eventbot.settings.FAST_ACK_ENABLED', True)
+    mocker.patch('eventbot.settings.BACKGROUND_RETRIES', 1)
+    mocker.patch('eventbot.settings.BACKGROUND_RETRY_BACKOFF', 0)
+    post = mocker.patch('eventbot.utils.slack.post_to_response_url')
+    register = mocker.patch.object(Event, 'register_attendee', side_effect=Exception('boom'))
+    event = _click('register')
+    event['response_url'] = 'https://hooks.slack.com/actions/1'
+    pool = BackgroundPool(1)
+    mocker.patch('eventbot.utils.background.get_pool', return_value=pool)
+
+    eventbot.interactive_event_handler(event)
+    pool.drain(timeout=1)
+    assert register.call_count == 2
+    assert [x[0][1]['text'] for x in post.call_args_list] == ['Failed to register <@U1>']
+
+
+def test_list_events_command(mocker):
+    backend = mocker.patch('eventbot.storage.get_backend').return_value
+    backend.list_events.return_value = (
+        [
+            Event(event_id='E1', name='Lunch', creator='U1', start_date=datetime(2019, 1, 1), start_date_given=True),
+            Event(event_id='E2', name='Dinner', creator='U2', start_date=datetime(2019, 1, 2)),
+        ],
+        'abc',
+    )
+    ret = eventbot.list_events_command({}, cursor='xyz')
+    text = ret['actions'][0]['kwargs']['text']
+    assert '*Lunch*, starting 2019-01-01 00:00 UTC, created by <@U1>' in text
+    assert '*Dinner*, created 2019-01-02 00:00 UTC by <@U2>' in text
+    assert '`event list abc`' in text
+    assert backend.list_events.call_args[1]['cursor'] == 'xyz'
+
+
+@pytest.fixture
+def large_event(mocker):
+    eventbot._render_cache.clear()
+    eventbot._last_rendered.clear()
+    backend = MemoryBackend()
+    backend.save(Event(
+        event_id='1234.5678',
+        name='All hands',
+        description='Everyone',
+        attendees=[AttendeeMap(attendee=f'U{i}') for i in range(5)],
+    ))
+    backend.save(User(user_id='U0', venmo_handle='@u0'))
+    mocker.patch('eventbot.storage.get_backend', return_value=backend)
+    mocker.patch('eventbot.settings.RENDER_ATTENDEE_LIMIT', 2)
+    mocker.patch('eventbot.settings.ATTENDEE_PAGE_SIZE', 3)
+    return backend
+
+
+def test_render_is_bounded(large_event):
+    ret = eventbot.interactive_event_handler(_click('refresh'))
+    fields = ret['actions'][0]['kwargs']['attachments'][0]['fields']
+    assert fields[1]['value'] == '5'
+    assert fields[2]['value'] == '@u0'
+    # U1 has no user record, so has no venmo handle
+    assert fields[3]['value'] == '<@U1>'
+    assert fields[4]['value'].startswith('and 3 more')
+
+
+def test_show_attendees_pages(large_event):
+    ret = eventbot.interactive_event_handler(_click('show_attendees'))
+    response = ret['responses'][0]
+    assert response['text'] == '<@U0> (@u0)\n<@U1>\n<@U2>'
+    button = response['attachments'][0]['actions'][0]
+    ret = eventbot.interactive_event_handler(_click('show_attendees', button['value']))
+    assert ret['responses'][0]['text'] == '<@U3>\n<@U4>'
+    assert 'attachments' not in ret['responses'][0]
+
+
+def test_archived_event_renders_closed(large_event):
+    event_obj = large_event.get(Event, '1234.5678')
+    event_obj.status = Event.STATUS_CLOSED
+    large_event.save(event_obj)
+    large_event.archive_events(['1234.5678'], datetime.utcnow() + timedelta(seconds=1))
+
+    ret = eventbot.interactive_event_handler(_click('refresh'))
+    kwargs = ret['actions'][0]['kwargs']
+    assert kwargs['text'] == 'Event *All hands* (closed)'
+    assert len(kwargs['attachments']) == 1
+    ret = eventbot.interactive_event_handler(_click('register'))
+    assert ret['responses'][0]['text'] == eventbot._CLOSED_MESSAGE
+
+
+def test_render_from_payment_summary(large_event, mocker):
+    event_obj = large_event.get(Event, '1234.5678')
+    event_obj.payment_summary = PaymentSummaryMap()
+    for i in range(5):
+        event_obj.payment_summary.add_attendee(f'U{i}', '@u0' if i == 0 else None)
+    large_event.save(event_obj)
+    # Let loads queued by earlier tests finish first.
+    gevent.sleep(0)
+    batch_get = mocker.spy(large_event, 'batch_get')
+
+    ret = eventbot.interactive_event_handler(_click('refresh'))
+    fields = ret['actions'][0]['kwargs']['attachments'][0]['fields']
+    assert fields[2]['value'] == '@u0'
+    assert fields[3]['value'] == '<@U1>'
+    assert fields[4]['value'].startswith('and 3 more, 3 of them missing a Venmo handle')
+    assert [x[0][0] for x in batch_get.call_args_list] == [Event]
+
+    ret = eventbot.handle_interactive_event_for_events({
+        'parsed_user': {'id': 'U1'},
+        'channel': {'id': 'C1'},
+        'state': 'update_venmo:1234.5678',
+        'submission': {'venmo_handle': '@u1'},
+    })
+    fields = ret['actions'][0]['kwargs']['attachments'][0]['fields']
+    assert fields[2]['value'] == '@u0, @u1'
+    assert fields[3]['value'] == 'None'
+
+
+def test_edit_start_date(large_event):
+    def submit(start_date):
+        return eventbot.handle_interactive_event_for_events({
+            'parsed_user': {'id': 'U1'},
+            'channel': {'id': 'C1'},
+            'state': 'update_event:1234.5678',
+            'submission': {'name': 'All hands', 'start_date': start_date},
+        })
+
+    submit('2019-06-01 18:30')
+    event_obj = large_event.get(Event, '1234.5678')
+    assert event_obj.start_date_given
+    assert Event.start_date.serialize(event_obj.start_date) == Event.start_date.serialize(datetime(2019, 6, 1, 18, 30))
+    ret = eventbot.interactive_event_handler(_click('update'))
+    elements = ret['actions'][0]['kwargs']['dialog']['elements']
+    assert elements[-1]['value'] == '2019-06-01 18:30'
+
+    ret = submit('tomorrow')
+    assert ret['responses'][0]['text'].startswith('Invalid start date tomorrow')
+
+    submit('')
+    event_obj = large_event.get(Event, '1234.5678')
+    assert not event_obj.start_date_given
+    assert event_obj.start_date == event_obj.created_date
+    ret = eventbot.interactive_event_handler(_click('update'))
+    assert ret['actions'][0]['kwargs']['dialog']['elements'][-1]['value'] == ''
+
+
+def test_reschedule_resets_reminders(backend):
+    eventbot._render_cache.clear()
+    eventbot._last_rendered.clear()
+
+    def submit(name, start_date):
+        eventbot.handle_interactive_event_for_events({
+            'parsed_user': {'id': 'U1'},
+            'channel': {'id': 'C1'},
+            'state': 'update_event:1234.5678',
+            'submission': {'name': name, 'start_date': start_date},
+        })
+
+    submit('Lunch', '2019-06-01 12:00')
+    assert backend.claim_reminder(backend.get(Event, '1234.5678'), 60)
+    # Edits that keep the start date keep the claims
+    submit('Team lunch', '2019-06-01 12:00')
+    assert not backend.claim_reminder(backend.get(Event, '1234.5678'), 60)
+
+    submit('Team lunch', '2019-06-02 12:00')
+    assert backend.claim_reminder(backend.get(Event, '1234.5678'), 60)
+    submit('Team lunch', '')
+    assert backend.claim_reminder(backend.get(Event, '1234.5678'), 60)
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from eventbot.models.event import Event
+from eventbot.receiver import reminders
+
+NOW = datetime(2019, 6, 1, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def reminder_settings(mocker):
+    mocker.patch('eventbot.settings.REMINDER_REFRESH_INTERVAL', 60.0)
+    mocker.patch('eventbot.settings.REMINDER_MAX_LATENESS', 900.0)
+
+
+@pytest.fixture
+def posted(mocker):
+    posted = []
+
+    def post_actions(actions, concurrency):
+        posted.extend(actions)
+        return [None] * len(actions)
+
+    mocker.patch('eventbot.utils.slack.post_actions', side_effect=post_actions)
+    return posted
+
+
+def _timestamp(date):
+    return reminders._timestamp(date)
+
+
+def _save(backend, event_id, start_date, channel_id='C1', start_date_given=True):
+    backend.save(Event(
+        event_id=event_id,
+        name=f'Lunch {event_id}',
+        description='',
+        creator='U1',
+        channel_id=channel_id,
+        start_date=start_date,
+        start_date_given=start_date_given,
+    ))
+
+
+def test_refresh_schedules_reminders_due_before_the_next_refresh(backend):
+    _save(backend, 'soon', NOW + timedelta(minutes=65))
+    _save(backend, 'late', NOW + timedelta(minutes=30))
+    _save(backend, 'tomorrow', NOW + timedelta(hours=23, minutes=50))
+    _save(backend, 'later', NOW + timedelta(days=3))
+    scheduler = reminders.ReminderScheduler([1440, 60])
+    now = _timestamp(NOW)
+    # The reminders of 'late' are more than REMINDER_MAX_LATENESS late, and
+    # those of 'later' aren't due before the next refresh.
+    assert scheduler.refresh(now) == 3
+    assert scheduler.refresh(now) == 0
+    assert [x[:2] for x in scheduler.pop_due(now)] == [('tomorrow', 1440)]
+    assert scheduler.next_due() == _timestamp(NOW + timedelta(minutes=5))
+
+
+def test_moved_events_are_rescheduled(backend, posted):
+    _save(backend, 'E1', NOW + timedelta(minutes=61))
+    scheduler = reminders.ReminderScheduler([60])
+    scheduler.refresh(_timestamp(NOW))
+    event_obj = backend.get(Event, 'E1')
+    event_obj.start_date = NOW + timedelta(minutes=90)
+    backend.save(event_obj)
+    # Not reloaded yet, so the reminder for the old start is due, but the
+    # event is checked before it's sent.
+    now = _timestamp(NOW + timedelta(minutes=1))
+    assert scheduler.send(scheduler.pop_due(now), now) == 0
+    scheduler.refresh(_timestamp(NOW + timedelta(minutes=29)))
+    now = _timestamp(NOW + timedelta(minutes=30))
+    assert scheduler.send(scheduler.pop_due(now), now) == 1
+    assert posted[0]['kwargs']['text'] == 'Reminder: *Lunch E1* starts in 1 hour, at 2019-06-01 13:30 UTC'
+
+
+def test_due_reminders_are_sent_once_as_a_batch(backend, posted):
+    _save(backend, 'E1', NOW + timedelta(hours=1))
+    _save(backend, 'E2', NOW + timedelta(hours=1))
+    _save(backend, 'E3', NOW + timedelta(hours=1), channel_id=None)
+    now = _timestamp(NOW)
+    # Two workers, or one before and after a restart, schedule the same reminders.
+    first = reminders.ReminderScheduler([60])
+    second = reminders.ReminderScheduler([60])
+    first.refresh(now)
+    second.refresh(now)
+    assert first.send(first.pop_due(now), now) == 2
+    assert second.send(second.pop_due(now), now) == 0
+    assert [x['kwargs']['thread_ts'] for x in posted] == ['E1', 'E2']
+    assert posted[0] == {
+        'action': 'chat.postMessage',
+        'kwargs': {
+            'channel': 'C1',
+            'thread_ts': 'E1',
+            'text': 'Reminder: *Lunch E1* starts in 1 hour, at 2019-06-01 13:00 UTC',
+        },
+    }
+
+
+def test_closed_events_are_not_reminded(backend, posted):
+    _save(backend, 'E1', NOW + timedelta(hours=1))
+    scheduler = reminders.ReminderScheduler([60])
+    now = _timestamp(NOW)
+    scheduler.refresh(now)
+    event_obj = backend.get(Event, 'E1')
+    event_obj.status = Event.STATUS_CLOSED
+    backend.save(event_obj)
+    assert scheduler.send(scheduler.pop_due(now), now) == 0
+    assert posted == []
+
+
+def test_events_without_a_given_start_date_are_not_reminded(backend, posted):
+    _save(backend, 'E1', NOW + timedelta(hours=1), start_date_given=None)
+    scheduler = reminders.ReminderScheduler([60])
+    now = _timestamp(NOW)
+    assert scheduler.refresh(now) == 0
+
+    # Nor ones whose start date was cleared after they were scheduled
+    _save(backend, 'E2', NOW + timedelta(hours=1))
+    assert scheduler.refresh(now) == 1
+    backend.edit(Event, 'E2', lambda x: setattr(x, 'start_date_given', None))
+    assert scheduler.send(scheduler.pop_due(now), now) == 0
+    assert posted == []
+
+
+def test_reminders_at_the_start_are_sent_after_it(backend, posted):
+    # As after a restart just after the event started
+    _save(backend, 'E1', NOW - timedelta(minutes=5))
+    scheduler = reminders.ReminderScheduler([0])
+    now = _timestamp(NOW)
+    assert scheduler.refresh(now) == 1
+    assert scheduler.send(scheduler.pop_due(now), now) == 1
+    assert posted[0]['kwargs']['text'] == 'Reminder: *Lunch E1* is starting now, at 2019-06-01 11:55 UTC'
+
+
+def test_format_offset():
+    assert reminders._format_offset(1440) == '1 day'
+    assert reminders._format_offset(90) == '1 hour 30 minutes'
+    assert reminders._format_offset(2 * 1440 + 1) == '2 days 1 minute'
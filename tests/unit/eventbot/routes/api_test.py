@@ -1,3 +1,4 @@
+import gzip
 import json
 
 import pytest
@@ -19,3 +20,31 @@ def test_post_slack_event(client, mocker):
     )
     data = json.loads(result.data)
     assert data
+
+
+def test_post_invalid_json(client):
+    result = client.post(
+        '/api/v1/eventbot',
+        data='{',
+        content_type='application/json'
+    )
+    assert result.status_code == 400
+
+
+def test_large_responses_are_compressed(client, mocker):
+    mocker.patch('eventbot.settings.RESPONSE_COMPRESSION_ENABLED', True)
+    mocker.patch('eventbot.settings.RESPONSE_COMPRESSION_MIN_SIZE', 10)
+    payload = {'responses': [{'text': 'x' * 100}]}
+    mocker.patch('eventbot.routes.api.router.handle_event', return_value=payload)
+    result = client.post(
+        '/api/v1/eventbot',
+        data=json.dumps({}),
+        content_type='application/json',
+        headers={'Accept-Encoding': 'gzip'},
+    )
+    assert result.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(result.data)) == payload
+
+    result = client.post('/api/v1/eventbot', data=json.dumps({}), content_type='application/json')
+    assert 'Content-Encoding' not in result.headers
+    assert json.loads(result.data) == payload
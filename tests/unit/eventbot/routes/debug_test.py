@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from eventbot.utils import profiling, tracing
+from eventbot.wsgi import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_traces_are_disabled_without_token(client, mocker):
+    mocker.patch('eventbot.settings.DEBUG_ENDPOINT_TOKEN', None)
+    assert client.get('/debug/traces').status_code == 404
+
+
+def test_traces_require_token(client, mocker):
+    mocker.patch('eventbot.settings.DEBUG_ENDPOINT_TOKEN', 'secret')
+    assert client.get('/debug/traces').status_code == 403
+    assert client.get('/debug/traces', headers={'X-Debug-Token': 'wrong'}).status_code == 403
+
+
+def test_traces_lists_sampled_requests(client, mocker):
+    mocker.patch('eventbot.settings.DEBUG_ENDPOINT_TOKEN', 'secret')
+    mocker.patch('eventbot.settings.TRACE_SAMPLE_RATE', 1.0)
+    tracing.clear()
+    client.get('/healthcheck', headers={'X-Request-ID': 'req-1'})
+    result = client.get('/debug/traces', headers={'X-Debug-Token': 'secret'})
+    traces = json.loads(result.data)['traces']
+    assert [x['request_id'] for x in traces] == ['req-1']
+    assert traces[0]['name'] == 'api.healthcheck'
+    assert traces[0]['status'] == 200
+    tracing.clear()
+
+
+@pytest.fixture
+def profiling_enabled(mocker, tmpdir):
+    mocker.patch('eventbot.settings.DEBUG_ENDPOINT_TOKEN', 'secret')
+    mocker.patch('eventbot.settings.PROFILING_ENABLED', True)
+    mocker.patch('eventbot.settings.PROFILE_DIR', str(tmpdir))
+    yield tmpdir
+    profiling.stop()
+
+
+def test_profiling_is_disabled_by_default(client, mocker):
+    mocker.patch('eventbot.settings.DEBUG_ENDPOINT_TOKEN', 'secret')
+    result = client.post('/debug/profile?kind=cpu&requests=1', headers={'X-Debug-Token': 'secret'})
+    assert result.status_code == 404
+
+
+@pytest.mark.parametrize('kind', ['cpu', 'memory'])
+def test_profile_next_requests(client, profiling_enabled, kind):
+    headers = {'X-Debug-Token': 'secret'}
+    result = client.post(f'/debug/profile?kind={kind}&requests=2', headers=headers)
+    assert result.status_code == 200
+    assert client.post('/debug/profile?kind=cpu', headers=headers).status_code == 409
+    client.get('/healthcheck')
+    assert json.loads(client.get('/debug/profile', headers=headers).data)['session']['requests_done'] == 1
+    client.get('/healthcheck')
+    status = json.loads(client.get('/debug/profile', headers=headers).data)
+    assert status['session'] is None
+    result = status['results'][-1]
+    assert result['kind'] == kind
+    assert result['requests'] == 2
+    assert result['files']
+    assert all(os.path.exists(x) for x in result['files'])
+
+
+def test_profile_rejects_invalid_arguments(client, profiling_enabled):
+    headers = {'X-Debug-Token': 'secret'}
+    assert client.post('/debug/profile?kind=disk', headers=headers).status_code == 400
+    assert client.post('/debug/profile?requests=x', headers=headers).status_code == 400
+    assert client.post('/debug/profile?seconds=0', headers=headers).status_code == 400
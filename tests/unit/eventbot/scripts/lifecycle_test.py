@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from eventbot.models.event import Event
+from eventbot.scripts import lifecycle
+
+NOW = datetime(2019, 6, 1)
+
+
+@pytest.fixture(autouse=True)
+def lifecycle_settings(mocker):
+    mocker.patch('eventbot.settings.EVENT_INACTIVE_DAYS', 30)
+    mocker.patch('eventbot.settings.EVENT_ARCHIVE_AFTER_DAYS', 7)
+
+
+def _save(backend, event_id, modified_date, end_date=None, start_date=datetime(2019, 1, 1)):
+    event = Event(
+        event_id=event_id,
+        name='Lunch',
+        description='',
+        creator='U1',
+        created_date=modified_date,
+        modified_date=modified_date,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    # Keep the given modified date, rather than the current time.
+    with mock.patch.object(Event, 'touch'):
+        backend.save(event)
+
+
+def test_close_inactive_events(backend):
+    # Ended events are closed right away, however recently they were modified
+    _save(backend, 'ended', NOW, end_date=NOW - timedelta(hours=1))
+    _save(backend, 'idle', NOW - timedelta(days=31))
+    _save(backend, 'upcoming', NOW - timedelta(days=60), end_date=NOW + timedelta(days=1))
+    _save(backend, 'active', NOW - timedelta(days=1))
+    assert lifecycle.close_events(NOW) == 2
+    statuses = {x.event_id: x.status for x in backend.batch_get(Event, ['ended', 'idle', 'upcoming', 'active'])}
+    assert statuses == {'ended': 'closed', 'idle': 'closed', 'upcoming': 'open', 'active': 'open'}
+    assert lifecycle.close_events(NOW) == 0
+    assert lifecycle.close_events(NOW + timedelta(days=2)) == 1
+
+
+def test_archive_closed_events(backend):
+    _save(backend, 'E1', NOW - timedelta(days=31))
+    lifecycle.close_events(NOW)
+    # Closed just now, so not archived yet
+    assert lifecycle.archive_events(datetime.utcnow()) == 0
+    assert lifecycle.archive_events(datetime.utcnow() + timedelta(days=8)) == 1
+    with pytest.raises(Event.DoesNotExist):
+        backend.get(Event, 'E1')
+    archived = backend.get_archived_events(['E1', 'E2'])
+    assert [(x.event_id, x.status) for x in archived] == [('E1', 'closed')]
+
+
+def test_index_events_written_without_a_start_date(backend):
+    # As written by versions before the status index
+    _save(backend, 'legacy', NOW - timedelta(days=31), start_date=None)
+    _save(backend, 'E1', NOW - timedelta(days=31))
+    assert backend.list_unindexed_events() == (['legacy'], None)
+    assert lifecycle.close_events(NOW) == 1
+
+    assert lifecycle.index_events() == 1
+    assert backend.list_unindexed_events() == ([], None)
+    event = backend.get(Event, 'legacy')
+    assert Event.start_date.serialize(event.start_date) == Event.start_date.serialize(NOW - timedelta(days=31))
+    # Still inactive, since its modified date didn't change
+    assert lifecycle.close_events(NOW) == 1
+    assert backend.get(Event, 'legacy').status == Event.STATUS_CLOSED
+    assert lifecycle.index_events() == 0
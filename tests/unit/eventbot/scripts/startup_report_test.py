@@ -0,0 +1,14 @@
+from eventbot.scripts.startup_report import parse_import_times
+
+
+def test_parse_import_times():
+    output = '\n'.join([
+        'import time: self [us] | cumulative | imported package',
+        'import time:       120 |        120 |   zipimport',
+        'import time:      2500 |       4000 | eventbot.wsgi',
+        'some other output',
+    ])
+    assert parse_import_times(output) == [
+        {'module': 'zipimport', 'self_ms': 0.12, 'cumulative_ms': 0.12},
+        {'module': 'eventbot.wsgi', 'self_ms': 2.5, 'cumulative_ms': 4.0},
+    ]
@@ -0,0 +1,73 @@
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from eventbot.models.event import AttendeeMap, Event
+from eventbot.models.user import User
+from eventbot.scripts import summaries
+from eventbot.storage.memory import MemoryBackend
+
+
+@pytest.fixture(autouse=True)
+def attendee_limit(mocker):
+    mocker.patch('eventbot.settings.RENDER_ATTENDEE_LIMIT', 2)
+
+
+def test_repair_builds_missing_and_drifted_summaries(backend):
+    backend.save(User(user_id='U2', venmo_handle='@u2'))
+    # Attendees set in bulk, so without a summary
+    backend.save(Event(
+        event_id='E1',
+        name='Lunch',
+        description='',
+        creator='U1',
+        attendees=[AttendeeMap(attendee=f'U{i}') for i in range(1, 5)],
+    ))
+    assert summaries.repair_summaries() == (1, 1)
+    summary = backend.get(Event, 'E1').payment_summary
+    assert (summary.with_handle, summary.without_handle) == (1, 3)
+    assert [(x.user_id, x.venmo_handle) for x in summary.attendees] == [('U1', None), ('U2', '@u2')]
+    assert summaries.repair_summaries() == (1, 0)
+
+    # A handle change the summary missed
+    backend.save(User(user_id='U1', venmo_handle='@u1'))
+    assert summaries.repair_summaries(['E1', 'missing']) == (2, 1)
+    summary = backend.get(Event, 'E1').payment_summary
+    assert (summary.with_handle, summary.without_handle) == (2, 2)
+    assert summary.attendees[0].venmo_handle == '@u1'
+
+
+def test_repair_recounts_attendees(mocker):
+    # The local backends keep counts right on save, so break one by hand
+    backend = MemoryBackend()
+    mocker.patch('eventbot.storage.get_backend', return_value=backend)
+    backend.save(Event(
+        event_id='E1',
+        name='Lunch',
+        description='',
+        creator='U1',
+        attendees=[AttendeeMap(attendee=f'U{i}') for i in range(1, 4)],
+    ))
+    assert summaries.repair_summaries() == (1, 1)
+    # As left by a registration whose count update failed
+    backend._items[(Event, 'E1')].attendee_count = 7
+    assert summaries.repair_summaries() == (1, 1)
+    assert backend.get(Event, 'E1').attendee_count == 3
+    assert summaries.repair_summaries() == (1, 0)
+
+
+def test_repair_command_indexes_events(backend):
+    # As written by versions before the status index
+    with mock.patch.object(Event, 'touch'):
+        backend.save(Event(
+            event_id='E1',
+            name='Lunch',
+            description='',
+            creator='U1',
+            created_date=datetime(2019, 1, 1),
+            attendees=[AttendeeMap(attendee='U1')],
+        ))
+    assert summaries.repair_summaries() == (0, 0)
+    summaries.RepairSummaries().run(None, 0, True)
+    assert backend.get(Event, 'E1').payment_summary.without_handle == 1
@@ -0,0 +1,76 @@
+import io
+import json
+
+import pytest
+
+from eventbot.scripts import transfer
+
+
+def _user(i):
+    return {'user_id': {'S': f'U{i}'}}
+
+
+@pytest.fixture
+def connections(mocker):
+    mocker.patch.object(transfer, 'WRITE_RETRY_BACKOFF', 0)
+    connections = {name: mocker.Mock() for name in transfer.MODELS}
+    for name, model in transfer.MODELS.items():
+        mocker.patch.object(model, '_get_connection', return_value=connections[name])
+    for connection in connections.values():
+        connection.scan.return_value = {'Items': []}
+        connection.batch_write_item.return_value = {}
+    return connections
+
+
+def test_export_scans_segments_in_parallel(connections):
+    def scan(segment, total_segments, exclusive_start_key):
+        # Two pages per segment
+        if exclusive_start_key is None:
+            return {'Items': [_user(segment * 10)], 'LastEvaluatedKey': _user(segment * 10)}
+        return {'Items': [_user(segment * 10 + 1)]}
+    connections['user'].scan.side_effect = scan
+
+    out = io.StringIO()
+    counts = transfer.export_tables(out, ['user', 'event'], segments=3)
+    assert counts == {'user': 6, 'event': 0}
+    records = [json.loads(x) for x in out.getvalue().splitlines()]
+    assert {x['table'] for x in records} == {'user'}
+    assert sorted(x['item']['user_id']['S'] for x in records) == ['U0', 'U1', 'U10', 'U11', 'U20', 'U21']
+    assert sorted(x[1]['segment'] for x in connections['user'].scan.call_args_list) == [0, 0, 1, 1, 2, 2]
+
+
+def test_export_raises_scan_errors(connections):
+    connections['event'].scan.side_effect = Exception('throttled')
+    with pytest.raises(Exception):
+        transfer.export_tables(io.StringIO(), ['event'], segments=2)
+
+
+def _lines(count):
+    return [json.dumps({'table': 'user', 'item': _user(i)}) for i in range(count)] + [
+        json.dumps({'table': 'event', 'item': {'event_id': {'S': 'E1'}}}),
+    ]
+
+
+def test_import_writes_batches_and_checkpoints(connections, tmpdir):
+    checkpoint = str(tmpdir.join('checkpoint'))
+    assert transfer.import_lines(_lines(30), checkpoint=checkpoint) == 31
+    batches = [x[1]['put_items'] for x in connections['user'].batch_write_item.call_args_list]
+    assert [len(x) for x in batches] == [25, 5]
+    assert connections['event'].batch_write_item.call_count == 1
+    assert transfer.load_checkpoint(checkpoint) == 31
+
+
+def test_import_resumes_from_checkpoint(connections):
+    transfer.import_lines(_lines(30), start_line=25)
+    batches = [x[1]['put_items'] for x in connections['user'].batch_write_item.call_args_list]
+    assert batches == [[_user(i) for i in range(25, 30)]]
+
+
+def test_import_retries_unprocessed_items(connections, mocker):
+    table_name = transfer.User.Meta.table_name
+    connections['user'].batch_write_item.side_effect = [
+        {'UnprocessedItems': {table_name: [{'PutRequest': {'Item': _user(1)}}]}},
+        {},
+    ]
+    transfer.import_lines(_lines(2)[:2])
+    assert connections['user'].batch_write_item.call_args_list[1][1]['put_items'] == [_user(1)]
@@ -0,0 +1,216 @@
+from datetime import datetime
+
+import pytest
+
+from eventbot import storage
+from eventbot.models.event import AttendeeMap, Event, PaymentSummaryMap
+from eventbot.models.user import User
+from eventbot.models.versioned import VersionConflict
+from eventbot.storage.memory import MemoryBackend
+
+
+def _event(event_id='E1', attendees=(), **kwargs):
+    return Event(
+        event_id=event_id,
+        name='Lunch',
+        description='Tacos',
+        creator='U1',
+        attendees=[AttendeeMap(attendee=x) for x in attendees],
+        **kwargs
+    )
+
+
+def test_save_and_get(backend):
+    backend.save(_event(attendees=['U1', 'U2']))
+    event_obj = backend.get(Event, 'E1')
+    assert event_obj.name == 'Lunch'
+    assert event_obj.created_date is not None
+    assert event_obj.attendee_count == 2
+    assert backend.get_attendees(event_obj) == ['U1', 'U2']
+    with pytest.raises(Event.DoesNotExist):
+        backend.get(Event, 'E2')
+
+
+def test_batch_get_keeps_order(backend):
+    backend.save(User(user_id='U1', venmo_handle='@u1'))
+    backend.save(User(user_id='U2', venmo_handle='@u2'))
+    users = backend.batch_get(User, ['U2', 'U3', 'U1', 'U2'])
+    assert [x.user_id for x in users] == ['U2', 'U1']
+
+
+def test_attendee_changes(backend):
+    backend.save(_event(attendees=['U1']))
+    event_obj = backend.get(Event, 'E1')
+    version = backend.data_version(Event)
+    assert backend.register_attendee(event_obj, 'U2') is True
+    assert backend.register_attendee(event_obj, 'U2') is False
+    results = backend.apply_attendee_changes(event_obj, [('U3', True), ('U1', False), ('U4', False)])
+    assert results == [True, True, False]
+    assert event_obj.attendee_count == 2
+    assert backend.get(Event, 'E1').attendee_count == 2
+    assert backend.get_attendees(event_obj) == ['U2', 'U3']
+    assert backend.is_attendee(event_obj, 'U2')
+    assert not backend.is_attendee(event_obj, 'U1')
+    assert backend.data_version(Event) > version
+
+
+def test_list_attendees(backend):
+    backend.save(_event(attendees=['U1', 'U2', 'U3']))
+    event_obj = backend.get(Event, 'E1')
+    backend.unregister_attendee(event_obj, 'U2')
+    backend.register_attendee(event_obj, 'U4')
+    user_ids, cursor = backend.list_attendees(event_obj, limit=2)
+    assert user_ids == ['U1', 'U3']
+    assert backend.list_attendees(event_obj, limit=2, cursor=cursor) == (['U4'], None)
+    # Editing the event doesn't touch its attendees
+    event_obj.name = 'Dinner'
+    backend.save(event_obj)
+    assert backend.get(Event, 'E1').attendee_count == 3
+
+
+def test_attendee_changes_missing_event(backend):
+    with pytest.raises(Event.DoesNotExist):
+        backend.register_attendee(_event(), 'U1')
+
+
+def test_get_backend_from_settings(mocker):
+    mocker.patch('eventbot.settings.STORAGE_BACKEND', 'memory')
+    storage.set_backend(None)
+    try:
+        assert isinstance(storage.get_backend(), MemoryBackend)
+    finally:
+        storage.set_backend(None)
+
+
+def test_list_events(backend):
+    for i in range(5):
+        event_obj = _event(event_id=f'E{i}')
+        event_obj.start_date = datetime(2019, 1, 5 - i)
+        event_obj.start_date_given = i % 2 == 0
+        backend.save(event_obj)
+    closed = _event(event_id='E5')
+    closed.status = 'closed'
+    backend.save(closed)
+
+    events, cursor = backend.list_events(Event.STATUS_OPEN, limit=2)
+    assert [x.event_id for x in events] == ['E4', 'E3']
+    assert events[0].name == 'Lunch'
+    assert [x.start_date_given for x in events] == [True, False]
+    events, cursor = backend.list_events(Event.STATUS_OPEN, limit=2, cursor=cursor)
+    assert [x.event_id for x in events] == ['E2', 'E1']
+    events, cursor = backend.list_events(Event.STATUS_OPEN, limit=2, cursor=cursor)
+    assert [x.event_id for x in events] == ['E0']
+    assert cursor is None
+
+    events, _ = backend.list_events(Event.STATUS_OPEN, since=datetime(2019, 1, 4))
+    assert [x.event_id for x in events] == ['E1', 'E0']
+    with pytest.raises(ValueError):
+        backend.list_events(Event.STATUS_OPEN, cursor='nope')
+
+
+def test_index_unindexed_events(backend, mocker):
+    # Saves by versions before the status index didn't set a start date
+    mocker.patch.object(Event, 'touch')
+    for i in range(3):
+        backend.save(_event(event_id=f'E{i}', created_date=datetime(2019, 1, 1)))
+    backend.save(_event(event_id='E3', created_date=datetime(2019, 1, 1), start_date=datetime(2019, 2, 1)))
+
+    event_ids, cursor = backend.list_unindexed_events(limit=2)
+    assert event_ids == ['E0', 'E1']
+    assert backend.list_unindexed_events(limit=2, cursor=cursor) == (['E2'], None)
+    assert [x.event_id for x in backend.list_events(Event.STATUS_OPEN)[0]] == ['E3']
+
+    assert backend.index_event('E0')
+    assert not backend.index_event('E0')
+    assert not backend.index_event('E3')
+    assert not backend.index_event('missing')
+    assert [x.event_id for x in backend.list_events(Event.STATUS_OPEN)[0]] == ['E0', 'E3']
+    assert backend.list_unindexed_events() == (['E1', 'E2'], None)
+    with pytest.raises(ValueError):
+        backend.list_unindexed_events(cursor='nope')
+
+
+def test_stale_save_conflicts(backend):
+    backend.save(_event(attendees=['U1']))
+    first = backend.get(Event, 'E1')
+    second = backend.get(Event, 'E1')
+    first.name = 'Dinner'
+    backend.save(first)
+    second.name = 'Brunch'
+    with pytest.raises(VersionConflict):
+        backend.save(second)
+    # Registrations change the version too, so a stale edit can't undo them
+    backend.register_attendee(first, 'U2')
+    stale = backend.get(Event, 'E1')
+    backend.register_attendee(first, 'U3')
+    with pytest.raises(VersionConflict):
+        backend.save(stale)
+    with pytest.raises(VersionConflict):
+        backend.save(_event())
+    assert backend.get(Event, 'E1').attendee_count == 3
+
+
+def test_edit_retries_conflicts(backend, mocker):
+    mocker.patch('eventbot.settings.EDIT_CONFLICT_RETRIES', 1)
+    backend.save(_event(attendees=['U1']))
+    other = backend.get(Event, 'E1')
+    calls = []
+
+    def apply(event_obj):
+        if not calls:
+            # Another writer gets in between the read and the save
+            backend.register_attendee(other, 'U2')
+        calls.append(event_obj.version)
+        event_obj.name = 'Dinner'
+
+    event_obj = backend.edit(Event, 'E1', apply)
+    assert len(calls) == 2
+    stored = backend.get(Event, 'E1')
+    assert (stored.name, stored.attendee_count, stored.version) == ('Dinner', 2, event_obj.version)
+
+    def always_conflict(event_obj):
+        backend.register_attendee(other, event_obj.version)
+
+    with pytest.raises(VersionConflict):
+        backend.edit(Event, 'E1', always_conflict)
+    user = backend.edit(User, 'U1', lambda x: setattr(x, 'venmo_handle', '@u1'), create=lambda: User(user_id='U1'))
+    assert backend.get(User, 'U1').venmo_handle == user.venmo_handle == '@u1'
+
+
+def test_claim_reminder(backend):
+    backend.save(_event())
+    event_obj = backend.get(Event, 'E1')
+    assert backend.claim_reminder(event_obj, 60)
+    assert not backend.claim_reminder(event_obj, 60)
+    assert backend.claim_reminder(event_obj, 1440)
+    assert not backend.claim_reminder(_event('E2'), 60)
+
+
+def _summary(event_obj):
+    summary = event_obj.payment_summary
+    return summary.with_handle, summary.without_handle, [(x.user_id, x.venmo_handle) for x in summary.attendees]
+
+
+def test_payment_summary(backend, mocker):
+    mocker.patch('eventbot.settings.RENDER_ATTENDEE_LIMIT', 2)
+    backend.save(User(user_id='U1', venmo_handle='@u1'))
+    backend.save(User(user_id='U3', venmo_handle='@u3'))
+    event_obj = Event(event_id='E1', name='Lunch', description='', creator='U1', payment_summary=PaymentSummaryMap())
+    backend.save(event_obj)
+    event_obj = backend.get(Event, 'E1')
+    backend.apply_attendee_changes(event_obj, [('U1', True), ('U2', True), ('U3', True)])
+    assert _summary(event_obj) == (2, 1, [('U1', '@u1'), ('U2', None)])
+    # A listed attendee leaves, and the next one is listed in their place
+    backend.unregister_attendee(event_obj, 'U1')
+    assert _summary(event_obj) == (1, 1, [('U2', None), ('U3', '@u3')])
+    assert _summary(backend.get(Event, 'E1')) == _summary(event_obj)
+
+    assert backend.list_attendee_events('U2') == ['E1']
+    event_obj = backend.update_payment_handle('E1', 'U2', None, '@u2')
+    assert _summary(event_obj) == (2, 0, [('U2', '@u2'), ('U3', '@u3')])
+    assert backend.update_payment_handle('E1', 'U1', '@u1', None) is None
+
+    # Replacing the attendees drops the summary, until it's repaired
+    event_obj.attendees = [AttendeeMap(attendee='U4')]
+    backend.save(event_obj)
+    assert backend.get(Event, 'E1').payment_summary is None
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+import botocore.exceptions
+import pytest
+from pynamodb.exceptions import DeleteError, UpdateError
+
+from eventbot.models.archive import ArchivedEvent
+from eventbot.models.event import Event
+from eventbot.storage.base import encode_cursor
+from eventbot.storage.dynamodb import DynamoDBBackend
+
+
+def _conditional_check_failure(error_class=UpdateError):
+    cause = botocore.exceptions.ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}},
+        'UpdateItem',
+    )
+    return error_class('Conditional check failed', cause)
+
+
+def test_edit_reads_consistently(mocker):
+    get = mocker.patch.object(Event, 'get', return_value=Event(event_id='E1', name='Lunch'))
+    save = mocker.patch.object(Event, 'save')
+    event_obj = DynamoDBBackend().edit(Event, 'E1', lambda x: setattr(x, 'name', 'Dinner'))
+    get.assert_called_once_with('E1', consistent_read=True)
+    assert save.call_count == 1
+    assert event_obj.name == 'Dinner'
+
+
+@pytest.mark.parametrize('position', [
+    {'event_id': {'S': 'E1'}},
+    {'event_id': {'S': 'E1'}, 'status': {'S': 'open'}, 'start_date': {'N': '1'}},
+    {'event_id': {'S': 'E1'}, 'status': {'S': 'closed'}, 'start_date': {'S': '2019-01-01'}},
+    ['E1'],
+])
+def test_list_events_rejects_invalid_cursor(mocker, position):
+    query = mocker.patch.object(Event, 'query_by_status')
+    with pytest.raises(ValueError):
+        DynamoDBBackend().list_events(Event.STATUS_OPEN, cursor=encode_cursor(position))
+    assert query.call_count == 0
+
+
+def test_list_events_cursor_round_trip(mocker):
+    key = {'event_id': {'S': 'E1'}, 'status': {'S': 'open'}, 'start_date': {'S': '2019-01-01'}}
+    query = mocker.patch.object(Event, 'query_by_status')
+    query.return_value.__iter__.return_value = iter([])
+    DynamoDBBackend().list_events(Event.STATUS_OPEN, cursor=encode_cursor(key))
+    assert query.call_args[1]['last_evaluated_key'] == key
+
+
+@pytest.mark.parametrize('position', [
+    {'offset': -1},
+    {'offset': 'x'},
+    {'event_id': {'S': 'E1'}, 'user_id': {'S': 'U1'}},
+    {'event_id': {'S': 'E2'}, 'user_id': {'S': 'U1'}, 'registered_date': {'S': '2019-01-01'}},
+])
+def test_list_attendees_rejects_invalid_cursor(mocker, position):
+    list_attendees = mocker.patch.object(Event, 'list_attendees')
+    with pytest.raises(ValueError):
+        DynamoDBBackend().list_attendees(Event(event_id='E1'), cursor=encode_cursor(position))
+    assert list_attendees.call_count == 0
+
+
+def test_index_event(mocker):
+    update = mocker.patch.object(Event, 'update')
+    assert DynamoDBBackend().index_event('E1')
+    actions = [str(x) for x in update.call_args[1]['actions']]
+    assert actions == [
+        'start_date = if_not_exists (start_date, created_date)',
+        "status = if_not_exists (status, {'S': 'open'})",
+    ]
+    update.side_effect = _conditional_check_failure()
+    assert not DynamoDBBackend().index_event('E1')
+
+
+def test_archive_events_skips_events_written_since_read(mocker):
+    def event(event_id, status=Event.STATUS_CLOSED, modified_date=datetime(2019, 1, 1), version=1):
+        return Event(event_id=event_id, status=status, modified_date=modified_date, version=version)
+
+    mocker.patch('eventbot.models.batch.batch_get', return_value=[
+        event('old'),
+        event('conflict', version=2),
+        event('recent', modified_date=datetime(2019, 6, 1)),
+        event('open', status=Event.STATUS_OPEN),
+    ])
+    batch_write = mocker.patch.object(ArchivedEvent, 'batch_write')
+    archive = batch_write.return_value.__enter__.return_value
+
+    def delete(self, condition):
+        # Another writer changed the event after it was read
+        if self.event_id == 'conflict':
+            raise _conditional_check_failure(DeleteError)
+
+    delete = mocker.patch.object(Event, 'delete', autospec=True, side_effect=delete)
+    archived = DynamoDBBackend().archive_events(['old', 'conflict', 'recent', 'open'], datetime(2019, 2, 1))
+    assert archived == ['old']
+    assert [x[0][0].event_id for x in archive.save.call_args_list] == ['old', 'conflict']
+    assert [x[0][0].event_id for x in delete.call_args_list] == ['old', 'conflict']
+    assert [str(x[1]['condition']) for x in delete.call_args_list] == [
+        "version = {'N': '1'}",
+        "version = {'N': '2'}",
+    ]
+
+    # Other failures aren't skipped
+    delete.side_effect = DeleteError('Service unavailable')
+    with pytest.raises(DeleteError):
+        DynamoDBBackend().archive_events(['old'], datetime(2019, 2, 1))
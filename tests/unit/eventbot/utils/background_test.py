@@ -0,0 +1,46 @@
+import gevent
+import pytest
+
+from eventbot.utils.background import BackgroundPool, with_retries
+
+
+def test_submit_and_drain():
+    done = []
+    pool = BackgroundPool(2)
+    assert pool.submit(done.append, 1)
+    assert pool.drain(timeout=1)
+    assert done == [1]
+    # A drained pool doesn't accept more work
+    assert not pool.submit(done.append, 2)
+
+
+def test_submit_when_full():
+    pool = BackgroundPool(1)
+    assert pool.submit(gevent.sleep, 0.01)
+    assert not pool.submit(gevent.sleep, 0.01)
+    assert pool.drain(timeout=1)
+
+
+def test_failed_job_is_logged(caplog):
+    def fail():
+        raise ValueError('boom')
+
+    pool = BackgroundPool(1)
+    pool.submit(fail)
+    pool.drain(timeout=1)
+    assert 'Background job fail failed' in caplog.text
+
+
+def test_with_retries(mocker):
+    func = mocker.Mock(side_effect=[ValueError(), ValueError(), 'ok'])
+    func.__name__ = 'func'
+    assert with_retries(func, retries=2, backoff=0) == 'ok'
+    assert func.call_count == 3
+
+
+def test_with_retries_gives_up(mocker):
+    func = mocker.Mock(side_effect=ValueError())
+    func.__name__ = 'func'
+    with pytest.raises(ValueError):
+        with_retries(func, retries=1, backoff=0)
+    assert func.call_count == 2
@@ -0,0 +1,54 @@
+from eventbot.utils.cache import MISSING, TTLCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_and_set():
+    cache = TTLCache(10, 60)
+    assert cache.get('a') is MISSING
+    cache.set('a', None)
+    assert cache.get('a') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = TTLCache(10, 60, clock=clock)
+    cache.set('a', 1)
+    clock.now = 59
+    assert cache.get('a') == 1
+    clock.now = 60
+    assert cache.get('a') is MISSING
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = TTLCache(2, 60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disabled():
+    cache = TTLCache(0, 60)
+    cache.set('a', 1)
+    assert cache.get('a') is MISSING
+
+
+def test_invalidate():
+    cache = TTLCache(10, 60)
+    cache.set('a', 1)
+    cache.invalidate('a')
+    cache.invalidate('b')
+    assert cache.get('a') is MISSING
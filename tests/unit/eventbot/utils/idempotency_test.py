@@ -0,0 +1,58 @@
+from unittest import mock
+
+import gevent
+import pytest
+
+from eventbot.utils.cache import TTLCache
+from eventbot.utils.idempotency import IdempotentRouter, get_idempotency_key
+
+
+def _click(trigger_id='T1', action='register'):
+    return {
+        'omnibot_payload_type': 'interactive_component',
+        'callback_id': 'eventbot_events',
+        'trigger_id': trigger_id,
+        'parsed_user': {'id': 'U1'},
+        'actions': [{'name': action, 'value': '1234.5678'}],
+    }
+
+
+def test_key_identifies_interaction():
+    assert get_idempotency_key(_click()) == get_idempotency_key(_click())
+    assert get_idempotency_key(_click()) != get_idempotency_key(_click(trigger_id='T2'))
+    assert get_idempotency_key(_click()) != get_idempotency_key(_click(action='unregister'))
+    assert get_idempotency_key({'omnibot_payload_type': 'interactive_component'}) is None
+
+
+def test_duplicate_returns_cached_response():
+    inner = mock.Mock()
+    inner.handle_event.return_value = {'actions': []}
+    router = IdempotentRouter(inner, TTLCache(10, 60))
+    assert router.handle_event(_click()) == {'actions': []}
+    assert router.handle_event(_click()) == {'actions': []}
+    router.handle_event(_click(trigger_id='T2'))
+    assert inner.handle_event.call_count == 2
+
+
+def test_duplicate_waits_for_in_flight_event():
+    inner = mock.Mock()
+
+    def _handle(event):
+        gevent.sleep(0.01)
+        return {'actions': [event['trigger_id']]}
+
+    inner.handle_event.side_effect = _handle
+    router = IdempotentRouter(inner, TTLCache(10, 60))
+    greenlets = [gevent.spawn(router.handle_event, _click()) for _ in range(3)]
+    gevent.joinall(greenlets)
+    assert [g.value for g in greenlets] == [{'actions': ['T1']}] * 3
+    assert inner.handle_event.call_count == 1
+
+
+def test_failures_are_not_cached():
+    inner = mock.Mock()
+    inner.handle_event.side_effect = [ValueError('boom'), {'actions': []}]
+    router = IdempotentRouter(inner, TTLCache(10, 60))
+    with pytest.raises(ValueError):
+        router.handle_event(_click())
+    assert router.handle_event(_click()) == {'actions': []}
@@ -0,0 +1,89 @@
+import dataclasses
+import datetime
+import decimal
+
+import pytest
+
+from eventbot.utils import jsoncodec
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+
+
+class Text(str):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def reset_codec():
+    jsoncodec.set_codec(None)
+    yield
+    jsoncodec.set_codec(None)
+
+
+@pytest.fixture(params=jsoncodec.CODEC_NAMES)
+def codec(request):
+    try:
+        codec = jsoncodec.load_codec(request.param)
+    except ImportError:
+        pytest.skip(f'{request.param} is not installed')
+    jsoncodec.set_codec(codec)
+    return codec
+
+
+def test_auto_falls_back_to_json(mocker):
+    mocker.patch('eventbot.settings.JSON_CODEC', 'auto')
+    mocker.patch.object(jsoncodec, 'CODEC_NAMES', ('not-installed', 'json'))
+    real_load_codec = jsoncodec.load_codec
+
+    def load_codec(name):
+        if name == 'not-installed':
+            raise ImportError()
+        return real_load_codec(name)
+    mocker.patch.object(jsoncodec, 'load_codec', side_effect=load_codec)
+    assert jsoncodec.get_codec().name == 'json'
+
+
+def test_round_trip(codec):
+    payload = {'text': 'café </script>', 'count': 3, 'items': [1.5, None, True]}
+    data = jsoncodec.dumps(payload)
+    assert isinstance(data, bytes)
+    assert jsoncodec.loads(data) == payload
+
+
+@pytest.mark.parametrize('value', [
+    {1: 'one'},
+    2 ** 70,
+    Text('text'),
+    (1, 2),
+])
+def test_encodes_like_json(codec, value):
+    assert jsoncodec.loads(jsoncodec.dumps(value)) == jsoncodec.loads(jsoncodec._json_dumps(value))
+
+
+@pytest.mark.parametrize('value', [
+    datetime.datetime(2019, 1, 1),
+    datetime.date(2019, 1, 1),
+    datetime.time(12, 0),
+    Point(1),
+    {1, 2},
+    b'bytes',
+    object(),
+])
+def test_unsupported_types_raise_type_error(codec, value):
+    with pytest.raises(TypeError):
+        jsoncodec.dumps({'value': value})
+
+
+def test_decimal_raises_type_error(codec):
+    if codec.name == 'ujson':
+        pytest.skip('ujson encodes Decimals natively')
+    with pytest.raises(TypeError):
+        jsoncodec.dumps({'value': decimal.Decimal('1.5')})
+
+
+def test_invalid_json_raises_value_error(codec):
+    with pytest.raises(ValueError):
+        jsoncodec.loads(b'{')
@@ -0,0 +1,25 @@
+import time
+
+import gevent
+
+from eventbot.utils import profiling
+
+
+def test_profile_time_window(mocker, tmpdir):
+    mocker.patch('eventbot.settings.PROFILE_DIR', str(tmpdir))
+    profiling.start(profiling.CPU, seconds=0.01)
+    gevent.sleep(0.05)
+    status = profiling.status()
+    assert status['session'] is None
+    assert status['results'][-1]['kind'] == profiling.CPU
+    assert len(tmpdir.listdir()) == 2
+
+
+def test_requests_before_the_session_are_not_counted(mocker, tmpdir):
+    mocker.patch('eventbot.settings.PROFILE_DIR', str(tmpdir))
+    before = time.monotonic()
+    profiling.start(profiling.MEMORY, requests=1)
+    profiling.request_done(before)
+    assert profiling.status()['session']['requests_done'] == 0
+    profiling.request_done(time.monotonic())
+    assert profiling.status()['session'] is None
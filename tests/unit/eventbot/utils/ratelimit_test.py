@@ -0,0 +1,20 @@
+import time
+
+from eventbot.utils.ratelimit import TokenBucket
+
+
+def test_token_bucket_waits_for_tokens():
+    bucket = TokenBucket(rate=100, capacity=5)
+    assert bucket.acquire(5) == 0
+    start = time.monotonic()
+    bucket.acquire(3)
+    assert time.monotonic() - start >= 0.025
+
+
+def test_token_bucket_allows_amounts_over_capacity():
+    bucket = TokenBucket(rate=100, capacity=2)
+    assert bucket.acquire(10) == 0
+    start = time.monotonic()
+    bucket.acquire(1)
+    # 8 units of debt, and 1 more
+    assert time.monotonic() - start >= 0.085
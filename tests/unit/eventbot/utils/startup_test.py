@@ -0,0 +1,20 @@
+from eventbot.models import connection
+from eventbot.utils import startup, stats
+
+
+def test_after_fork_resets_clients(mocker):
+    client = stats.get_stats()
+    reset = mocker.patch.object(connection, 'reset')
+    startup.after_fork()
+    assert stats.get_stats() is not client
+    assert reset.called
+
+
+def test_first_request_is_timed_once(mocker):
+    timing = mocker.patch.object(stats, 'timing')
+    mocker.patch.object(startup, '_app_import_ms', 12.5)
+    startup.after_fork()
+    startup.first_request_done()
+    startup.first_request_done()
+    assert sorted(x[0][0] for x in timing.call_args_list) == ['startup.app_import', 'startup.first_request']
+    assert timing.call_args_list[-1][0][1] == 12.5
@@ -0,0 +1,57 @@
+import uuid
+
+import gevent
+import pytest
+import statsd
+from pynamodb.signals import post_dynamodb_send, pre_dynamodb_send
+
+from eventbot.utils import stats
+
+
+@pytest.fixture
+def sent(mocker):
+    sent = []
+    client = statsd.StatsClient(prefix='eventbot')
+    mocker.patch.object(client, '_send', side_effect=sent.append)
+    mocker.patch.object(stats, 'get_stats', return_value=client)
+    return sent
+
+
+def test_metrics_are_sent_immediately_without_pipeline(sent):
+    stats.incr('a')
+    stats.incr('b')
+    assert sent == ['eventbot.a:1|c', 'eventbot.b:1|c']
+
+
+def test_pipelined_metrics_are_batched(sent):
+    with stats.pipelined():
+        stats.incr('a')
+        with stats.pipelined():
+            stats.incr('b')
+        assert sent == []
+    assert sent == ['eventbot.a:1|c\neventbot.b:1|c']
+
+
+def test_timer(sent):
+    with stats.timer('t'):
+        pass
+    assert sent[0].startswith('eventbot.t:')
+    assert sent[0].endswith('|ms')
+
+
+def test_dynamodb_call_timing(sent):
+    req_uuid = uuid.uuid4()
+    with stats.pipelined():
+        pre_dynamodb_send.send(None, operation_name='GetItem', table_name='event', req_uuid=req_uuid)
+        post_dynamodb_send.send(None, operation_name='GetItem', table_name='event', req_uuid=req_uuid)
+    assert sent[0].startswith('eventbot.dynamodb.event.GetItem:')
+
+
+def test_failed_dynamodb_call_is_counted(sent):
+    def failed_call():
+        pre_dynamodb_send.send(None, operation_name='PutItem', table_name='event', req_uuid=uuid.uuid4())
+
+    with stats.pipelined():
+        failed_call()
+        gevent.spawn(failed_call).join()
+    assert sent == ['eventbot.dynamodb.event.PutItem.error:1|c\neventbot.dynamodb.event.PutItem.error:1|c']
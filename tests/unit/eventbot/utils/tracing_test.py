@@ -0,0 +1,80 @@
+import uuid
+
+import gevent
+import pytest
+from pynamodb.signals import post_dynamodb_send, pre_dynamodb_send
+
+from eventbot.utils import stats, tracing
+
+
+@pytest.fixture(autouse=True)
+def sampled(mocker):
+    mocker.patch('eventbot.settings.TRACE_SAMPLE_RATE', 1.0)
+    mocker.patch('eventbot.settings.TRACE_SLOWEST_COUNT', 2)
+    mocker.patch.object(stats, 'timing')
+    tracing.clear()
+    yield
+    tracing.finish()
+    tracing.clear()
+
+
+def test_spans_are_recorded():
+    tracing.start('req-1', 'api.eventbot_route')
+    with tracing.span('api.parse'):
+        pass
+    with stats.timer('render.event'):
+        pass
+    req_uuid = uuid.uuid4()
+    pre_dynamodb_send.send(None, operation_name='GetItem', table_name='event', req_uuid=req_uuid)
+    post_dynamodb_send.send(None, operation_name='GetItem', table_name='event', req_uuid=req_uuid)
+    pre_dynamodb_send.send(None, operation_name='PutItem', table_name='event', req_uuid=uuid.uuid4())
+    trace = tracing.finish(200)
+    assert trace.request_id == 'req-1'
+    assert trace.status == 200
+    assert [x['name'] for x in trace.spans] == [
+        'api.parse',
+        'render.event',
+        'dynamodb.event.GetItem',
+        'dynamodb.event.PutItem.error',
+    ]
+
+
+def test_unsampled_requests_are_not_traced(mocker):
+    mocker.patch('eventbot.settings.TRACE_SAMPLE_RATE', 0)
+    assert tracing.start('req-1', 'api.eventbot_route') is None
+    with tracing.span('api.parse'):
+        pass
+    assert tracing.finish(200) is None
+    assert tracing.slowest() == []
+
+
+def test_only_the_slowest_traces_are_kept(mocker):
+    for request_id, duration in [('a', 3.0), ('b', 1.0), ('c', 2.0)]:
+        trace = tracing.start(request_id, 'api.eventbot_route')
+        mocker.patch.object(trace, 'start', trace.start - duration)
+        tracing.finish(200)
+    assert [x['request_id'] for x in tracing.slowest()] == ['a', 'c']
+
+
+def test_traced_functions(mocker):
+    @tracing.traced('work')
+    def work():
+        return 1
+
+    assert work() == 1
+    tracing.start('req-1', 'api.eventbot_route')
+    assert work() == 1
+    assert [x['name'] for x in tracing.finish(200).spans] == ['work']
+
+
+def test_bound_functions_are_traced_in_other_greenlets():
+    def work():
+        with tracing.span('work'):
+            return tracing.current()
+
+    trace = tracing.start('req-1', 'api.eventbot_route')
+    bound = tracing.bind(work)
+    assert gevent.spawn(work).get() is None
+    assert gevent.spawn(bound).get() is trace
+    assert [x['name'] for x in tracing.finish(200).spans] == ['work']
+    assert tracing.bind(work) is work